@@ -1,5 +1,106 @@
-from .main import app
+import argparse
+import os
+import time
 
-if __name__ == "__main__":
+
+def migrate(args):
+    from backend_costeo.migraciones import migrar
+
+    inicio = time.perf_counter()
+    version = migrar()
+    print(f"✅ Esquema en versión {version} ({(time.perf_counter() - inicio) * 1000:.0f} ms)")
+
+
+def seed(args):
+    from backend_costeo.migraciones import verificar_esquema
+    from backend_costeo.seed import seed_if_empty
+
+    verificar_esquema()
+    inicio = time.perf_counter()
+    seed_if_empty()
+    print(f"✅ Seed verificado ({(time.perf_counter() - inicio) * 1000:.0f} ms)")
+
+
+def archivar(args):
+    from backend_costeo.migraciones import verificar_esquema
+    from backend_costeo.particiones import archivar_historial
+
+    verificar_esquema()
+    opciones = {k: v for k, v in (("meses", args.meses), ("destino", args.destino)) if v is not None}
+    archivados = archivar_historial(**opciones)
+    print(f"✅ {len(archivados)} meses archivados ({sum(a['filas'] for a in archivados)} filas)")
+
+
+def verificar_listas(args):
+    from backend_costeo.database import SessionLocal
+    from backend_costeo.migraciones import verificar_esquema
+    from backend_costeo.recalculo import listas_desfasadas, reparar_listas
+
+    verificar_esquema()
+    with SessionLocal() as db:
+        desfasadas = listas_desfasadas(db)
+        for lista in desfasadas:
+            campos = ", ".join(lista["diferencias"]) or "sin calcular"
+            print(f"⚠️ {lista['codigo']}: {campos}")
+        print(f"{len(desfasadas)} listas desfasadas")
+        if desfasadas and args.reparar:
+            resultado = reparar_listas(db)
+            db.commit()
+            print(f"✅ {resultado['reparadas']} listas reparadas "
+                  f"({resultado['catalogos_recalculados']} catálogos, "
+                  f"{resultado['cotizaciones_recalculadas']} cotizaciones recalculadas)")
+
+
+def serve(args):
     import uvicorn
-    uvicorn.run("backend_costeo.main:app", host="0.0.0.0", port=8001, reload=True)
+
+    uvicorn.run(
+        "backend_costeo.main:app",
+        host=args.host,
+        port=args.port,
+        workers=None if args.reload else args.workers,
+        reload=args.reload,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m backend_costeo", description="Backend de Costeo DCM")
+    modos = parser.add_subparsers(dest="modo")
+
+    modos.add_parser("migrate", help="Crea tablas e índices faltantes y registra la versión de esquema")
+    modos.add_parser("seed", help="Carga los datos iniciales si la base está vacía")
+
+    p_archivar = modos.add_parser("archivar", help="Mueve el historial más viejo que N meses a archivos .jsonl.gz")
+    p_archivar.add_argument("--meses", type=int, default=None, help="Meses de historial que quedan en la base")
+    p_archivar.add_argument("--destino", default=None, help="Carpeta persistente de los archivos (por defecto HISTORIAL_ARCHIVO_DIR)")
+
+    p_listas = modos.add_parser("verificar-listas", help="Busca listas con totales desfasados de sus ítems")
+    p_listas.add_argument("--reparar", action="store_true", help="Recalcula las listas desfasadas")
+
+    p_serve = modos.add_parser("serve", help="Levanta la API (los workers solo verifican la versión de esquema)")
+    p_serve.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    p_serve.add_argument("--port", type=int, default=int(os.getenv("PORT", "8001")))
+    p_serve.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "1")))
+    p_serve.add_argument("--reload", action="store_true")
+
+    args = parser.parse_args(argv)
+
+    if args.modo is None:
+        # Sin modo: entorno de desarrollo de siempre (migrar + seed + servidor con reload)
+        migrate(args)
+        seed(args)
+        args = p_serve.parse_args(["--reload"])
+        serve(args)
+        return
+
+    {
+        "migrate": migrate,
+        "seed": seed,
+        "archivar": archivar,
+        "verificar-listas": verificar_listas,
+        "serve": serve,
+    }[args.modo](args)
+
+
+if __name__ == "__main__":
+    main()
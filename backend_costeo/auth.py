@@ -1,73 +1,280 @@
 import os
-import httpx
+import json
+import asyncio
+import hashlib
+import time
+import threading
+import urllib.request
 from fastapi import Depends, HTTPException, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import jwt, JWTError
+from jose import jwt, jwk, JWTError
+from backend_costeo import cliente_supabase
+from backend_costeo.cache import CacheLRU
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+JWKS_TTL = int(os.getenv("SUPABASE_JWKS_TTL", "600"))
+JWKS_REFETCH_MINIMO = int(os.getenv("SUPABASE_JWKS_REFETCH_MINIMO", "30"))
+TOKENS_CACHE_MAX = int(os.getenv("TOKENS_CACHE_MAX", "1024"))
+USUARIOS_CACHE_TTL = int(os.getenv("USUARIOS_CACHE_TTL", "60"))
+USUARIOS_CACHE_MAX = int(os.getenv("USUARIOS_CACHE_MAX", "1024"))
 
 security = HTTPBearer()
 
-def verificar_token(credentials: HTTPAuthorizationCredentials = Security(security)):
-    token = credentials.credentials
-    
-    # Intentar primero con ES256 usando la JWKS de Supabase
+
+class CacheJWKS:
+    """Claves públicas de Supabase por `kid`, ya convertidas a PEM.
+
+    Al vencer el TTL se sigue usando la clave vigente y se refresca en segundo
+    plano; un `kid` desconocido fuerza una descarga (como mucho cada
+    `refetch_minimo` segundos).
+    """
+
+    def __init__(self, ttl: int = JWKS_TTL, refetch_minimo: int = JWKS_REFETCH_MINIMO):
+        self.ttl = ttl
+        self.refetch_minimo = refetch_minimo
+        self._claves = {}
+        self._vence = 0.0
+        self._ultima_descarga = 0.0
+        self._intentos = 0
+        self._refrescando = False
+        self._lock = threading.Lock()
+        self._lock_descarga = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.descargas = 0
+        self.errores = 0
+
+    def _url(self):
+        return f"{SUPABASE_URL}/auth/v1/.well-known/jwks.json"
+
+    def _descargar(self):
+        with urllib.request.urlopen(self._url(), timeout=5) as response:
+            jwks = json.loads(response.read())
+
+        claves = {}
+        for key in jwks.get("keys", []):
+            claves[key.get("kid")] = jwk.construct(key).to_pem().decode()
+
+        with self._lock:
+            self._claves = claves
+            self._vence = time.monotonic() + self.ttl
+            self._ultima_descarga = time.monotonic()
+            self.descargas += 1
+
+    def _descargar_seguro(self, kid=None, buscar: bool = False):
+        # Un solo hilo descarga a la vez. Al conseguir el lock se vuelve a mirar: si otro
+        # terminó un intento mientras este esperaba (o ya está el `kid`), se reutiliza.
+        with self._lock:
+            visto = self._intentos
+        with self._lock_descarga:
+            with self._lock:
+                if self._intentos != visto:
+                    return
+                if buscar and self._buscar(kid) is not None:
+                    return
+            try:
+                self._descargar()
+            except Exception as e:
+                with self._lock:
+                    self.errores += 1
+                print("⚠️ Error al descargar JWKS:", e)
+            finally:
+                with self._lock:
+                    self._intentos += 1
+
+    def _refrescar_en_segundo_plano(self):
+        with self._lock:
+            if self._refrescando:
+                return
+            self._refrescando = True
+
+        def tarea():
+            try:
+                self._descargar_seguro()
+            finally:
+                with self._lock:
+                    self._refrescando = False
+
+        threading.Thread(target=tarea, daemon=True).start()
+
+    def _buscar(self, kid):
+        if kid is None:
+            # Tokens sin `kid`: se usa la primera clave publicada
+            return next(iter(self._claves.values()), None)
+        return self._claves.get(kid)
+
+    def obtener_clave(self, kid):
+        with self._lock:
+            clave = self._buscar(kid)
+            vencida = time.monotonic() >= self._vence
+            if clave is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if clave is not None:
+            if vencida:
+                self._refrescar_en_segundo_plano()
+            return clave
+
+        with self._lock:
+            puede_descargar = (
+                not self._claves
+                or time.monotonic() - self._ultima_descarga >= self.refetch_minimo
+            )
+        if puede_descargar:
+            self._descargar_seguro(kid, buscar=True)
+
+        with self._lock:
+            return self._buscar(kid)
+
+    def limpiar(self):
+        with self._lock:
+            self._claves = {}
+            self._vence = 0.0
+            self._ultima_descarga = 0.0
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "claves": len(self._claves),
+                "hits": self.hits,
+                "misses": self.misses,
+                "descargas": self.descargas,
+                "errores": self.errores,
+                "vence_en_seg": max(0, round(self._vence - time.monotonic(), 1)),
+            }
+
+
+jwks_cache = CacheJWKS()
+tokens_cache = CacheLRU(max_entradas=TOKENS_CACHE_MAX)
+usuarios_cache = CacheLRU(max_entradas=USUARIOS_CACHE_MAX, ttl=USUARIOS_CACHE_TTL)
+_consultas_usuario = {}
+
+
+def _decodificar_jwks(token: str, kid):
+    public_key = jwks_cache.obtener_clave(kid)
+    if public_key is None:
+        raise JWTError("Clave pública no encontrada")
+    return jwt.decode(
+        token,
+        public_key,
+        algorithms=["ES256", "RS256"],
+        options={"verify_aud": False}
+    )
+
+
+def _decodificar_hs256(token: str):
+    return jwt.decode(
+        token,
+        SUPABASE_JWT_SECRET,
+        algorithms=["HS256"],
+        options={"verify_aud": False}
+    )
+
+
+def _decodificar_token(token: str):
     try:
-        jwks_url = f"{SUPABASE_URL}/auth/v1/.well-known/jwks.json"
-        import urllib.request, json as json_lib
-        with urllib.request.urlopen(jwks_url) as response:
-            jwks = json_lib.loads(response.read())
-        
-        from jose import jwk
-        from jose.utils import base64url_decode
-        
-        # Tomar la primera clave del JWKS
-        key = jwks["keys"][0]
-        public_key = jwk.construct(key)
-        
-        payload = jwt.decode(
-            token,
-            public_key.to_pem().decode(),
-            algorithms=["ES256", "RS256"],
-            options={"verify_aud": False}
-        )
-        return payload
+        header = jwt.get_unverified_header(token)
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Token inválido o expirado")
+
+    alg = header.get("alg")
+    try:
+        # Si el header ya indica el algoritmo se evita el segundo decode
+        if alg in ("ES256", "RS256"):
+            return _decodificar_jwks(token, header.get("kid"))
+        if alg == "HS256":
+            return _decodificar_hs256(token)
+    except Exception:
+        raise HTTPException(status_code=401, detail="Token inválido o expirado")
+
+    # Algoritmo no declarado: intentar con la JWKS de Supabase y luego con el legacy secret
+    try:
+        return _decodificar_jwks(token, header.get("kid"))
     except Exception:
         pass
-    
-    # Fallback: intentar con HS256 y el legacy secret
+
     try:
-        payload = jwt.decode(
-            token,
-            SUPABASE_JWT_SECRET,
-            algorithms=["HS256"],
-            options={"verify_aud": False}
-        )
-        return payload
+        return _decodificar_hs256(token)
     except JWTError:
         raise HTTPException(status_code=401, detail="Token inválido o expirado")
 
+
+def verificar_token(credentials: HTTPAuthorizationCredentials = Security(security)):
+    token = credentials.credentials
+
+    clave = hashlib.sha256(token.encode()).hexdigest()
+    payload = tokens_cache.obtener(clave)
+    if payload is not None:
+        return payload
+
+    payload = _decodificar_token(token)
+
+    # Solo se cachean tokens con `exp`, y hasta ese instante
+    exp = payload.get("exp")
+    if isinstance(exp, (int, float)):
+        tokens_cache.guardar(clave, payload, vence=exp)
+    return payload
+
 def get_usuario_actual(payload: dict = Depends(verificar_token)):
     user_id = payload.get("sub")
     if not user_id:
         raise HTTPException(status_code=401, detail="Token sin usuario")
     return user_id
 
-async def get_rol_usuario(user_id: str = Depends(get_usuario_actual)) -> dict:
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{SUPABASE_URL}/rest/v1/usuarios?id=eq.{user_id}&select=rol,email,nombre,apellido,activo",
-            headers={
-                "apikey": SUPABASE_KEY,
-                "Authorization": f"Bearer {SUPABASE_KEY}"
-            }
-        )
+async def _consultar_usuario(user_id: str):
+    response = await cliente_supabase.solicitar(
+        "usuario",
+        "GET",
+        f"{SUPABASE_URL}/rest/v1/usuarios?id=eq.{user_id}&select=rol,email,nombre,apellido,activo",
+        headers={
+            "apikey": SUPABASE_KEY,
+            "Authorization": f"Bearer {SUPABASE_KEY}"
+        }
+    )
     data = response.json()
     if not data:
-        raise HTTPException(status_code=403, detail="Usuario no encontrado")
+        return None
     usuario = data[0]
+
+    # Si el usuario se invalidó mientras la consulta estaba en curso, no se cachea
+    if _consultas_usuario.get(user_id) is asyncio.current_task():
+        usuarios_cache.guardar(user_id, usuario)
+    return usuario
+
+
+async def buscar_usuario(user_id: str):
+    usuario = usuarios_cache.obtener(user_id)
+    if usuario is not None:
+        return usuario
+
+    # Requests simultáneos del mismo usuario comparten una única consulta a Supabase
+    tarea = _consultas_usuario.get(user_id)
+    if tarea is None:
+        tarea = asyncio.ensure_future(_consultar_usuario(user_id))
+        _consultas_usuario[user_id] = tarea
+
+        def liberar(t, user_id=user_id):
+            if _consultas_usuario.get(user_id) is t:
+                del _consultas_usuario[user_id]
+
+        tarea.add_done_callback(liberar)
+
+    return await asyncio.shield(tarea)
+
+
+def invalidar_usuario(user_id: str):
+    usuarios_cache.invalidar(user_id)
+    _consultas_usuario.pop(user_id, None)
+
+
+async def get_rol_usuario(user_id: str = Depends(get_usuario_actual)) -> dict:
+    usuario = await buscar_usuario(user_id)
+    if not usuario:
+        raise HTTPException(status_code=403, detail="Usuario no encontrado")
     if not usuario.get("activo"):
         raise HTTPException(status_code=403, detail="Usuario inactivo")
     return usuario
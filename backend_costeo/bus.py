@@ -0,0 +1,272 @@
+import os
+import select as select_io
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import orjson
+from sqlalchemy import Column, Integer, String, DateTime, Text, event, select, delete, func, text
+from sqlalchemy.orm import Session
+
+from backend_costeo.database import Base, SessionLocal, engine as engine_default
+
+# =========================
+# Bus de invalidación entre workers. Cada escritura publica (entidad, ids) dentro de
+# su transacción: en Postgres con NOTIFY (se entrega recién al commit) y en SQLite
+# como filas de eventos_cache que los demás workers leen por polling. Cada worker
+# despacha lo que recibe a los suscriptores de esa entidad, salvo lo que publicó él.
+# =========================
+
+BUS_CANAL = "costeo_changes"
+BUS_INTERVALO_SEG = float(os.getenv("BUS_INTERVALO_SEG", "1"))
+BUS_RETENCION_MIN = int(os.getenv("BUS_RETENCION_MIN", "60"))
+# pg_notify admite payloads de hasta 8000 bytes: los ids se reparten en varios avisos
+BUS_IDS_POR_AVISO = 100
+
+_PENDIENTES = "bus_pendientes"
+_TODOS = None
+
+
+class EventoCache(Base):
+    """Cola de avisos para el modo polling (SQLite); en Postgres queda vacía."""
+    __tablename__ = "eventos_cache"
+    # Sin AUTOINCREMENT, SQLite reusa los ids que libera la limpieza y los lectores,
+    # que avanzan por `id > ultimo`, se saltearían los avisos nuevos
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = Column(Integer, primary_key=True)
+    origen = Column(String, nullable=False)
+    entidad = Column(String, nullable=False)
+    ids = Column(Text)
+    fecha = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+def asegurar_eventos(engine=engine_default):
+    """Paso de `migrate`: recrea eventos_cache si se creó sin AUTOINCREMENT (solo SQLite).
+
+    La tabla es una cola transitoria: perder los avisos pendientes a lo sumo deja una
+    cache vieja hasta el próximo cambio, por eso se descarta en vez de copiarla.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        ddl = conn.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :tabla"),
+            {"tabla": EventoCache.__tablename__},
+        ).scalar()
+        if ddl is None or "AUTOINCREMENT" in ddl.upper():
+            return
+        print("🔄 Recreando eventos_cache con AUTOINCREMENT...")
+        EventoCache.__table__.drop(conn)
+        EventoCache.__table__.create(conn)
+
+
+# =========================
+# PUBLICACIÓN
+# =========================
+
+def publicar(db: Session, entidad: str, ids=_TODOS):
+    """Anota un aviso que se emite con el commit de `db`. Sin ids invalida toda la entidad."""
+    pendientes = db.info.setdefault(_PENDIENTES, {})
+    if ids is _TODOS:
+        pendientes[entidad] = _TODOS
+    elif pendientes.get(entidad, set()) is not _TODOS:
+        pendientes.setdefault(entidad, set()).update(str(i) for i in ids if i is not None)
+
+
+def _avisos(entidad: str, ids):
+    if ids is _TODOS:
+        yield orjson.dumps({"o": bus.origen, "e": entidad, "i": None}).decode()
+        return
+    ids = sorted(ids)
+    for i in range(0, len(ids), BUS_IDS_POR_AVISO):
+        yield orjson.dumps({"o": bus.origen, "e": entidad, "i": ids[i:i + BUS_IDS_POR_AVISO]}).decode()
+
+
+def _emitir(conn, entidad: str, ids):
+    if conn.dialect.name == "postgresql":
+        for aviso in _avisos(entidad, ids):
+            conn.execute(text("SELECT pg_notify(:canal, :aviso)"), {"canal": BUS_CANAL, "aviso": aviso})
+    else:
+        conn.execute(EventoCache.__table__.insert(), [
+            {"origen": bus.origen, "entidad": entidad, "ids": aviso, "fecha": datetime.utcnow()}
+            for aviso in _avisos(entidad, ids)
+        ])
+    bus.publicados += 1
+
+
+def publicar_ahora(entidad: str, ids=_TODOS, engine=engine_default):
+    """Para cambios que no pasan por una sesión (p. ej. roles en Supabase)."""
+    with engine.begin() as conn:
+        _emitir(conn, entidad, ids)
+
+
+@event.listens_for(SessionLocal, "before_commit")
+def _emitir_pendientes(session):
+    pendientes = session.info.pop(_PENDIENTES, None)
+    if not pendientes:
+        return
+    conn = session.connection()
+    for entidad, ids in pendientes.items():
+        if ids is _TODOS or ids:
+            _emitir(conn, entidad, ids)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _descartar_pendientes(session):
+    session.info.pop(_PENDIENTES, None)
+
+
+# =========================
+# RECEPCIÓN
+# =========================
+
+class BusInvalidacion:
+    """Hilo que escucha el canal (Postgres) o lee eventos_cache (SQLite) y despacha a los suscriptores."""
+
+    def __init__(self):
+        self.origen = uuid.uuid4().hex
+        self._suscriptores = {}
+        self._hilo = None
+        self._parar = threading.Event()
+        self._loop = None
+        self.modo = None
+        self.publicados = 0
+        self.recibidos = 0
+        self.errores = 0
+        self.reconexiones = 0
+
+    def suscribir(self, entidad: str, funcion, en_loop: bool = False):
+        """`funcion(ids)` recibe una lista de ids (como texto), o None para invalidar todo.
+
+        Los suscriptores corren en el hilo del bus; con `en_loop=True` se agendan en el
+        event loop de la app (para estado que solo se toca desde el loop, como tareas asyncio).
+        """
+        self._suscriptores.setdefault(entidad, []).append((funcion, en_loop))
+
+    def _llamar(self, entidad: str, funcion, ids):
+        try:
+            funcion(ids)
+        except Exception as e:
+            self.errores += 1
+            print(f"💥 Error en suscriptor del bus ({entidad}):", e)
+
+    def _despachar(self, entidad: str, ids):
+        for funcion, en_loop in self._suscriptores.get(entidad, ()):
+            loop = self._loop
+            if en_loop and loop is not None and not loop.is_closed():
+                loop.call_soon_threadsafe(self._llamar, entidad, funcion, ids)
+            else:
+                self._llamar(entidad, funcion, ids)
+
+    def _despachar_todo(self):
+        # Sin garantía de haber visto todos los avisos: se invalida todo lo suscripto
+        for entidad in list(self._suscriptores):
+            self._despachar(entidad, _TODOS)
+
+    def _recibir(self, aviso: str):
+        try:
+            datos = orjson.loads(aviso)
+        except orjson.JSONDecodeError:
+            self.errores += 1
+            return
+        if datos.get("o") == self.origen:
+            return
+        self.recibidos += 1
+        self._despachar(datos["e"], datos.get("i"))
+
+    def _escuchar_postgres(self, engine):
+        while not self._parar.is_set():
+            conexion = None
+            try:
+                # Conexión dedicada, fuera del pool, con los mismos parámetros del engine
+                crudo = engine.raw_connection()
+                # Antes de detach(): después el proxy ya no expone la conexión del driver
+                conexion = crudo.driver_connection
+                crudo.detach()
+                conexion.autocommit = True
+                conexion.cursor().execute(f"LISTEN {BUS_CANAL}")
+                if self.reconexiones:
+                    self._despachar_todo()
+                while not self._parar.is_set():
+                    if select_io.select([conexion], [], [], BUS_INTERVALO_SEG) == ([], [], []):
+                        continue
+                    conexion.poll()
+                    while conexion.notifies:
+                        self._recibir(conexion.notifies.pop(0).payload)
+            except Exception as e:
+                self.errores += 1
+                self.reconexiones += 1
+                print("⚠️ Bus de invalidación desconectado, reintentando:", e)
+                self._parar.wait(BUS_INTERVALO_SEG * 5)
+            finally:
+                if conexion is not None:
+                    try:
+                        conexion.close()
+                    except Exception:
+                        pass
+
+    def _leer_eventos(self, engine):
+        ultimo = None
+        ultima_limpieza = 0.0
+        while not self._parar.is_set():
+            try:
+                with engine.begin() as conn:
+                    if ultimo is None:
+                        ultimo = conn.execute(select(func.max(EventoCache.id))).scalar() or 0
+                    filas = conn.execute(
+                        select(EventoCache.id, EventoCache.ids)
+                        .where(EventoCache.id > ultimo, EventoCache.origen != self.origen)
+                        .order_by(EventoCache.id)
+                    ).all()
+                    if time.monotonic() - ultima_limpieza > 60:
+                        conn.execute(delete(EventoCache).where(
+                            EventoCache.fecha < datetime.utcnow() - timedelta(minutes=BUS_RETENCION_MIN)
+                        ))
+                        ultima_limpieza = time.monotonic()
+                for fila in filas:
+                    self._recibir(fila.ids)
+                if filas:
+                    ultimo = filas[-1].id
+            except Exception as e:
+                self.errores += 1
+                print("⚠️ Error leyendo eventos_cache:", e)
+            self._parar.wait(BUS_INTERVALO_SEG)
+
+    def iniciar(self, engine=engine_default, loop=None):
+        """Arranca el hilo receptor; `loop` es el event loop donde corren los suscriptores `en_loop`."""
+        if self._hilo is not None:
+            return
+        self._loop = loop
+        self._parar.clear()
+        if engine.dialect.name == "postgresql":
+            self.modo = "notify"
+            destino = self._escuchar_postgres
+        else:
+            self.modo = "polling"
+            destino = self._leer_eventos
+        self._hilo = threading.Thread(target=destino, args=(engine,), name="bus-invalidacion", daemon=True)
+        self._hilo.start()
+
+    def detener(self, timeout: float = 5.0):
+        if self._hilo is None:
+            return
+        self._parar.set()
+        self._hilo.join(timeout)
+        self._hilo = None
+        self._loop = None
+
+    def estadisticas(self):
+        return {
+            "modo": self.modo,
+            "activo": self._hilo is not None and self._hilo.is_alive(),
+            "suscripciones": sorted(self._suscriptores),
+            "publicados": self.publicados,
+            "recibidos": self.recibidos,
+            "errores": self.errores,
+            "reconexiones": self.reconexiones,
+        }
+
+
+bus = BusInvalidacion()
@@ -0,0 +1,67 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheLRU:
+    """Cache en memoria, acotada por cantidad de entradas (LRU) y con vencimiento por entrada."""
+
+    def __init__(self, max_entradas: int = 1024, ttl: float = None, reloj=time.time):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._reloj = reloj
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.desalojos = 0
+
+    def obtener(self, clave, default=None):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                self.misses += 1
+                return default
+
+            valor, vence = entrada
+            if vence is not None and self._reloj() >= vence:
+                del self._datos[clave]
+                self.misses += 1
+                return default
+
+            self._datos.move_to_end(clave)
+            self.hits += 1
+            return valor
+
+    def guardar(self, clave, valor, ttl: float = None, vence: float = None):
+        """`vence` es un instante absoluto del reloj de la cache; `ttl`, segundos desde ahora."""
+        if vence is None:
+            ttl = ttl if ttl is not None else self.ttl
+            vence = self._reloj() + ttl if ttl is not None else None
+
+        with self._lock:
+            self._datos[clave] = (valor, vence)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+                self.desalojos += 1
+
+    def invalidar(self, clave):
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+    def estadisticas(self):
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                "entradas": len(self._datos),
+                "max_entradas": self.max_entradas,
+                "hits": self.hits,
+                "misses": self.misses,
+                "desalojos": self.desalojos,
+                "tasa_aciertos": round(self.hits / consultas, 4) if consultas else None,
+            }
@@ -0,0 +1,128 @@
+import os
+import threading
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from backend_costeo.bus import bus, publicar, publicar_ahora
+from backend_costeo.cache import CacheLRU
+from backend_costeo.database import SessionLocal
+from backend_costeo.models import ListaPrecioConfig, ListaPrecioItem
+from backend_costeo.serializacion import armar_listas, consulta_listas, consulta_items_listas
+
+# =========================
+# Cache read-through de listas de precios ya armadas (config + ítems), por código.
+# Las escrituras anotan en la sesión qué listas tocaron y se invalidan recién
+# después del commit; la generación evita guardar lecturas que se cruzaron con él.
+# Los demás workers se enteran por el bus de invalidación.
+# =========================
+
+LISTAS_CACHE_MAX = int(os.getenv("LISTAS_CACHE_MAX", "2048"))
+
+cache_listas = CacheLRU(max_entradas=LISTAS_CACHE_MAX)
+
+_PENDIENTES = "listas_invalidadas"
+_TODAS = "listas_invalidar_todas"
+
+_lock = threading.Lock()
+_generacion = 0
+
+
+def _invalidar(codigos=None):
+    global _generacion
+    with _lock:
+        _generacion += 1
+        if codigos is None:
+            cache_listas.limpiar()
+        else:
+            for codigo in codigos:
+                cache_listas.invalidar(codigo)
+
+
+bus.suscribir("lista_precio", _invalidar)
+
+
+def vaciar():
+    """Vacía la cache en este worker y avisa a los demás."""
+    _invalidar()
+    publicar_ahora("lista_precio")
+
+
+def invalidar_listas(db: Session, codigos):
+    codigos = {c for c in codigos if c is not None}
+    db.info.setdefault(_PENDIENTES, set()).update(codigos)
+    publicar(db, "lista_precio", codigos)
+
+
+def invalidar_por_items(db: Session, item_ids):
+    """Invalida las listas que contienen alguno de estos ítems de costo."""
+    item_ids = list(item_ids)
+    if item_ids:
+        invalidar_listas(db, db.execute(
+            select(ListaPrecioItem.lista_codigo).where(ListaPrecioItem.item_id.in_(item_ids)).distinct()
+        ).scalars())
+
+
+def invalidar_todas(db: Session):
+    db.info[_TODAS] = True
+    publicar(db, "lista_precio")
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _aplicar_invalidaciones(session):
+    if session.info.pop(_TODAS, False):
+        session.info.pop(_PENDIENTES, None)
+        _invalidar()
+        return
+    codigos = session.info.pop(_PENDIENTES, None)
+    if codigos:
+        _invalidar(codigos)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _descartar_invalidaciones(session):
+    session.info.pop(_PENDIENTES, None)
+    session.info.pop(_TODAS, None)
+
+
+def _guardar(listas, generacion: int):
+    with _lock:
+        # Si hubo una invalidación mientras se leía, la lectura puede estar vieja: no se guarda
+        if generacion != _generacion:
+            return
+        for lista in listas:
+            cache_listas.guardar(lista["codigo"], lista)
+
+
+async def listas_cacheadas(lector, codigos=None) -> list[dict]:
+    """Listas armadas (sin redondear totales) desde la cache; solo las faltantes van a la base.
+
+    Los dicts devueltos son compartidos: no modificarlos.
+    """
+    todas = codigos is None
+    if todas:
+        codigos = [fila.codigo for fila in await lector.todas(
+            select(ListaPrecioConfig.codigo).order_by(ListaPrecioConfig.codigo)
+        )]
+
+    generacion = _generacion
+    encontradas = {}
+    faltantes = []
+    for codigo in codigos:
+        lista = cache_listas.obtener(codigo)
+        if lista is None:
+            faltantes.append(codigo)
+        else:
+            encontradas[codigo] = lista
+
+    if faltantes:
+        # Cache fría: dos consultas completas en vez de un IN con todos los códigos
+        filtro = None if todas and len(faltantes) == len(codigos) else faltantes
+        armadas = armar_listas(
+            await lector.todas(consulta_listas(filtro)),
+            await lector.todas(consulta_items_listas(filtro)),
+        )
+        _guardar(armadas, generacion)
+        encontradas.update((lista["codigo"], lista) for lista in armadas)
+
+    return [encontradas[codigo] for codigo in codigos if codigo in encontradas]
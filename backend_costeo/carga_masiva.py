@@ -0,0 +1,441 @@
+import csv
+import io
+import os
+from datetime import datetime
+
+from sqlalchemy import Table, Column, Integer, String, Float, MetaData, Index
+from sqlalchemy import select, insert, update, delete, exists, func, literal, and_, or_
+from sqlalchemy.orm import Session
+
+from backend_costeo.models import (
+    Producto,
+    CostoItem,
+    CostoHistorial,
+    ListaPrecioItem,
+    CatalogoItem,
+    CotizacionItem,
+)
+from backend_costeo.historial import fila_cambio, registrar_cambios
+from backend_costeo.versiones import tocar
+
+# =========================
+# Carga masiva de ítems de costo: staging temporal (COPY en Postgres, executemany en SQLite)
+# y luego un UPDATE ... FROM y un INSERT ... SELECT por clave. `codigo` no es único en la
+# tabla (hay datos históricos duplicados), por eso no se usa ON CONFLICT.
+# =========================
+
+CARGA_LOTE = int(os.getenv("CARGA_LOTE", "5000"))
+
+COLUMNAS_COSTO = ["codigo", "nombre", "tipo", "subtipo", "unidad", "coeficiente", "costo_fob", "costo_fabrica"]
+COLUMNAS_NUMERICAS = {"coeficiente", "costo_fob", "costo_fabrica"}
+
+staging = Table(
+    "costos_items_staging",
+    MetaData(),
+    Column("orden", Integer, nullable=False),
+    Column("clave", String, nullable=False),
+    Column("codigo", String),
+    Column("nombre", String),
+    Column("tipo", String),
+    Column("subtipo", String),
+    Column("unidad", String),
+    Column("coeficiente", Float),
+    Column("costo_fob", Float),
+    Column("costo_fabrica", Float),
+    Index("ix_costos_items_staging_clave", "clave"),
+    Index("ix_costos_items_staging_codigo", "codigo"),
+    Index("ix_costos_items_staging_nombre", "tipo", "subtipo", "nombre"),
+    prefixes=["TEMPORARY"],
+)
+
+
+def fila_costo(tipo: str, subtipo: str, item: dict) -> dict:
+    """Convierte un ítem del JSON de costos en una fila de `costos_items`."""
+    return {
+        "codigo": item.get("codigo") or None,
+        "nombre": item.get("denominacion"),
+        "tipo": tipo,
+        "subtipo": subtipo,
+        "unidad": item.get("unidad"),
+        "coeficiente": item.get("coeficiente"),
+        "costo_fob": item.get("costo_fob"),
+        "costo_fabrica": item.get("costo_fabrica"),
+    }
+
+
+def clave_costo(fila: dict) -> str:
+    """Clave de coincidencia: el código si existe, si no (tipo, subtipo, nombre)."""
+    if fila.get("codigo"):
+        return "c:" + fila["codigo"]
+    return "n:" + "\x1f".join(str(fila.get(c) or "") for c in ("tipo", "subtipo", "nombre"))
+
+
+def _a_float(valor):
+    if valor is None or valor == "":
+        return None
+    return float(valor)
+
+
+def _campo_csv(valor) -> str:
+    # COPY ... csv lee un campo vacío sin comillas como NULL y uno entre comillas como texto.
+    # csv.writer no sirve: con QUOTE_NONNUMERIC escribe None como "" (texto vacío, no NULL).
+    if valor is None:
+        return ""
+    if isinstance(valor, str):
+        return '"' + valor.replace('"', '""') + '"'
+    return repr(valor)
+
+
+def _copiar_postgres(conn, filas):
+    buffer = io.StringIO()
+    columnas = [c.name for c in staging.columns]
+    for fila in filas:
+        buffer.write(",".join(_campo_csv(fila.get(c)) for c in columnas))
+        buffer.write("\n")
+    buffer.seek(0)
+
+    cursor = conn.connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {staging.name} ({', '.join(columnas)}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+    finally:
+        cursor.close()
+
+
+def _copiar_executemany(conn, filas):
+    conn.execute(insert(staging), filas)
+
+
+def cargar_staging(conn, filas, lote: int = CARGA_LOTE) -> int:
+    """Crea la tabla temporal y la llena en lotes de tamaño fijo. Devuelve las filas leídas."""
+    staging.drop(conn, checkfirst=True)
+    staging.create(conn)
+
+    copiar = _copiar_postgres if conn.dialect.name == "postgresql" else _copiar_executemany
+    leidas = 0
+    pendientes = []
+    for fila in filas:
+        fila = {c: fila.get(c) for c in COLUMNAS_COSTO}
+        for c in COLUMNAS_NUMERICAS:
+            fila[c] = _a_float(fila[c])
+        fila["orden"] = leidas
+        fila["clave"] = clave_costo(fila)
+        pendientes.append(fila)
+        leidas += 1
+        if len(pendientes) >= lote:
+            copiar(conn, pendientes)
+            pendientes = []
+    if pendientes:
+        copiar(conn, pendientes)
+
+    # Claves repetidas en el archivo: gana la última aparición
+    posterior = staging.alias("posterior")
+    conn.execute(
+        delete(staging).where(
+            exists().where(posterior.c.clave == staging.c.clave, posterior.c.orden > staging.c.orden)
+        )
+    )
+    return leidas
+
+
+def modos_coincidencia():
+    """(filtro sobre staging, condición de coincidencia con costos_items, columnas comparables)."""
+    t = CostoItem.__table__
+    return [
+        (
+            staging.c.codigo.is_not(None),
+            t.c.codigo == staging.c.codigo,
+            ["nombre", "tipo", "subtipo", "unidad", "coeficiente", "costo_fob", "costo_fabrica"],
+        ),
+        (
+            staging.c.codigo.is_(None),
+            and_(
+                t.c.codigo.is_(None),
+                t.c.tipo == staging.c.tipo,
+                t.c.subtipo == staging.c.subtipo,
+                t.c.nombre == staging.c.nombre,
+            ),
+            ["unidad", "coeficiente", "costo_fob", "costo_fabrica"],
+        ),
+    ]
+
+
+def _eliminar_sobrantes(conn) -> dict:
+    """Borra ítems que ya no están en el archivo y duplicados por clave (queda el de menor id).
+
+    Los ítems usados por listas, catálogo o cotizaciones se conservan y se informan.
+    """
+    t = CostoItem.__table__
+    historial = CostoHistorial.__table__
+    anterior = t.alias("anterior")
+
+    # Un criterio por modo de clave, para que cada EXISTS use su índice
+    sobrantes = [
+        and_(
+            t.c.codigo.is_not(None),
+            or_(
+                ~exists().where(staging.c.codigo == t.c.codigo),
+                exists().where(anterior.c.codigo == t.c.codigo, anterior.c.id < t.c.id),
+            ),
+        ),
+        and_(
+            t.c.codigo.is_(None),
+            or_(
+                ~exists().where(
+                    staging.c.codigo.is_(None),
+                    staging.c.tipo == t.c.tipo,
+                    staging.c.subtipo == t.c.subtipo,
+                    staging.c.nombre == t.c.nombre,
+                ),
+                exists().where(
+                    anterior.c.codigo.is_(None),
+                    anterior.c.tipo == t.c.tipo,
+                    anterior.c.subtipo == t.c.subtipo,
+                    anterior.c.nombre == t.c.nombre,
+                    anterior.c.id < t.c.id,
+                ),
+            ),
+        ),
+    ]
+
+    eliminados = 0
+    conservados = 0
+    for sobrante in sobrantes:
+        ids = conn.execute(select(t.c.id).where(sobrante)).scalars().all()
+        for inicio in range(0, len(ids), CARGA_LOTE):
+            lote = ids[inicio:inicio + CARGA_LOTE]
+            referenciados = set()
+            for origen in (ListaPrecioItem, CatalogoItem, CotizacionItem):
+                referenciados.update(conn.execute(
+                    select(origen.item_id).where(origen.item_id.in_(lote)).distinct()
+                ).scalars())
+            conservados += len(referenciados)
+
+            eliminar = [i for i in lote if i not in referenciados]
+            if eliminar:
+                conn.execute(delete(historial).where(historial.c.costo_item_id.in_(eliminar)))
+                eliminados += conn.execute(delete(t).where(t.c.id.in_(eliminar))).rowcount
+
+    return {"eliminados": eliminados, "conservados_referenciados": conservados}
+
+
+def cargar_costos(db: Session, filas, lote: int = CARGA_LOTE, sincronizar: bool = False) -> dict:
+    """
+    Upsert masivo de ítems de costo por clave. No hace commit.
+    Devuelve cuántas filas se leyeron, insertaron, actualizaron y quedaron sin cambios.
+
+    Con `sincronizar=True` la tabla queda igual al archivo: se borran los ítems que
+    faltan y los duplicados, se guarda CostoHistorial de cada costo modificado y se
+    devuelven en `ids_costo_modificado` los ítems cuyo costo_fabrica cambió.
+    """
+    conn = db.connection()
+    t = CostoItem.__table__
+    historial = CostoHistorial.__table__
+
+    leidas = cargar_staging(conn, filas, lote)
+    unicas = conn.execute(select(func.count()).select_from(staging)).scalar()
+
+    resultado = {"leidos": leidas}
+    if sincronizar:
+        resultado.update(_eliminar_sobrantes(conn))
+        resultado["ids_costo_modificado"] = []
+
+    insertados = 0
+    actualizados = 0
+    for filtro, coincide, columnas in modos_coincidencia():
+        distinto = or_(*[t.c[c].is_distinct_from(staging.c[c]) for c in columnas])
+
+        actualizados += conn.execute(
+            select(func.count()).select_from(staging).where(filtro, exists().where(coincide, distinto))
+        ).scalar()
+
+        if sincronizar:
+            costo_distinto = or_(*[t.c[c].is_distinct_from(staging.c[c]) for c in COLUMNAS_NUMERICAS])
+            # Historial con los valores previos al cambio, como en la edición individual
+            conn.execute(
+                insert(historial).from_select(
+                    ["costo_item_id", "costo_fabrica", "costo_fob", "coeficiente", "fecha"],
+                    select(t.c.id, t.c.costo_fabrica, t.c.costo_fob, t.c.coeficiente, literal(datetime.utcnow()))
+                    .where(filtro, coincide, costo_distinto),
+                )
+            )
+            resultado["ids_costo_modificado"] += conn.execute(
+                select(t.c.id).where(filtro, coincide, t.c.costo_fabrica.is_distinct_from(staging.c.costo_fabrica))
+            ).scalars().all()
+
+        conn.execute(
+            t.update()
+            .where(filtro, coincide, distinto)
+            .values({c: staging.c[c] for c in columnas})
+        )
+
+        insertados += conn.execute(
+            insert(t).from_select(
+                COLUMNAS_COSTO,
+                select(*[staging.c[c] for c in COLUMNAS_COSTO])
+                .where(filtro, ~exists().where(coincide))
+                .order_by(staging.c.orden),
+            )
+        ).rowcount
+
+    staging.drop(conn)
+    # Se escribe por la conexión, fuera de los eventos del ORM: se marca a mano para el ETag
+    if insertados or actualizados or resultado.get("eliminados"):
+        tocar(db, "costos_items")
+    resultado.update({
+        "insertados": insertados,
+        "actualizados": actualizados,
+        "sin_cambios": unicas - insertados - actualizados,
+    })
+    return resultado
+
+
+def cargar_productos(db: Session, filas, lote: int = CARGA_LOTE) -> int:
+    """Inserta productos en lotes, omitiendo códigos que ya existen. No hace commit."""
+    existentes = set(db.execute(select(Producto.codigo)).scalars())
+    insertados = 0
+    pendientes = []
+    for fila in filas:
+        if fila["codigo"] in existentes:
+            continue
+        existentes.add(fila["codigo"])
+        pendientes.append(fila)
+        if len(pendientes) >= lote:
+            db.execute(insert(Producto), pendientes)
+            insertados += len(pendientes)
+            pendientes = []
+    if pendientes:
+        db.execute(insert(Producto), pendientes)
+        insertados += len(pendientes)
+    return insertados
+
+
+# =========================
+# Actualización masiva de costos (PATCH /api/costos/bulk)
+# =========================
+
+CAMPOS_COSTO = ("costo_fabrica", "costo_fob", "coeficiente")
+
+
+def cambios_desde_csv(texto: str) -> list[dict]:
+    """Filas de un CSV con encabezado id/codigo + campos de costo. Las celdas vacías no se tocan."""
+    lector = csv.DictReader(io.StringIO(texto.lstrip("\ufeff")))
+    cambios = []
+    for fila in lector:
+        cambio = {k.strip(): v.strip() for k, v in fila.items() if k and v is not None and v.strip() != ""}
+        cambios.append(cambio)
+    return cambios
+
+
+def normalizar_cambios(cambios) -> tuple[list[dict], list[dict]]:
+    """Valida cada cambio y convierte los costos a float. Devuelve (válidos, errores)."""
+    validos, errores = [], []
+    for fila, cambio in enumerate(cambios, start=1):
+        if not isinstance(cambio, dict):
+            errores.append({"fila": fila, "error": "se esperaba un objeto"})
+            continue
+
+        item_id = cambio.get("id")
+        codigo = cambio.get("codigo")
+        if item_id in (None, "") and not codigo:
+            errores.append({"fila": fila, "error": "falta id o codigo"})
+            continue
+
+        normalizado = {"fila": fila, "id": None, "codigo": None, "valores": {}}
+        try:
+            if item_id not in (None, ""):
+                normalizado["id"] = int(item_id)
+            else:
+                normalizado["codigo"] = str(codigo)
+            for campo in CAMPOS_COSTO:
+                if campo in cambio:
+                    normalizado["valores"][campo] = _a_float(cambio[campo])
+        except (TypeError, ValueError):
+            errores.append({"fila": fila, "error": "valor numérico inválido"})
+            continue
+
+        if not normalizado["valores"]:
+            errores.append({"fila": fila, "error": "sin campos de costo"})
+            continue
+        validos.append(normalizado)
+    return validos, errores
+
+
+def _en_lotes(valores):
+    valores = list(valores)
+    for inicio in range(0, len(valores), CARGA_LOTE):
+        yield valores[inicio:inicio + CARGA_LOTE]
+
+
+def actualizar_costos_lote(db: Session, usuario: dict, cambios: list[dict]) -> dict:
+    """
+    Aplica cambios de costo ya normalizados con un UPDATE por lotes (executemany por PK),
+    un INSERT masivo de CostoHistorial y otro de HistorialCambio. No hace commit.
+    Devuelve el resumen y en `ids_costo_modificado` los ítems cuyo costo_fabrica cambió.
+    """
+    columnas = (CostoItem.id, CostoItem.codigo, CostoItem.nombre, *[CostoItem.__table__.c[c] for c in CAMPOS_COSTO])
+
+    # Resolución de referencias: una consulta IN por lote de ids y otra por lote de códigos
+    actuales = {}
+    por_codigo = {}
+    for lote in _en_lotes({c["id"] for c in cambios if c["id"] is not None}):
+        for fila in db.execute(select(*columnas).where(CostoItem.id.in_(lote))):
+            actuales[fila.id] = fila
+    for lote in _en_lotes({c["codigo"] for c in cambios if c["codigo"] is not None}):
+        for fila in db.execute(select(*columnas).where(CostoItem.codigo.in_(lote))):
+            actuales[fila.id] = fila
+            por_codigo.setdefault(fila.codigo, []).append(fila.id)
+
+    # Valores finales por ítem (si un ítem aparece varias veces, gana la última fila)
+    nuevos = {}
+    no_encontrados = []
+    for cambio in cambios:
+        ids = [cambio["id"]] if cambio["id"] is not None else por_codigo.get(cambio["codigo"], [])
+        ids = [i for i in ids if i in actuales]
+        if not ids:
+            no_encontrados.append({"fila": cambio["fila"], "id": cambio["id"], "codigo": cambio["codigo"]})
+            continue
+        for item_id in ids:
+            nuevos.setdefault(item_id, {}).update(cambio["valores"])
+
+    ahora = datetime.utcnow()
+    actualizaciones, historial, auditoria, ids_costo_modificado = [], [], [], []
+    for item_id, valores in nuevos.items():
+        actual = actuales[item_id]
+        modificados = {c: v for c, v in valores.items() if getattr(actual, c) != v}
+        if not modificados:
+            continue
+
+        historial.append({
+            "costo_item_id": item_id,
+            "costo_fabrica": actual.costo_fabrica,
+            "costo_fob": actual.costo_fob,
+            "coeficiente": actual.coeficiente,
+            "fecha": ahora,
+        })
+        fila = {"id": item_id}
+        for campo in CAMPOS_COSTO:
+            fila[campo] = modificados.get(campo, getattr(actual, campo))
+            if campo in modificados:
+                auditoria.append(fila_cambio(
+                    usuario, "editar", "costo_item", item_id, actual.nombre,
+                    campo=campo, valor_anterior=getattr(actual, campo), valor_nuevo=modificados[campo],
+                ))
+        actualizaciones.append(fila)
+        if "costo_fabrica" in modificados:
+            ids_costo_modificado.append(item_id)
+
+    if actualizaciones:
+        db.execute(update(CostoItem), actualizaciones)
+        db.execute(insert(CostoHistorial), historial)
+        registrar_cambios(db, auditoria)
+
+    return {
+        "recibidos": len(cambios),
+        "actualizados": len(actualizaciones),
+        "sin_cambios": len(nuevos) - len(actualizaciones),
+        "no_encontrados": no_encontrados,
+        "ids_costo_modificado": ids_costo_modificado,
+    }
@@ -0,0 +1,102 @@
+import os
+import time
+import threading
+import httpx
+
+SUPABASE_POOL_MAX = int(os.getenv("SUPABASE_POOL_MAX", "20"))
+SUPABASE_KEEPALIVE_MAX = int(os.getenv("SUPABASE_KEEPALIVE_MAX", "10"))
+SUPABASE_KEEPALIVE_SEG = float(os.getenv("SUPABASE_KEEPALIVE_SEG", "30"))
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+SUPABASE_CONNECT_TIMEOUT = float(os.getenv("SUPABASE_CONNECT_TIMEOUT", "5"))
+SUPABASE_HTTP2 = os.getenv("SUPABASE_HTTP2", "1") == "1"
+
+_cliente = None
+_metricas = {}
+_lock = threading.Lock()
+
+
+def _http2_disponible():
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _crear_cliente():
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=SUPABASE_POOL_MAX,
+            max_keepalive_connections=SUPABASE_KEEPALIVE_MAX,
+            keepalive_expiry=SUPABASE_KEEPALIVE_SEG,
+        ),
+        timeout=httpx.Timeout(SUPABASE_TIMEOUT, connect=SUPABASE_CONNECT_TIMEOUT),
+        http2=SUPABASE_HTTP2 and _http2_disponible(),
+    )
+
+
+async def iniciar():
+    global _cliente
+    if _cliente is None:
+        _cliente = _crear_cliente()
+
+
+async def cerrar():
+    global _cliente
+    if _cliente is not None:
+        await _cliente.aclose()
+        _cliente = None
+
+
+def get_cliente() -> httpx.AsyncClient:
+    # Fuera del lifespan (scripts, tests) el cliente se crea a demanda
+    global _cliente
+    if _cliente is None:
+        _cliente = _crear_cliente()
+    return _cliente
+
+
+def _registrar(operacion: str, duracion_ms: float, error: bool):
+    with _lock:
+        m = _metricas.setdefault(operacion, {
+            "llamadas": 0,
+            "errores": 0,
+            "total_ms": 0.0,
+            "max_ms": 0.0,
+        })
+        m["llamadas"] += 1
+        m["total_ms"] += duracion_ms
+        m["max_ms"] = max(m["max_ms"], duracion_ms)
+        if error:
+            m["errores"] += 1
+
+
+async def solicitar(operacion: str, metodo: str, url: str, **kwargs) -> httpx.Response:
+    """Hace una llamada a Supabase con el cliente compartido y mide su latencia."""
+    inicio = time.perf_counter()
+    error = True
+    try:
+        response = await get_cliente().request(metodo, url, **kwargs)
+        error = response.status_code >= 500
+        return response
+    finally:
+        _registrar(operacion, (time.perf_counter() - inicio) * 1000, error)
+
+
+def estadisticas():
+    with _lock:
+        operaciones = {
+            operacion: {
+                "llamadas": m["llamadas"],
+                "errores": m["errores"],
+                "promedio_ms": round(m["total_ms"] / m["llamadas"], 2) if m["llamadas"] else None,
+                "max_ms": round(m["max_ms"], 2),
+            }
+            for operacion, m in _metricas.items()
+        }
+    return {
+        "http2": SUPABASE_HTTP2 and _http2_disponible(),
+        "pool_max": SUPABASE_POOL_MAX,
+        "keepalive_max": SUPABASE_KEEPALIVE_MAX,
+        "operaciones": operaciones,
+    }
@@ -1,6 +1,9 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool
 import os
+import time
+import threading
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
@@ -12,7 +15,60 @@ if not DATABASE_URL:
 if DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-engine = create_engine(DATABASE_URL)
+# Sin driver explícito, SQLAlchemy 2.1 elige psycopg (3); el bus (LISTEN) y la carga masiva
+# (COPY) usan la API de psycopg2, que es el driver de requirements.txt
+if DATABASE_URL.startswith("postgresql://"):
+    DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+psycopg2://", 1)
+
+# Pool de conexiones (solo Postgres). Render corta las conexiones ociosas,
+# por eso por defecto se reciclan a los 5 minutos y se validan con pre-ping.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "300"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+DB_APPLICATION_NAME = os.getenv("DB_APPLICATION_NAME", "costeo-dcm")
+
+
+class PoolMedido(QueuePool):
+    """QueuePool que registra cuánto espera cada checkout de conexión."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock_metricas = threading.Lock()
+        self.checkouts = 0
+        self.espera_total_ms = 0.0
+        self.espera_max_ms = 0.0
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            espera_ms = (time.perf_counter() - inicio) * 1000
+            with self._lock_metricas:
+                self.checkouts += 1
+                self.espera_total_ms += espera_ms
+                self.espera_max_ms = max(self.espera_max_ms, espera_ms)
+
+
+if DATABASE_URL.startswith("postgresql"):
+    engine = create_engine(
+        DATABASE_URL,
+        poolclass=PoolMedido,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args={
+            "application_name": DB_APPLICATION_NAME,
+            "options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}",
+        },
+    )
+else:
+    engine = create_engine(DATABASE_URL, pool_pre_ping=DB_POOL_PRE_PING)
 
 SessionLocal = sessionmaker(
     autocommit=False,
@@ -20,5 +76,58 @@ SessionLocal = sessionmaker(
     bind=engine
 )
 
+# Motor async opcional (asyncpg) para endpoints de solo lectura. Se activa con DATABASE_ASYNC=1.
+DATABASE_ASYNC = os.getenv("DATABASE_ASYNC", "0") == "1"
+async_engine = None
+AsyncSessionLocal = None
+
+if DATABASE_ASYNC:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+    if DATABASE_URL.startswith("postgresql"):
+        async_engine = create_async_engine(
+            DATABASE_URL.replace("postgresql+psycopg2://", "postgresql+asyncpg://", 1),
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=DB_POOL_PRE_PING,
+            connect_args={
+                "server_settings": {
+                    "application_name": DB_APPLICATION_NAME,
+                    "statement_timeout": str(DB_STATEMENT_TIMEOUT_MS),
+                },
+            },
+        )
+    else:
+        # Desarrollo local con SQLite (requiere aiosqlite)
+        async_engine = create_async_engine(DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1))
+
+    AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
 Base = declarative_base()
 
+
+def estadisticas_pool(pool=None):
+    pool = pool if pool is not None else engine.pool
+    if not isinstance(pool, PoolMedido):
+        return {"tipo": type(pool).__name__}
+
+    # max_overflow negativo (p. ej. DB_MAX_OVERFLOW=-1) significa overflow sin límite:
+    # no hay capacidad máxima contra la cual medir la utilización
+    ilimitado = pool._max_overflow < 0
+    capacidad = None if ilimitado else pool.size() + pool._max_overflow
+    with pool._lock_metricas:
+        return {
+            "tipo": type(pool).__name__,
+            "tamano": pool.size(),
+            "max_overflow": None if ilimitado else pool._max_overflow,
+            "overflow_ilimitado": ilimitado,
+            "en_uso": pool.checkedout(),
+            "disponibles": pool.checkedin(),
+            "overflow": pool.overflow(),
+            "utilizacion": round(pool.checkedout() / capacidad, 4) if capacidad else None,
+            "checkouts": pool.checkouts,
+            "espera_promedio_ms": round(pool.espera_total_ms / pool.checkouts, 3) if pool.checkouts else None,
+            "espera_max_ms": round(pool.espera_max_ms, 3),
+        }
@@ -1,7 +1,12 @@
+import atexit
+import os
+import queue
+import threading
+import time
 from sqlalchemy.orm import Session
-from sqlalchemy import Column, Integer, String, DateTime
-from datetime import datetime
-from backend_costeo.database import Base
+from sqlalchemy import Column, Integer, String, DateTime, Index, event
+from datetime import datetime, timezone
+from backend_costeo.database import Base, SessionLocal, engine
 
 class HistorialCambio(Base):
     __tablename__ = "historial_cambios"
@@ -16,10 +21,21 @@ class HistorialCambio(Base):
     valor_anterior = Column(String)
     valor_nuevo = Column(String)
     fecha = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        # Paginación por cursor (fecha, id) sobre todo el historial y por entidad
+        Index("ix_historial_cambios_fecha", "fecha", "id"),
+        Index("ix_historial_cambios_entidad_fecha", "entidad", "entidad_id", "fecha", "id"),
+    )
 
 
-def registrar_cambio(
-    db: Session,
+def utc_naive(fecha: datetime):
+    # El historial guarda UTC sin zona; una fecha con zona (p. ej. "...Z") se lleva a ese formato
+    if fecha is None or fecha.tzinfo is None:
+        return fecha
+    return fecha.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def fila_cambio(
     usuario: dict,
     accion: str,
     entidad: str,
@@ -28,8 +44,8 @@ def registrar_cambio(
     campo: str = None,
     valor_anterior=None,
     valor_nuevo=None
-):
-    db.add(HistorialCambio(
+) -> dict:
+    return dict(
         usuario_email=usuario.get("email"),
         usuario_nombre=f"{usuario.get('nombre', '')} {usuario.get('apellido', '')}".strip(),
         accion=accion,
@@ -39,4 +55,156 @@ def registrar_cambio(
         campo=campo,
         valor_anterior=str(valor_anterior) if valor_anterior is not None else None,
         valor_nuevo=str(valor_nuevo) if valor_nuevo is not None else None,
-    ))
\ No newline at end of file
+        fecha=datetime.utcnow(),
+    )
+
+
+def registrar_cambio(
+    db: Session,
+    usuario: dict,
+    accion: str,
+    entidad: str,
+    entidad_id: str,
+    entidad_nombre: str,
+    campo: str = None,
+    valor_anterior=None,
+    valor_nuevo=None
+):
+    """Acumula el cambio en la sesión; se escribe junto con los demás al hacer commit."""
+    registrar_cambios(db, [fila_cambio(
+        usuario, accion, entidad, entidad_id, entidad_nombre,
+        campo=campo, valor_anterior=valor_anterior, valor_nuevo=valor_nuevo,
+    )])
+
+
+def registrar_cambios(db: Session, filas: list[dict]):
+    """Acumula muchas filas de fila_cambio() en la sesión."""
+    if filas:
+        db.info.setdefault(_PENDIENTES, []).extend(filas)
+
+
+# =========================
+# Escritura de la auditoría: un INSERT multi-fila por transacción, o bien
+# (HISTORIAL_WRITE_BEHIND=1) una cola acotada que un hilo escribe por lotes
+# fuera del request, después de que la transacción confirmó.
+# =========================
+
+_PENDIENTES = "auditoria_pendiente"
+
+HISTORIAL_WRITE_BEHIND = os.getenv("HISTORIAL_WRITE_BEHIND", "0") == "1"
+HISTORIAL_COLA_MAX = int(os.getenv("HISTORIAL_COLA_MAX", "10000"))
+HISTORIAL_LOTE = int(os.getenv("HISTORIAL_LOTE", "500"))
+HISTORIAL_INTERVALO_SEG = float(os.getenv("HISTORIAL_INTERVALO_SEG", "1"))
+
+_FIN = object()
+
+
+class EscritorAuditoria:
+    """Hilo que vacía una cola acotada de filas de HistorialCambio en INSERTs por lotes."""
+
+    def __init__(self, engine, max_cola: int = HISTORIAL_COLA_MAX, lote: int = HISTORIAL_LOTE,
+                 intervalo: float = HISTORIAL_INTERVALO_SEG):
+        self._engine = engine
+        self._cola = queue.Queue(maxsize=max_cola)
+        self.lote = lote
+        self.intervalo = intervalo
+        self._hilo = None
+        self._lock = threading.Lock()
+        self.escritas = 0
+        self.lotes = 0
+        self.directas = 0
+        self.errores = 0
+
+    def iniciar(self):
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._bucle, name="escritor-auditoria", daemon=True)
+                self._hilo.start()
+
+    def detener(self, timeout: float = 10):
+        """Escribe lo que quede en la cola y termina el hilo."""
+        hilo = self._hilo
+        if hilo is None or not hilo.is_alive():
+            return
+        self._cola.put(_FIN)
+        hilo.join(timeout)
+
+    def encolar(self, filas: list[dict]):
+        self.iniciar()
+        for posicion, fila in enumerate(filas):
+            try:
+                self._cola.put_nowait(fila)
+            except queue.Full:
+                # Cola llena: el request escribe el resto él mismo en vez de perder registros
+                self._escribir(filas[posicion:], directas=True)
+                return
+
+    def _bucle(self):
+        while True:
+            fila = self._cola.get()
+            if fila is _FIN:
+                return
+            lote = [fila]
+            limite = time.monotonic() + self.intervalo
+            while len(lote) < self.lote:
+                try:
+                    fila = self._cola.get(timeout=max(0.0, limite - time.monotonic()))
+                except queue.Empty:
+                    break
+                if fila is _FIN:
+                    self._escribir(lote)
+                    return
+                lote.append(fila)
+            self._escribir(lote)
+
+    def _escribir(self, filas: list[dict], directas: bool = False):
+        try:
+            with self._engine.begin() as conn:
+                conn.execute(HistorialCambio.__table__.insert(), filas)
+        except Exception as e:
+            print("❌ Error escribiendo auditoría:", e)
+            with self._lock:
+                self.errores += len(filas)
+            return
+        with self._lock:
+            self.escritas += len(filas)
+            self.lotes += 1
+            if directas:
+                self.directas += len(filas)
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "write_behind": HISTORIAL_WRITE_BEHIND,
+                "en_cola": self._cola.qsize(),
+                "max_cola": self._cola.maxsize,
+                "escritas": self.escritas,
+                "lotes": self.lotes,
+                "directas": self.directas,
+                "errores": self.errores,
+            }
+
+
+escritor_auditoria = EscritorAuditoria(engine)
+atexit.register(escritor_auditoria.detener)
+
+
+@event.listens_for(SessionLocal, "before_commit")
+def _escribir_auditoria(session):
+    if HISTORIAL_WRITE_BEHIND:
+        return
+    filas = session.info.pop(_PENDIENTES, None)
+    if filas:
+        session.execute(HistorialCambio.__table__.insert(), filas)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _encolar_auditoria(session):
+    filas = session.info.pop(_PENDIENTES, None)
+    if filas:
+        escritor_auditoria.encolar(filas)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _descartar_auditoria(session):
+    session.info.pop(_PENDIENTES, None)
@@ -1,5 +1,5 @@
-import json
 import sys
+from sqlalchemy import select, insert
 from pathlib import Path
 
 # --- 🔧 Asegurar que Python vea el paquete "backend_costeo" ---
@@ -13,11 +13,17 @@ if str(BASE_DIR.parent) not in sys.path:
 try:
     # ✅ Cuando se ejecuta como parte del paquete
     from backend_costeo.database import engine, SessionLocal
-    from backend_costeo.models import Base, Producto, CostoItem, CostoHistorial
+    from backend_costeo.migraciones import migrar
+    from backend_costeo.models import Producto, CostoItem, CostoHistorial
+    from backend_costeo.carga_masiva import fila_costo, cargar_costos, cargar_productos
+    from backend_costeo.lector_json import recorrer_costos, recorrer_productos
 except ModuleNotFoundError:
     # ✅ Cuando se ejecuta directamente o desde un .exe
     from database import engine, SessionLocal
-    from models import Base, Producto, CostoItem, CostoHistorial
+    from migraciones import migrar
+    from models import Producto, CostoItem, CostoHistorial
+    from carga_masiva import fila_costo, cargar_costos, cargar_productos
+    from lector_json import recorrer_costos, recorrer_productos
 
 
 # --- 1️⃣ Detección del directorio base ---
@@ -34,9 +40,9 @@ DB_PATH = BASE_DIR / "costeo.db"
 print(f"🗄️ Usando base de datos en: {DB_PATH}")
 
 
-# --- 2️⃣ Crear tablas ---
-print("🔄 Creando tablas si no existen...")
-Base.metadata.create_all(bind=engine)
+# --- 2️⃣ Crear tablas, índices y versión de esquema (mismo paso que `python -m backend_costeo migrate`) ---
+print("🔄 Migrando esquema...")
+print(f"✅ Esquema en versión {migrar(engine)}")
 
 db = SessionLocal()
 
@@ -48,25 +54,20 @@ if db.query(Producto).count() > 0:
 else:
     if productos_path.exists():
         print(f"📦 Importando productos desde {productos_path.name} ...")
-        with open(productos_path, encoding="utf-8") as f:
-            catalogo = json.load(f)
-
-        count_prod = 0
-        for linea, series in catalogo.items():  # 👈 "Control de acceso", "Parking", etc.
-            for serie, productos in series.items():  # 👈 "GM-GS Series", "MC Series", etc.
-                for p in productos:
-                    # Asegurarse de usar "nombre" correctamente
-                    nombre = p.get("nombre") or p.get("denominacion", "Sin nombre")
-
-                    db.add(Producto(
-                        codigo=p.get("codigo"),
-                        nombre=nombre,              # ✅ ahora sí coincide con tu modelo
-                        linea=linea,
-                        serie=serie,
-                        descripcion=nombre          # opcional, para completar el campo
-                    ))
-                    count_prod += 1
 
+        def filas_productos():
+            # Lectura en streaming: el archivo no se carga entero en memoria
+            for linea, serie, p in recorrer_productos(productos_path):
+                nombre = p.get("nombre") or p.get("denominacion", "Sin nombre")
+                yield {
+                    "codigo": p.get("codigo"),
+                    "nombre": nombre,
+                    "linea": linea,
+                    "serie": serie,
+                    "descripcion": nombre,  # opcional, para completar el campo
+                }
+
+        count_prod = cargar_productos(db, filas_productos())
         db.commit()
         print(f"✅ {count_prod} productos importados correctamente.")
     else:
@@ -80,39 +81,21 @@ if db.query(CostoItem).count() > 0:
 else:
     if costos_path.exists():
         print(f"📦 Importando ítems de costo desde {costos_path.name} ...")
-        with open(costos_path, encoding="utf-8") as f:
-            costos = json.load(f)
-
-        count_costos = 0
-        for tipo, subtipos in costos.items():
-            for subtipo, items in subtipos.items():
-                for it in items:
-                    costo = CostoItem(
-                        tipo=tipo,
-                        subtipo=subtipo,
-                        item=it.get("item"),
-                        codigo=it.get("codigo"),
-                        denominacion=it.get("denominacion"),
-                        unidad=it.get("unidad"),
-                        costo_fabrica=it.get("costo_fabrica"),
-                        costo_fob=it.get("costo_fob"),
-                        coeficiente=it.get("coeficiente"),
-                    )
-                    db.add(costo)
-                    db.flush()
-
-                    # historial inicial
-                    db.add(CostoHistorial(
-                        costo_item_id=costo.id,
-                        costo_fabrica=costo.costo_fabrica,
-                        costo_fob=costo.costo_fob,
-                        coeficiente=costo.coeficiente,
-                    ))
-
-                    count_costos += 1
+
+        def filas_costos():
+            for tipo, subtipo, variante, it in recorrer_costos(costos_path):
+                yield fila_costo(tipo, f"{subtipo} - {variante}" if variante else subtipo, it)
+
+        resultado = cargar_costos(db, filas_costos())
+
+        # historial inicial, en un único INSERT ... SELECT
+        db.execute(insert(CostoHistorial).from_select(
+            ["costo_item_id", "costo_fabrica", "costo_fob", "coeficiente"],
+            select(CostoItem.id, CostoItem.costo_fabrica, CostoItem.costo_fob, CostoItem.coeficiente),
+        ))
 
         db.commit()
-        print(f"✅ {count_costos} ítems de costo importados correctamente.")
+        print(f"✅ {resultado['insertados']} ítems de costo importados correctamente.")
     else:
         print(f"⚠️ Archivo no encontrado: {costos_path}")
 
@@ -0,0 +1,153 @@
+import json
+import os
+
+# =========================
+# Lector incremental de JSON: recorre objetos y arreglos anidados leyendo el archivo
+# por bloques y decodifica solo las hojas (cada ítem) con json.JSONDecoder.raw_decode.
+# La memoria depende del tamaño de un ítem, no del archivo.
+# =========================
+
+LECTOR_BLOQUE = int(os.getenv("LECTOR_JSON_BLOQUE", str(64 * 1024)))
+
+_ESPACIOS = " \t\n\r"
+_INICIO_NUMERO = frozenset("-0123456789")
+_NUMERO = frozenset("0123456789+-.eE")
+
+
+class LectorJSON:
+    """Parser de tipo "pull" sobre un archivo de texto JSON.
+
+    `claves()` recorre un objeto y `elementos()` un arreglo; en cada paso el cursor
+    queda sobre el valor correspondiente, que se consume con `valor()` o entrando
+    en él con otro `claves()`/`elementos()`.
+    """
+
+    def __init__(self, archivo, bloque: int = LECTOR_BLOQUE):
+        self._archivo = archivo
+        self._bloque = bloque
+        self._buffer = ""
+        self._pos = 0
+        self._fin = False
+        self._decoder = json.JSONDecoder()
+
+    def _leer(self) -> bool:
+        if self._fin:
+            return False
+        # Descarta lo ya consumido para que el buffer no crezca con el archivo
+        if self._pos:
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        datos = self._archivo.read(self._bloque)
+        if not datos:
+            self._fin = True
+            return False
+        self._buffer += datos
+        return True
+
+    def _error(self, mensaje: str):
+        return ValueError(f"JSON inválido: {mensaje} cerca de {self._buffer[self._pos:self._pos + 40]!r}")
+
+    def siguiente(self) -> str:
+        """Devuelve (sin consumir) el próximo carácter significativo, o '' al final."""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _ESPACIOS:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._leer():
+                return ""
+
+    def _consumir(self, caracter: str):
+        if self.siguiente() != caracter:
+            raise self._error(f"se esperaba {caracter!r}")
+        self._pos += 1
+
+    def _completar_numero(self):
+        # Un número cortado por el bloque ("1." + "5", "2e" + "3") se decodificaría solo con
+        # el primer pedazo: se lee hasta ver el carácter que lo cierra o el final del archivo
+        largo = 0
+        while True:
+            fin = self._pos + largo
+            while fin < len(self._buffer) and self._buffer[fin] in _NUMERO:
+                fin += 1
+            largo = fin - self._pos
+            if fin < len(self._buffer) or not self._leer():
+                return
+
+    def valor(self):
+        """Decodifica completo el valor bajo el cursor."""
+        if self.siguiente() in _INICIO_NUMERO:
+            self._completar_numero()
+        while True:
+            try:
+                valor, fin = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if self._leer():
+                    continue
+                raise self._error("valor incompleto")
+            self._pos = fin
+            return valor
+
+    def claves(self):
+        """Recorre el objeto bajo el cursor devolviendo cada clave."""
+        self._consumir("{")
+        if self.siguiente() == "}":
+            self._pos += 1
+            return
+        while True:
+            if self.siguiente() != '"':
+                raise self._error("se esperaba una clave")
+            clave = self.valor()
+            self._consumir(":")
+            yield clave
+            separador = self.siguiente()
+            self._pos += 1
+            if separador == "}":
+                return
+            if separador != ",":
+                raise self._error("se esperaba ',' o '}'")
+
+    def elementos(self):
+        """Recorre el arreglo bajo el cursor devolviendo el índice de cada elemento."""
+        self._consumir("[")
+        if self.siguiente() == "]":
+            self._pos += 1
+            return
+        indice = 0
+        while True:
+            yield indice
+            indice += 1
+            separador = self.siguiente()
+            self._pos += 1
+            if separador == "]":
+                return
+            if separador != ",":
+                raise self._error("se esperaba ',' o ']'")
+
+
+def recorrer_costos(path):
+    """Genera (tipo, subtipo, variante, item) de costos_generales_full.json sin cargarlo entero.
+
+    `variante` es None cuando el subtipo contiene directamente la lista de ítems.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        lector = LectorJSON(f)
+        for tipo in lector.claves():
+            for subtipo in lector.claves():
+                if lector.siguiente() == "[":
+                    for _ in lector.elementos():
+                        yield tipo, subtipo, None, lector.valor()
+                else:
+                    for variante in lector.claves():
+                        for _ in lector.elementos():
+                            yield tipo, subtipo, variante, lector.valor()
+
+
+def recorrer_productos(path):
+    """Genera (linea, serie, producto) de productos_catalogo.json sin cargarlo entero."""
+    with open(path, "r", encoding="utf-8") as f:
+        lector = LectorJSON(f)
+        for linea in lector.claves():
+            for serie in lector.claves():
+                for _ in lector.elementos():
+                    yield linea, serie, lector.valor()
@@ -0,0 +1,37 @@
+from fastapi.concurrency import run_in_threadpool
+
+from backend_costeo.database import SessionLocal, AsyncSessionLocal
+
+
+class LectorAsync:
+    """Ejecuta consultas de solo lectura sobre una AsyncSession (asyncpg)."""
+
+    def __init__(self, sesion):
+        self.sesion = sesion
+
+    async def todas(self, consulta):
+        return (await self.sesion.execute(consulta)).all()
+
+
+class LectorSync:
+    """Misma interfaz que LectorAsync sobre una Session síncrona, ejecutada en el threadpool."""
+
+    def __init__(self, sesion):
+        self.sesion = sesion
+
+    async def todas(self, consulta):
+        return await run_in_threadpool(lambda: self.sesion.execute(consulta).all())
+
+
+async def get_lector():
+    """Dependencia para endpoints de lectura: usa el motor async si DATABASE_ASYNC=1."""
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as sesion:
+            yield LectorAsync(sesion)
+        return
+
+    sesion = SessionLocal()
+    try:
+        yield LectorSync(sesion)
+    finally:
+        await run_in_threadpool(sesion.close)
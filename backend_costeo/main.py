@@ -1,11 +1,21 @@
-from fastapi import FastAPI, Depends
+import time
+
+_INICIO_IMPORT = time.perf_counter()
+
+import asyncio
+import csv
+import orjson
+from fastapi import FastAPI, Depends, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import HTTPException
 from pydantic import BaseModel
 from typing import Optional
-from backend_costeo.historial import HistorialCambio, registrar_cambio
+from contextlib import asynccontextmanager
+from backend_costeo.historial import HistorialCambio, registrar_cambio, escritor_auditoria, utc_naive
 import sys
 from pathlib import Path
+from sqlalchemy import select, insert, tuple_
 from sqlalchemy.orm import Session
 from backend_costeo.schemas import (
     ListaPrecioCreate,
@@ -15,13 +25,35 @@ from backend_costeo.schemas import (
     CotizacionCreate,
     CotizacionResponse,
 )
-import httpx
-from backend_costeo.auth import get_rol_usuario, solo_admin, admin_o_vendedor
+from backend_costeo import cliente_supabase
+from backend_costeo.lectura import get_lector
+from backend_costeo.migraciones import verificar_esquema
+from backend_costeo.versiones import etag_tablas, no_modificado, cabeceras_cache
+from backend_costeo.particiones import TABLAS_HISTORIAL, HistorialArchivo, ArchivoNoDisponible, leer_archivados
+from backend_costeo import cache_listas
+from backend_costeo.bus import bus, publicar_ahora
+from backend_costeo.secuencias import asignador
+from backend_costeo.serializacion import (
+    respuesta_json,
+    codificar_cursor,
+    decodificar_cursor,
+    armar_productos,
+    consultas_catalogo,
+    consultas_cotizaciones,
+)
+from backend_costeo.auth import (
+    get_rol_usuario,
+    solo_admin,
+    admin_o_vendedor,
+    invalidar_usuario,
+    jwks_cache,
+    tokens_cache,
+    usuarios_cache,
+)
  
 try:
-    from backend_costeo.database import engine, SessionLocal
+    from backend_costeo.database import engine, SessionLocal, estadisticas_pool
     from backend_costeo.models import (
-        Base,
         Producto,
         CostoItem,
         CostoHistorial,
@@ -36,9 +68,8 @@ try:
     )
  
 except ModuleNotFoundError:
-    from database import engine, SessionLocal
+    from database import engine, SessionLocal, estadisticas_pool
     from models import (
-        Base,
         Producto,
         CostoItem,
         CostoHistorial,
@@ -59,7 +90,27 @@ if str(BASE_DIR) not in sys.path:
 if str(BASE_DIR.parent) not in sys.path:
     sys.path.append(str(BASE_DIR.parent))
  
-app = FastAPI(title="API Costeo DCM")
+# Métricas de arranque: import del módulo y chequeo de esquema (sin DDL ni seed en los workers)
+arranque = {}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    inicio = time.perf_counter()
+    arranque["esquema_version"] = verificar_esquema(engine)
+    arranque["verificacion_esquema_ms"] = round((time.perf_counter() - inicio) * 1000, 2)
+    await cliente_supabase.iniciar()
+    bus.iniciar(engine, loop=asyncio.get_running_loop())
+    arranque["listo_ms"] = round((time.perf_counter() - _INICIO_IMPORT) * 1000, 2)
+    print(f"✅ API lista en {arranque['listo_ms']} ms (esquema v{arranque['esquema_version']})")
+    yield
+    await cliente_supabase.cerrar()
+    # Write-behind de auditoría: lo encolado se escribe antes de salir
+    await run_in_threadpool(escritor_auditoria.detener)
+    await run_in_threadpool(bus.detener)
+
+
+app = FastAPI(title="API Costeo DCM", lifespan=lifespan)
  
 origins = [
     "https://costosdcm.base44.app",
@@ -75,6 +126,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Siguiente-Id", "X-Siguiente-Cursor", "ETag"],
 )
  
 @app.get("/")
@@ -84,12 +136,6 @@ def root():
 import os
 from pathlib import Path
  
-Base.metadata.create_all(bind=engine)
- 
-from backend_costeo.seed import seed_if_empty
- 
-seed_if_empty()
- 
 def get_db():
     db = SessionLocal()
     try:
@@ -98,13 +144,77 @@ def get_db():
         db.close()
  
 @app.get("/api/productos")
-def listar_productos(db: Session = Depends(get_db), usuario: dict = Depends(admin_o_vendedor)):
-    return db.query(Producto).all()
+async def listar_productos(request: Request, lector=Depends(get_lector), usuario: dict = Depends(admin_o_vendedor)):
+    etag = await etag_tablas(lector, request, ["productos"])
+    no_mod = no_modificado(request, etag)
+    if no_mod:
+        return no_mod
+
+    filas = await lector.todas(select(*Producto.__table__.c).order_by(Producto.id))
+    return respuesta_json([dict(fila._mapping) for fila in filas], headers=cabeceras_cache(etag))
  
  
+COSTOS_LIMITE_MAX = int(os.getenv("COSTOS_LIMITE_MAX", "1000"))
+
+# Tablas de las que depende cada listado (para el ETag)
+TABLAS_LISTAS = ["listas_precios", "listas_precios_items", "costos_items"]
+TABLAS_CATALOGO = ["catalogo_productos", "catalogo_conjuntos", "catalogo_items", "listas_precios", "costos_items"]
+TABLAS_COTIZACIONES = ["cotizaciones", "cotizacion_conjuntos", "cotizacion_items", "listas_precios", "costos_items"]
+
+
 @app.get("/api/costos")
-def listar_costos(db: Session = Depends(get_db), usuario: dict = Depends(admin_o_vendedor)):
-    return db.query(CostoItem).all()
+async def listar_costos(
+    request: Request,
+    tipo: Optional[str] = None,
+    subtipo: Optional[str] = None,
+    codigo: Optional[str] = None,
+    nombre: Optional[str] = Query(None, description="Prefijo del nombre"),
+    desde_id: Optional[int] = Query(None, description="Devuelve ítems con id mayor a este (paginación)"),
+    limite: Optional[int] = Query(None, ge=1, le=COSTOS_LIMITE_MAX),
+    campos: Optional[str] = Query(None, description="Columnas separadas por coma, ej: id,nombre,costo_fabrica"),
+    lector=Depends(get_lector),
+    usuario: dict = Depends(admin_o_vendedor)
+):
+    etag = await etag_tablas(lector, request, ["costos_items"])
+    no_mod = no_modificado(request, etag)
+    if no_mod:
+        return no_mod
+
+    columnas_tabla = CostoItem.__table__.c
+    if campos:
+        nombres = [c.strip() for c in campos.split(",") if c.strip()]
+        invalidos = [c for c in nombres if c not in columnas_tabla]
+        if invalidos:
+            raise HTTPException(status_code=400, detail=f"Campos inválidos: {', '.join(invalidos)}")
+        if "id" not in nombres:
+            nombres.insert(0, "id")
+        columnas = [columnas_tabla[c] for c in nombres]
+    else:
+        columnas = list(columnas_tabla)
+
+    consulta = select(*columnas)
+    if tipo is not None:
+        consulta = consulta.where(CostoItem.tipo == tipo)
+    if subtipo is not None:
+        consulta = consulta.where(CostoItem.subtipo == subtipo)
+    if codigo is not None:
+        consulta = consulta.where(CostoItem.codigo == codigo)
+    if nombre:
+        consulta = consulta.where(CostoItem.nombre.startswith(nombre, autoescape=True))
+    if desde_id is not None:
+        consulta = consulta.where(CostoItem.id > desde_id)
+    consulta = consulta.order_by(CostoItem.id)
+
+    # Sin `limite` se devuelve todo, como antes, para no romper clientes existentes
+    if limite is not None:
+        consulta = consulta.limit(limite + 1)
+
+    filas = [dict(fila._mapping) for fila in await lector.todas(consulta)]
+    headers = cabeceras_cache(etag)
+    if limite is not None and len(filas) > limite:
+        filas = filas[:limite]
+        headers["X-Siguiente-Id"] = str(filas[-1]["id"])
+    return respuesta_json(filas, headers=headers)
  
  
 from datetime import datetime
@@ -153,6 +263,7 @@ def eliminar_costo(item_id: int, db: Session = Depends(get_db), usuario: dict =
         raise HTTPException(status_code=404, detail="Ítem no encontrado")
  
     registrar_cambio(db, usuario, "eliminar", "costo_item", item.id, item.nombre)
+    cache_listas.invalidar_por_items(db, [item.id])
  
     db.delete(item)
     db.commit()
@@ -161,15 +272,14 @@ def eliminar_costo(item_id: int, db: Session = Depends(get_db), usuario: dict =
  
 @app.post("/api/costeos")
 def guardar_costeo_alias(data: ListaPrecioCreate, db: Session = Depends(get_db), usuario: dict = Depends(solo_admin)):
-    nueva = ListaPrecioConfig(**data.dict())
-    db.add(nueva)
-    db.commit()
-    db.refresh(nueva)
+    # Mismo alta que POST /api/lista-precios: los totales del payload se ignoran
+    nueva = guardar_lista_nueva(db, data, usuario)
  
     return {
         "ok": True,
         "mensaje": "Configuración de precios guardada correctamente",
-        "id": nueva.id,
+        "id": nueva.codigo,
+        "codigo": nueva.codigo,
     }
  
 @app.post("/api/auth/recuperar-password")
@@ -178,15 +288,16 @@ async def recuperar_password(datos: dict):
     if not email:
         raise HTTPException(status_code=400, detail="Email requerido")
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{os.getenv('SUPABASE_URL')}/auth/v1/recover",
-            headers={
-                "apikey": os.getenv("SUPABASE_KEY"),
-                "Content-Type": "application/json"
-            },
-            json={"email": email}
-        )
+    response = await cliente_supabase.solicitar(
+        "recuperar_password",
+        "POST",
+        f"{os.getenv('SUPABASE_URL')}/auth/v1/recover",
+        headers={
+            "apikey": os.getenv("SUPABASE_KEY"),
+            "Content-Type": "application/json"
+        },
+        json={"email": email}
+    )
 
     if response.status_code not in (200, 201):
         raise HTTPException(status_code=400, detail="Error al enviar email de recuperación")
@@ -204,19 +315,87 @@ def historial_costos(item_id: int, db: Session = Depends(get_db), usuario: dict
  
  
 from sqlalchemy import func
+from backend_costeo.precios import calcular_totales, COLUMNAS_PRECIO
+from backend_costeo.carga_masiva import cambios_desde_csv, normalizar_cambios, actualizar_costos_lote
+from backend_costeo.recalculo import (
+    recalcular_listas,
+    listas_desfasadas,
+    reparar_listas,
+    recalcular_catalogos,
+    recalcular_cotizaciones,
+    recalcular_coeficiente_blue,
+    simular_coeficiente_blue,
+    propagar_cambios,
+)
  
-def calcular_precios(costo_total, metodo, gp_cliente, gp_integrador, markup_cliente=None, markup_integrador=None):
-    if metodo == "markup":
-        precio_cliente = round(costo_total * (1 + (markup_cliente or 0) / 100), 4)
-        precio_integrador = round(costo_total * (1 + (markup_integrador or 0) / 100), 4)
-    else:
-        gp_c = (gp_cliente or 0) / 100
-        gp_i = (gp_integrador or 0) / 100
-        precio_cliente = round(costo_total / (1 - gp_c), 4) if gp_c < 1 else 0
-        precio_integrador = round(costo_total / (1 - gp_i), 4) if gp_i < 1 else 0
-    return precio_cliente, precio_integrador
- 
- 
+def _id_item(valor) -> int:
+    # El front a veces manda los ids como texto ("3"); la base los guarda como enteros
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    if isinstance(valor, (int, str)) and not isinstance(valor, bool):
+        try:
+            return int(valor)
+        except ValueError:
+            pass
+    raise HTTPException(status_code=400, detail=f"item_id inválido: {valor!r}")
+
+
+def _cantidad(valor, referencia) -> float:
+    if valor is None or isinstance(valor, bool):
+        raise HTTPException(status_code=400, detail=f"Cantidad inválida para {referencia}: {valor!r}")
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Cantidad inválida para {referencia}: {valor!r}")
+
+
+def resolver_referencias(db: Session, conjuntos, items_costo):
+    """Resuelve listas e ítems referenciados con una consulta IN por tabla.
+
+    `conjuntos` e `items_costo` son pares (lista_codigo | item_id, cantidad).
+    Los item_id se normalizan a entero; ids o cantidades inválidos dan 400.
+    Devuelve (costo_directo, conjuntos_validos, items_validos, faltantes).
+    """
+    conjuntos = [(codigo, _cantidad(cantidad, codigo)) for codigo, cantidad in conjuntos]
+    items_costo = [
+        (item_id, _cantidad(cantidad, f"ítem {item_id}"))
+        for item_id, cantidad in ((_id_item(i), c) for i, c in items_costo)
+    ]
+
+    codigos = {codigo for codigo, _ in conjuntos}
+    costos_listas = dict(db.execute(
+        select(ListaPrecioConfig.codigo, ListaPrecioConfig.costo_directo)
+        .where(ListaPrecioConfig.codigo.in_(codigos))
+    ).all()) if codigos else {}
+
+    ids = {item_id for item_id, _ in items_costo}
+    costos_items = dict(db.execute(
+        select(CostoItem.id, CostoItem.costo_fabrica)
+        .where(CostoItem.id.in_(ids))
+    ).all()) if ids else {}
+
+    costo_directo = 0.0
+    conjuntos_validos = []
+    items_validos = []
+    faltantes = {"listas": [], "items": []}
+
+    for codigo, cantidad in conjuntos:
+        if codigo in costos_listas:
+            costo_directo += (costos_listas[codigo] or 0) * cantidad
+            conjuntos_validos.append((codigo, cantidad))
+        else:
+            faltantes["listas"].append(codigo)
+
+    for item_id, cantidad in items_costo:
+        if item_id in costos_items:
+            costo_directo += (costos_items[item_id] or 0) * cantidad
+            items_validos.append((item_id, cantidad))
+        else:
+            faltantes["items"].append(item_id)
+
+    return costo_directo, conjuntos_validos, items_validos, faltantes
+
+
 def construir_conjuntos_response(conjuntos):
     """Helper para construir la respuesta de conjuntos con datos de la lista de precios."""
     resultado = []
@@ -278,18 +457,9 @@ def construir_items_catalogo_response(items):
     return resultado
 
  
-@app.post("/api/lista-precios", response_model=ListaPrecioResponse)
-def crear_lista(data: ListaPrecioCreate, db: Session = Depends(get_db), usuario: dict = Depends(solo_admin)):
- 
-    ultima = db.query(ListaPrecioConfig).order_by(
-        ListaPrecioConfig.codigo.desc()
-    ).first()
- 
-    if ultima:
-        ultimo_num = int(ultima.codigo.replace("DCM", ""))
-        nuevo_codigo = f"DCM{ultimo_num + 1:03d}"
-    else:
-        nuevo_codigo = "DCM001"
+def guardar_lista_nueva(db: Session, data: ListaPrecioCreate, usuario: dict) -> ListaPrecioConfig:
+    """Alta de una lista con código nuevo; los totales se calculan en el servidor desde los ítems."""
+    nuevo_codigo = asignador.siguiente("DCM")
  
     nueva = ListaPrecioConfig(
         codigo=nuevo_codigo,
@@ -304,10 +474,6 @@ def crear_lista(data: ListaPrecioCreate, db: Session = Depends(get_db), usuario:
         metodo_precio=data.metodo_precio or "gp",
         markup_cliente=data.markup_cliente,
         markup_integrador=data.markup_integrador,
-        costo_directo=data.costo_directo,
-        costo_total=data.costo_total,
-        precio_cliente=data.precio_cliente,
-        precio_integrador=data.precio_integrador,
         observaciones=data.observaciones,
     )
  
@@ -322,83 +488,44 @@ def crear_lista(data: ListaPrecioCreate, db: Session = Depends(get_db), usuario:
  
     db.add(nueva)
     registrar_cambio(db, usuario, "crear", "lista_precio", nuevo_codigo, data.nombre)
+
+    # Los totales salen de los ítems, no de lo que manda el cliente
+    db.flush()
+    recalcular_listas(db, [nuevo_codigo])
  
     db.commit()
     db.refresh(nueva)
- 
     return nueva
  
  
-@app.get("/api/lista-precios/{codigo}", response_model=ListaPrecioResponse)
-def obtener_lista(codigo: str, db: Session = Depends(get_db), usuario: dict = Depends(admin_o_vendedor)):
-    lista = db.query(ListaPrecioConfig).filter(
-        ListaPrecioConfig.codigo == codigo
-    ).first()
- 
-    if not lista:
-        raise HTTPException(status_code=404, detail="Lista no encontrada")
+@app.post("/api/lista-precios", response_model=ListaPrecioResponse)
+def crear_lista(data: ListaPrecioCreate, db: Session = Depends(get_db), usuario: dict = Depends(solo_admin)):
+    return guardar_lista_nueva(db, data, usuario)
  
-    items_response = []
-    for lp_item in lista.items:
-        costo_item = lp_item.item
-        if costo_item:
-            costo_unit = costo_item.costo_fabrica or 0
-            items_response.append({
-                "item_id": lp_item.item_id,
-                "codigo": costo_item.codigo,
-                "nombre": costo_item.nombre,
-                "tipo": costo_item.tipo,
-                "subtipo": costo_item.subtipo,
-                "unidad": costo_item.unidad,
-                "cantidad": lp_item.cantidad,
-                "costo_unit": costo_unit,
-                "total": round(costo_unit * (lp_item.cantidad or 0), 4),
-            })
  
+@app.get("/api/lista-precios/{codigo}", response_model=ListaPrecioResponse)
+async def obtener_lista(codigo: str, lector=Depends(get_lector), usuario: dict = Depends(admin_o_vendedor)):
+    listas = await cache_listas.listas_cacheadas(lector, [codigo])
+    if not listas:
+        raise HTTPException(status_code=404, detail="Lista no encontrada")
+
+    lista = listas[0]
     return {
-        **{col.name: getattr(lista, col.name) for col in lista.__table__.columns},
-        "items": items_response,
+        **lista,
+        "items": [{**item, "total": round(item["total"], 4)} for item in lista["items"]],
     }
  
  
 from sqlalchemy.orm import joinedload
  
 @app.get("/api/lista-precios", response_model=list[ListaPrecioResponse])
-def listar_listas(db: Session = Depends(get_db), usuario: dict = Depends(admin_o_vendedor)):
- 
-    listas = (
-        db.query(ListaPrecioConfig)
-        .options(
-            joinedload(ListaPrecioConfig.items)
-            .joinedload(ListaPrecioItem.item)
-        )
-        .all()
-    )
- 
-    resultado = []
-    for lista in listas:
-        items_response = []
-        for lp_item in lista.items:
-            costo_item = lp_item.item
-            if costo_item:
-                costo_unit = costo_item.costo_fabrica or 0
-                items_response.append({
-                    "item_id": lp_item.item_id,
-                    "codigo": costo_item.codigo,
-                    "nombre": costo_item.nombre,
-                    "tipo": costo_item.tipo,
-                    "subtipo": costo_item.subtipo,
-                    "unidad": costo_item.unidad,
-                    "costo_unit": costo_unit,
-                    "cantidad": lp_item.cantidad,
-                    "total": costo_unit * (lp_item.cantidad or 0),
-                })
- 
-        lista_dict = {col.name: getattr(lista, col.name) for col in lista.__table__.columns}
-        lista_dict["items"] = items_response
-        resultado.append(lista_dict)
- 
-    return resultado
+async def listar_listas(request: Request, lector=Depends(get_lector), usuario: dict = Depends(admin_o_vendedor)):
+    etag = await etag_tablas(lector, request, TABLAS_LISTAS)
+    no_mod = no_modificado(request, etag)
+    if no_mod:
+        return no_mod
+
+    return respuesta_json(await cache_listas.listas_cacheadas(lector), headers=cabeceras_cache(etag))
  
  
 @app.delete("/api/lista-precios/{codigo}")
@@ -415,6 +542,7 @@ def eliminar_lista_precios(
         raise HTTPException(status_code=404, detail="Configuración no encontrada")
  
     registrar_cambio(db, usuario, "eliminar", "lista_precio", lista.codigo, lista.nombre)
+    cache_listas.invalidar_listas(db, [lista.codigo])
  
     db.delete(lista)
     db.commit()
@@ -425,6 +553,56 @@ class CostoUpdate(BaseModel):
     costo_fob: Optional[float] = None
     coeficiente: Optional[float] = None
  
+def _aplicar_costos_bulk(db: Session, usuario: dict, cambios: list[dict]) -> dict:
+    try:
+        resultado = actualizar_costos_lote(db, usuario, cambios)
+        # Una sola propagación para todos los ítems con costo_fabrica nuevo
+        recalculados = propagar_cambios(db, "costo_item", resultado.pop("ids_costo_modificado"))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print("💥 Error en actualización masiva de costos:", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {
+        "ok": True,
+        **resultado,
+        "listas_recalculadas": recalculados.get("lista_precio", 0),
+        "catalogos_recalculados": recalculados.get("catalogo", 0),
+        "cotizaciones_recalculadas": recalculados.get("cotizacion", 0),
+    }
+
+
+@app.patch("/api/costos/bulk")
+async def actualizar_costos_bulk(request: Request, db: Session = Depends(get_db), usuario: dict = Depends(solo_admin)):
+    """
+    Actualiza costos de muchos ítems en una sola transacción.
+    Cuerpo: lista JSON de {id|codigo, costo_fabrica, costo_fob, coeficiente} o CSV (text/csv) con esas columnas.
+    """
+    cuerpo = await request.body()
+
+    if "csv" in request.headers.get("content-type", ""):
+        try:
+            cambios = cambios_desde_csv(cuerpo.decode("utf-8"))
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise HTTPException(status_code=400, detail=f"CSV inválido: {e}")
+    else:
+        try:
+            cambios = orjson.loads(cuerpo)
+        except orjson.JSONDecodeError:
+            raise HTTPException(status_code=400, detail="JSON inválido")
+        if isinstance(cambios, dict):
+            cambios = cambios.get("items")
+        if not isinstance(cambios, list):
+            raise HTTPException(status_code=400, detail="Se esperaba una lista de cambios")
+
+    validos, errores = normalizar_cambios(cambios)
+    if errores:
+        raise HTTPException(status_code=422, detail={"errores": errores})
+
+    return await run_in_threadpool(_aplicar_costos_bulk, db, usuario, validos)
+
+
 @app.put("/api/costos/{item_id}")
 def actualizar_costo_item(item_id: int, datos: dict, db: Session = Depends(get_db), usuario: dict = Depends(solo_admin)):
  
@@ -445,6 +623,8 @@ def actualizar_costo_item(item_id: int, datos: dict, db: Session = Depends(get_d
         )
         db.add(historial)
  
+    costo_anterior = item.costo_fabrica
+ 
     for campo, valor in datos.items():
         if hasattr(item, campo):
             valor_anterior = getattr(item, campo)
@@ -458,6 +638,13 @@ def actualizar_costo_item(item_id: int, datos: dict, db: Session = Depends(get_d
                     valor_nuevo=valor
                 )
  
+    # Las listas guardan nombre, unidad, etc. del ítem: cualquier edición las invalida
+    cache_listas.invalidar_por_items(db, [item.id])
+
+    # Un cambio de costo_fabrica se propaga a listas, catálogo y cotizaciones que usan el ítem
+    if item.costo_fabrica != costo_anterior:
+        propagar_cambios(db, "costo_item", [item.id])
+ 
     db.commit()
     db.refresh(item)
  
@@ -482,8 +669,7 @@ def actualizar_lista(lista_codigo: str, data: dict, db: Session = Depends(get_db
         "eventuales", "garantia", "burden",
         "gp_cliente", "gp_integrador",
         "metodo_precio", "markup_cliente", "markup_integrador",
-        "costo_directo", "costo_total",
-        "precio_cliente", "precio_integrador", "observaciones"
+        "observaciones"
     }
     for campo in campos_config:
         if campo in data and data[campo] is not None:
@@ -511,6 +697,13 @@ def actualizar_lista(lista_codigo: str, data: dict, db: Session = Depends(get_db
                 cantidad=item.get("cantidad"),
             ))
  
+    # Totales recalculados en el servidor; catálogos y cotizaciones que usan la lista dependen de ellos
+    if "items" in data or any(campo in data for campo in COLUMNAS_PRECIO):
+        db.flush()
+        recalcular_listas(db, [lista_codigo])
+        propagar_cambios(db, "lista_precio", [lista_codigo])
+ 
+    cache_listas.invalidar_listas(db, [lista_codigo])
     db.commit()
     db.refresh(lista)
     return {"ok": True, "mensaje": "Configuración actualizada correctamente"}
@@ -576,22 +769,23 @@ def eliminar_producto(
  
 @app.post("/api/auth/registro")
 async def registro(datos: dict):
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{os.getenv('SUPABASE_URL')}/auth/v1/signup",
-            headers={
-                "apikey": os.getenv("SUPABASE_KEY"),
-                "Content-Type": "application/json"
-            },
-            json={
-                "email": datos.get("email"),
-                "password": datos.get("password"),
-                "data": {
-                    "nombre": datos.get("nombre"),
-                    "apellido": datos.get("apellido")
-                }
+    response = await cliente_supabase.solicitar(
+        "registro",
+        "POST",
+        f"{os.getenv('SUPABASE_URL')}/auth/v1/signup",
+        headers={
+            "apikey": os.getenv("SUPABASE_KEY"),
+            "Content-Type": "application/json"
+        },
+        json={
+            "email": datos.get("email"),
+            "password": datos.get("password"),
+            "data": {
+                "nombre": datos.get("nombre"),
+                "apellido": datos.get("apellido")
             }
-        )
+        }
+    )
     if response.status_code not in (200, 201):
         raise HTTPException(status_code=400, detail="Error al registrar usuario")
     return {"ok": True, "mensaje": "Usuario registrado correctamente."}
@@ -599,18 +793,19 @@ async def registro(datos: dict):
  
 @app.post("/api/auth/login")
 async def login(datos: dict):
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{os.getenv('SUPABASE_URL')}/auth/v1/token?grant_type=password",
-            headers={
-                "apikey": os.getenv("SUPABASE_KEY"),
-                "Content-Type": "application/json"
-            },
-            json={
-                "email": datos.get("email"),
-                "password": datos.get("password")
-            }
-        )
+    response = await cliente_supabase.solicitar(
+        "login",
+        "POST",
+        f"{os.getenv('SUPABASE_URL')}/auth/v1/token?grant_type=password",
+        headers={
+            "apikey": os.getenv("SUPABASE_KEY"),
+            "Content-Type": "application/json"
+        },
+        json={
+            "email": datos.get("email"),
+            "password": datos.get("password")
+        }
+    )
     if response.status_code != 200:
         raise HTTPException(status_code=401, detail="Email o contraseña incorrectos")
     data = response.json()
@@ -627,47 +822,65 @@ async def me(usuario: dict = Depends(get_rol_usuario)):
  
 @app.get("/api/usuarios")
 async def listar_usuarios(usuario: dict = Depends(solo_admin)):
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{os.getenv('SUPABASE_URL')}/rest/v1/usuarios?select=*&order=creado_en.desc",
-            headers={
-                "apikey": os.getenv("SUPABASE_KEY"),
-                "Authorization": f"Bearer {os.getenv('SUPABASE_KEY')}"
-            }
-        )
+    response = await cliente_supabase.solicitar(
+        "listar_usuarios",
+        "GET",
+        f"{os.getenv('SUPABASE_URL')}/rest/v1/usuarios?select=*&order=creado_en.desc",
+        headers={
+            "apikey": os.getenv("SUPABASE_KEY"),
+            "Authorization": f"Bearer {os.getenv('SUPABASE_KEY')}"
+        }
+    )
     return response.json()
  
  
+def _invalidar_usuarios(ids):
+    if ids is None:
+        usuarios_cache.limpiar()
+        return
+    for user_id in ids:
+        invalidar_usuario(user_id)
+
+
+# Cambios de rol hechos desde otro worker. _consultas_usuario guarda tareas asyncio:
+# se toca solo desde el event loop, no desde el hilo del bus
+bus.suscribir("usuario", _invalidar_usuarios, en_loop=True)
+
+
 @app.put("/api/usuarios/{user_id}/rol")
 async def cambiar_rol(user_id: str, datos: dict, usuario: dict = Depends(solo_admin)):
     nuevo_rol = datos.get("rol")
     if nuevo_rol not in ("admin", "vendedor"):
         raise HTTPException(status_code=400, detail="Rol inválido")
-    async with httpx.AsyncClient() as client:
-        await client.patch(
-            f"{os.getenv('SUPABASE_URL')}/rest/v1/usuarios?id=eq.{user_id}",
-            headers={
-                "apikey": os.getenv("SUPABASE_KEY"),
-                "Authorization": f"Bearer {os.getenv('SUPABASE_KEY')}",
-                "Content-Type": "application/json",
-                "Prefer": "return=representation"
-            },
-            json={"rol": nuevo_rol}
-        )
+    await cliente_supabase.solicitar(
+        "cambiar_rol",
+        "PATCH",
+        f"{os.getenv('SUPABASE_URL')}/rest/v1/usuarios?id=eq.{user_id}",
+        headers={
+            "apikey": os.getenv("SUPABASE_KEY"),
+            "Authorization": f"Bearer {os.getenv('SUPABASE_KEY')}",
+            "Content-Type": "application/json",
+            "Prefer": "return=representation"
+        },
+        json={"rol": nuevo_rol}
+    )
+    invalidar_usuario(user_id)
+    await run_in_threadpool(publicar_ahora, "usuario", [user_id])
     return {"ok": True, "mensaje": f"Rol actualizado a {nuevo_rol}"}
  
 @app.post("/api/auth/cambiar-password")
 async def cambiar_password(datos: dict, usuario: dict = Depends(get_rol_usuario)):
-    async with httpx.AsyncClient() as client:
-        response = await client.put(
-            f"{os.getenv('SUPABASE_URL')}/auth/v1/user",
-            headers={
-                "apikey": os.getenv("SUPABASE_KEY"),
-                "Authorization": f"Bearer {datos.get('access_token')}",
-                "Content-Type": "application/json"
-            },
-            json={"password": datos.get("nueva_password")}
-        )
+    response = await cliente_supabase.solicitar(
+        "cambiar_password",
+        "PUT",
+        f"{os.getenv('SUPABASE_URL')}/auth/v1/user",
+        headers={
+            "apikey": os.getenv("SUPABASE_KEY"),
+            "Authorization": f"Bearer {datos.get('access_token')}",
+            "Content-Type": "application/json"
+        },
+        json={"password": datos.get("nueva_password")}
+    )
     if response.status_code != 200:
         raise HTTPException(status_code=400, detail="Error al cambiar contraseña")
     return {"ok": True, "mensaje": "Contraseña actualizada correctamente"}
@@ -702,116 +915,231 @@ def actualizar_coeficiente_blue(
         WHERE clave = 'coeficiente_blue'
     """), {"valor": porcentaje_blue})
  
-    items_afectados = db.query(CostoItem).filter(
-        CostoItem.tipo == "Electronica",
-        CostoItem.coeficiente > 1
-    ).all()
- 
-    for item in items_afectados:
-        if item.costo_fob:
-            nuevo_costo = round(
-                item.costo_fob * item.coeficiente * (1 + porcentaje_blue / 100), 4
-            )
-            db.add(CostoHistorial(
-                costo_item_id=item.id,
-                costo_fabrica=item.costo_fabrica,
-                costo_fob=item.costo_fob,
-                coeficiente=item.coeficiente,
-            ))
-            item.costo_fabrica = nuevo_costo
- 
-    db.flush()
- 
-    listas = db.query(ListaPrecioConfig).options(
-        joinedload(ListaPrecioConfig.items).joinedload(ListaPrecioItem.item)
-    ).all()
- 
-    for lista in listas:
-        costo_directo = sum(
-            (lp_item.item.costo_fabrica or 0) * (lp_item.cantidad or 0)
-            for lp_item in lista.items
-            if lp_item.item
-        )
-        eventuales = (lista.eventuales or 0) / 100
-        garantia = (lista.garantia or 0) / 100
-        burden = (lista.burden or 0) / 100
-        costo_total = costo_directo * (1 + eventuales + garantia + burden)
-        precio_cliente, precio_integrador = calcular_precios(
-            costo_total=costo_total,
-            metodo=lista.metodo_precio or "gp",
-            gp_cliente=lista.gp_cliente,
-            gp_integrador=lista.gp_integrador,
-            markup_cliente=lista.markup_cliente,
-            markup_integrador=lista.markup_integrador
-        )
-        lista.costo_directo = round(costo_directo, 4)
-        lista.costo_total = round(costo_total, 4)
-        lista.precio_cliente = precio_cliente
-        lista.precio_integrador = precio_integrador
+    resultado = recalcular_coeficiente_blue(db, porcentaje_blue)
  
     db.commit()
  
     return {
         "ok": True,
         "mensaje": f"Coeficiente blue actualizado a {porcentaje_blue}%",
-        "items_actualizados": len(items_afectados),
-        "listas_recalculadas": len(listas)
+        **resultado,
     }
  
+@app.get("/api/parametros/coeficiente-blue/simulacion")
+def simular_coeficiente(
+    coeficiente_blue: float = Query(..., ge=0),
+    db: Session = Depends(get_db),
+    usuario: dict = Depends(solo_admin)
+):
+    listas = simular_coeficiente_blue(db, coeficiente_blue)
+    return {"coeficiente_blue": coeficiente_blue, "listas": listas}
+ 
 @app.post("/api/admin/reload-costos")
 def reload_costos(db: Session = Depends(get_db), usuario: dict = Depends(solo_admin)):
     from backend_costeo.seed import seed_costos_only
-    seed_costos_only(db)
-    return {"ok": True, "mensaje": "Ítems de costo recargados desde JSON"}
+    # Una recarga puede cambiar cualquier ítem: se invalidan todas las listas al commitear
+    cache_listas.invalidar_todas(db)
+    resultado = seed_costos_only(db)
+    return {"ok": True, "mensaje": "Ítems de costo recargados desde JSON", **resultado}
+
+
+@app.get("/api/admin/metricas")
+def obtener_metricas(usuario: dict = Depends(solo_admin)):
+    return {
+        "jwks": jwks_cache.estadisticas(),
+        "tokens": tokens_cache.estadisticas(),
+        "usuarios": usuarios_cache.estadisticas(),
+        "supabase": cliente_supabase.estadisticas(),
+        "db_pool": estadisticas_pool(),
+        "arranque": arranque,
+        "auditoria": escritor_auditoria.estadisticas(),
+        "listas_cache": cache_listas.cache_listas.estadisticas(),
+        "bus": bus.estadisticas(),
+        "secuencias": asignador.estadisticas(),
+    }
+
+
+@app.get("/api/admin/listas/consistencia")
+def verificar_consistencia_listas(db: Session = Depends(get_db), usuario: dict = Depends(solo_admin)):
+    desfasadas = listas_desfasadas(db)
+    return {"desfasadas": len(desfasadas), "listas": desfasadas}
+
+
+@app.post("/api/admin/listas/consistencia/reparar")
+def reparar_consistencia_listas(db: Session = Depends(get_db), usuario: dict = Depends(solo_admin)):
+    try:
+        resultado = reparar_listas(db)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print("💥 Error al reparar listas:", e)
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"ok": True, **resultado}
+
+
+@app.post("/api/admin/cache/listas/vaciar")
+def vaciar_cache_listas(usuario: dict = Depends(solo_admin)):
+    cache_listas.vaciar()
+    return {"ok": True, "mensaje": "Cache de listas vaciada"}
  
  
 # --- Endpoints de historial de cambios ---
  
+HISTORIAL_LIMITE_MAX = int(os.getenv("HISTORIAL_LIMITE_MAX", "1000"))
+
+
+async def _pagina_historial(lector, filtros: list, usuario_email, accion, desde, hasta, cursor, limite):
+    """Página de historial ordenada por fecha descendente con las filas sin fecha al final
+    (NULLS LAST) y después por id; el cursor va en X-Siguiente-Cursor.
+
+    Las filas con fecha y las sin fecha se piden por separado: así cada consulta recorre
+    el índice (fecha, id) en orden, sin un OR que obligue a ordenar todo el rango.
+    """
+    if usuario_email:
+        filtros.append(HistorialCambio.usuario_email == usuario_email)
+    if accion:
+        filtros.append(HistorialCambio.accion == accion)
+    # El historial guarda UTC sin zona: "...Z" o "-03:00" se comparan en ese formato
+    desde, hasta = utc_naive(desde), utc_naive(hasta)
+    if desde is not None:
+        filtros.append(HistorialCambio.fecha >= desde)
+    if hasta is not None:
+        filtros.append(HistorialCambio.fecha < hasta)
+    fecha_cursor = id_cursor = None
+    if cursor:
+        try:
+            fecha_cursor, id_cursor = decodificar_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Cursor inválido")
+        fecha_cursor = utc_naive(fecha_cursor)
+
+    datos = []
+    # Con cursor en una fila sin fecha ya se pasaron todas las filas con fecha
+    if not (cursor and fecha_cursor is None):
+        keyset = [] if fecha_cursor is None else [
+            tuple_(HistorialCambio.fecha, HistorialCambio.id) < tuple_(fecha_cursor, id_cursor)
+        ]
+        filas = await lector.todas(
+            select(*HistorialCambio.__table__.c)
+            .where(*filtros, *keyset, HistorialCambio.fecha.is_not(None))
+            .order_by(HistorialCambio.fecha.desc(), HistorialCambio.id.desc())
+            .limit(limite + 1)
+        )
+        datos = [dict(fila._mapping) for fila in filas]
+
+    # Un filtro por fecha ya descarta las filas sin fecha
+    if len(datos) <= limite and desde is None and hasta is None:
+        keyset = [HistorialCambio.id < id_cursor] if cursor and fecha_cursor is None else []
+        filas = await lector.todas(
+            select(*HistorialCambio.__table__.c)
+            .where(*filtros, *keyset, HistorialCambio.fecha.is_(None))
+            .order_by(HistorialCambio.id.desc())
+            .limit(limite + 1 - len(datos))
+        )
+        datos += [dict(fila._mapping) for fila in filas]
+
+    headers = None
+    if len(datos) > limite:
+        datos = datos[:limite]
+        headers = {"X-Siguiente-Cursor": codificar_cursor(datos[-1]["fecha"], datos[-1]["id"])}
+    return respuesta_json(datos, headers=headers)
+
+
 @app.get("/api/historial")
-def obtener_historial(
-    db: Session = Depends(get_db),
+async def obtener_historial(
+    usuario_email: Optional[str] = Query(None, alias="usuario"),
+    accion: Optional[str] = None,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    cursor: Optional[str] = Query(None, description="Valor de X-Siguiente-Cursor de la página anterior"),
+    limite: int = Query(500, ge=1, le=HISTORIAL_LIMITE_MAX),
+    lector=Depends(get_lector),
     usuario: dict = Depends(solo_admin)
 ):
-    return db.query(HistorialCambio).order_by(
-        HistorialCambio.fecha.desc()
-    ).limit(500).all()
+    return await _pagina_historial(lector, [], usuario_email, accion, desde, hasta, cursor, limite)
  
  
 @app.get("/api/historial/{entidad}/{entidad_id}")
-def obtener_historial_entidad(
+async def obtener_historial_entidad(
     entidad: str,
     entidad_id: str,
-    db: Session = Depends(get_db),
+    usuario_email: Optional[str] = Query(None, alias="usuario"),
+    accion: Optional[str] = None,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    cursor: Optional[str] = Query(None, description="Valor de X-Siguiente-Cursor de la página anterior"),
+    limite: int = Query(500, ge=1, le=HISTORIAL_LIMITE_MAX),
+    lector=Depends(get_lector),
     usuario: dict = Depends(admin_o_vendedor)
 ):
-    return db.query(HistorialCambio).filter(
+    filtros = [
         HistorialCambio.entidad == entidad,
-        HistorialCambio.entidad_id == entidad_id
-    ).order_by(HistorialCambio.fecha.desc()).all()
- 
- 
+        HistorialCambio.entidad_id == entidad_id,
+    ]
+    return await _pagina_historial(lector, filtros, usuario_email, accion, desde, hasta, cursor, limite)
+ 
+ 
+@app.get("/api/historial-archivado")
+def obtener_historial_archivado(
+    tabla: str = Query("historial_cambios", description="historial_cambios o costos_historial"),
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    entidad: Optional[str] = None,
+    entidad_id: Optional[str] = None,
+    usuario_email: Optional[str] = Query(None, alias="usuario"),
+    accion: Optional[str] = None,
+    costo_item_id: Optional[int] = None,
+    limite: int = Query(500, ge=1, le=HISTORIAL_LIMITE_MAX),
+    db: Session = Depends(get_db),
+    usuario: dict = Depends(solo_admin)
+):
+    """Consulta bajo demanda el historial ya movido a archivos por `python -m backend_costeo archivar`."""
+    if tabla not in TABLAS_HISTORIAL:
+        raise HTTPException(status_code=400, detail=f"Tabla inválida: {tabla}")
+    filtros = {
+        "entidad": entidad,
+        "entidad_id": entidad_id,
+        "usuario_email": usuario_email,
+        "accion": accion,
+        "costo_item_id": costo_item_id,
+    }
+    try:
+        return respuesta_json(leer_archivados(db, tabla, desde, hasta, filtros, limite))
+    except ArchivoNoDisponible as e:
+        raise HTTPException(status_code=410, detail=f"El historial archivado de {e} ya no está disponible")
+
+
+@app.get("/api/historial-archivado/archivos")
+async def listar_archivos_historial(
+    lector=Depends(get_lector),
+    usuario: dict = Depends(solo_admin)
+):
+    # La ruta en el servidor no sale de la API
+    columnas = [c for c in HistorialArchivo.__table__.c if c.name != "ruta"]
+    filas = await lector.todas(
+        select(*columnas).order_by(HistorialArchivo.tabla, HistorialArchivo.desde)
+    )
+    return respuesta_json([dict(fila._mapping) for fila in filas])
+
+
 # =========================
 # CATÁLOGO DE PRODUCTOS
 # =========================
  
 @app.get("/api/catalogo", response_model=list[CatalogoProductoResponse])
-def listar_catalogo(
-    db: Session = Depends(get_db),
+async def listar_catalogo(
+    request: Request,
+    lector=Depends(get_lector),
     usuario: dict = Depends(admin_o_vendedor)
 ):
-    productos = db.query(CatalogoProducto).options(
-        joinedload(CatalogoProducto.conjuntos).joinedload(CatalogoConjunto.lista),
-        joinedload(CatalogoProducto.items_costo).joinedload(CatalogoItem.item),
-    ).all()
- 
-    resultado = []
-    for prod in productos:
-        prod_dict = {col.name: getattr(prod, col.name) for col in prod.__table__.columns}
-        prod_dict["conjuntos"] = construir_conjuntos_response(prod.conjuntos)
-        prod_dict["items_costo"] = construir_items_catalogo_response(prod.items_costo)
-        resultado.append(prod_dict)
- 
-    return resultado
+    etag = await etag_tablas(lector, request, TABLAS_CATALOGO)
+    no_mod = no_modificado(request, etag)
+    if no_mod:
+        return no_mod
+
+    return respuesta_json(armar_productos(*[
+        await lector.todas(consulta) for consulta in consultas_catalogo()
+    ]), headers=cabeceras_cache(etag))
  
  
 @app.get("/api/catalogo/{catalogo_id}", response_model=CatalogoProductoResponse)
@@ -846,41 +1174,24 @@ def crear_catalogo(
     db: Session = Depends(get_db),
     usuario: dict = Depends(solo_admin)
 ):
-    ultimo = db.query(CatalogoProducto).order_by(CatalogoProducto.id.desc()).first()
-    nuevo_codigo = f"CAT{(ultimo.id + 1):03d}" if ultimo else "CAT001"
+    nuevo_codigo = asignador.siguiente("CAT")
  
-    costo_directo = 0.0
-    conjuntos_data = []
-    if data.conjuntos:
-        for c in data.conjuntos:
-            lista = db.query(ListaPrecioConfig).filter(
-                ListaPrecioConfig.codigo == c.lista_codigo
-            ).first()
-            if lista:
-                costo_directo += (lista.costo_directo or 0) * c.cantidad
-                conjuntos_data.append((c.lista_codigo, c.cantidad))
-
-    items_costo_data = []
-    if data.items_costo:
-        for it in data.items_costo:
-            costo_item = db.query(CostoItem).filter(
-                CostoItem.id == it.get("item_id")
-            ).first()
-            if costo_item:
-                costo_directo += (costo_item.costo_fabrica or 0) * it.get("cantidad", 1)
-                items_costo_data.append((it.get("item_id"), it.get("cantidad", 1)))
- 
-    eventuales = (data.eventuales or 0) / 100
-    garantia = (data.garantia or 0) / 100
-    burden = (data.burden or 0) / 100
-    costo_total = costo_directo * (1 + eventuales + garantia + burden)
-    precio_cliente, precio_integrador = calcular_precios(
-        costo_total=costo_total,
-        metodo=data.metodo_precio or "gp",
-        gp_cliente=data.gp_cliente,
-        gp_integrador=data.gp_integrador,
-        markup_cliente=data.markup_cliente,
-        markup_integrador=data.markup_integrador
+    costo_directo, conjuntos_data, items_costo_data, faltantes = resolver_referencias(
+        db,
+        [(c.lista_codigo, c.cantidad) for c in data.conjuntos or []],
+        [(it.get("item_id"), it.get("cantidad", 1)) for it in data.items_costo or []],
+    )
+ 
+    totales = calcular_totales(
+        costo_directo,
+        data.eventuales,
+        data.garantia,
+        data.burden,
+        data.metodo_precio,
+        data.gp_cliente,
+        data.gp_integrador,
+        data.markup_cliente,
+        data.markup_integrador,
     )
  
     nuevo = CatalogoProducto(
@@ -896,29 +1207,24 @@ def crear_catalogo(
         eventuales=data.eventuales,
         garantia=data.garantia,
         burden=data.burden,
-        costo_directo=round(costo_directo, 4),
-        costo_total=round(costo_total, 4),
-        precio_cliente=precio_cliente,
-        precio_integrador=precio_integrador,
+        **totales,
         observaciones=data.observaciones,
         precio_final=data.precio_final,
     )
     db.add(nuevo)
     db.flush()
  
-    for lista_codigo, cantidad in conjuntos_data:
-        db.add(CatalogoConjunto(
-            catalogo_id=nuevo.id,
-            lista_codigo=lista_codigo,
-            cantidad=cantidad,
-        ))
+    if conjuntos_data:
+        db.execute(insert(CatalogoConjunto), [
+            {"catalogo_id": nuevo.id, "lista_codigo": lista_codigo, "cantidad": cantidad}
+            for lista_codigo, cantidad in conjuntos_data
+        ])
 
-    for item_id, cantidad in items_costo_data:
-        db.add(CatalogoItem(
-            catalogo_id=nuevo.id,
-            item_id=item_id,
-            cantidad=cantidad,
-        ))
+    if items_costo_data:
+        db.execute(insert(CatalogoItem), [
+            {"catalogo_id": nuevo.id, "item_id": item_id, "cantidad": cantidad}
+            for item_id, cantidad in items_costo_data
+        ])
  
     registrar_cambio(db, usuario, "crear", "catalogo", nuevo.id, nuevo.nombre)
     db.commit()
@@ -927,6 +1233,7 @@ def crear_catalogo(
     prod_dict = {col.name: getattr(nuevo, col.name) for col in nuevo.__table__.columns}
     prod_dict["conjuntos"] = construir_conjuntos_response(nuevo.conjuntos)
     prod_dict["items_costo"] = construir_items_catalogo_response(nuevo.items_costo)
+    prod_dict["referencias_faltantes"] = faltantes
     return prod_dict
  
  
@@ -958,64 +1265,44 @@ def actualizar_catalogo(
         if campo in data and data[campo] is not None:
             setattr(prod, campo, data[campo])
 
+    faltantes = {"listas": [], "items": []}
     if "conjuntos" in data or "items_costo" in data:
-        costo_directo = 0.0
+        _, conjuntos_data, items_costo_data, faltantes = resolver_referencias(
+            db,
+            [(c.get("lista_codigo"), c.get("cantidad", 1)) for c in data.get("conjuntos") or []],
+            [(it.get("item_id"), it.get("cantidad", 1)) for it in data.get("items_costo") or []],
+        )
 
         if "conjuntos" in data:
             db.query(CatalogoConjunto).filter(
                 CatalogoConjunto.catalogo_id == prod.id
             ).delete()
-
-            for c in data["conjuntos"]:
-                lista = db.query(ListaPrecioConfig).filter(
-                    ListaPrecioConfig.codigo == c.get("lista_codigo")
-                ).first()
-                if lista:
-                    costo_directo += (lista.costo_directo or 0) * c.get("cantidad", 1)
-                db.add(CatalogoConjunto(
-                    catalogo_id=prod.id,
-                    lista_codigo=c.get("lista_codigo"),
-                    cantidad=c.get("cantidad", 1),
-                ))
+            if conjuntos_data:
+                db.execute(insert(CatalogoConjunto), [
+                    {"catalogo_id": prod.id, "lista_codigo": lista_codigo, "cantidad": cantidad}
+                    for lista_codigo, cantidad in conjuntos_data
+                ])
 
         if "items_costo" in data:
             db.query(CatalogoItem).filter(
                 CatalogoItem.catalogo_id == prod.id
             ).delete()
+            if items_costo_data:
+                db.execute(insert(CatalogoItem), [
+                    {"catalogo_id": prod.id, "item_id": item_id, "cantidad": cantidad}
+                    for item_id, cantidad in items_costo_data
+                ])
 
-            for it in data["items_costo"]:
-                costo_item = db.query(CostoItem).filter(
-                    CostoItem.id == it.get("item_id")
-                ).first()
-                if costo_item:
-                    costo_directo += (costo_item.costo_fabrica or 0) * it.get("cantidad", 1)
-                    db.add(CatalogoItem(
-                        catalogo_id=prod.id,
-                        item_id=it.get("item_id"),
-                        cantidad=it.get("cantidad", 1),
-                    ))
-
-        eventuales = (prod.eventuales or 0) / 100
-        garantia = (prod.garantia or 0) / 100
-        burden = (prod.burden or 0) / 100
-        costo_total = costo_directo * (1 + eventuales + garantia + burden)
-        precio_cliente, precio_integrador = calcular_precios(
-            costo_total=costo_total,
-            metodo=prod.metodo_precio or "gp",
-            gp_cliente=prod.gp_cliente,
-            gp_integrador=prod.gp_integrador,
-            markup_cliente=prod.markup_cliente,
-            markup_integrador=prod.markup_integrador
-        )
-        prod.costo_directo = round(costo_directo, 4)
-        prod.costo_total = round(costo_total, 4)
-        prod.precio_cliente = precio_cliente
-        prod.precio_integrador = precio_integrador
+    # Totales desde la base: incluye también la parte (conjuntos o ítems) que no vino en el
+    # request, y se recalculan igual si solo cambió un parámetro de precio (gp, markup, etc.)
+    if "conjuntos" in data or "items_costo" in data or any(data.get(c) is not None for c in COLUMNAS_PRECIO):
+        db.flush()
+        recalcular_catalogos(db, [prod.id])
 
     registrar_cambio(db, usuario, "editar", "catalogo", prod.id, prod.nombre)
     db.commit()
     db.refresh(prod)
-    return {"ok": True, "mensaje": "Producto de catálogo actualizado correctamente"}
+    return {"ok": True, "mensaje": "Producto de catálogo actualizado correctamente", "referencias_faltantes": faltantes}
  
 @app.delete("/api/catalogo/{catalogo_id}")
 def eliminar_catalogo(
@@ -1045,23 +1332,19 @@ def eliminar_catalogo(
 # =========================
  
 @app.get("/api/cotizaciones", response_model=list[CotizacionResponse])
-def listar_cotizaciones(
-    db: Session = Depends(get_db),
+async def listar_cotizaciones(
+    request: Request,
+    lector=Depends(get_lector),
     usuario: dict = Depends(admin_o_vendedor)
 ):
-    cotizaciones = db.query(Cotizacion).options(
-        joinedload(Cotizacion.conjuntos).joinedload(CotizacionConjunto.lista),
-        joinedload(Cotizacion.items_costo).joinedload(CotizacionItem.item),
-    ).all()
- 
-    resultado = []
-    for cot in cotizaciones:
-        cot_dict = {col.name: getattr(cot, col.name) for col in cot.__table__.columns}
-        cot_dict["conjuntos"] = construir_conjuntos_response(cot.conjuntos)
-        cot_dict["items_costo"] = construir_items_costo_response(cot.items_costo)
-        resultado.append(cot_dict)
- 
-    return resultado
+    etag = await etag_tablas(lector, request, TABLAS_COTIZACIONES)
+    no_mod = no_modificado(request, etag)
+    if no_mod:
+        return no_mod
+
+    return respuesta_json(armar_productos(*[
+        await lector.todas(consulta) for consulta in consultas_cotizaciones()
+    ]), headers=cabeceras_cache(etag))
  
  
 @app.get("/api/cotizaciones/{cotizacion_id}", response_model=CotizacionResponse)
@@ -1096,41 +1379,24 @@ def crear_cotizacion(
     db: Session = Depends(get_db),
     usuario: dict = Depends(solo_admin)
 ):
-    ultimo = db.query(Cotizacion).order_by(Cotizacion.id.desc()).first()
-    nuevo_codigo = f"COT{(ultimo.id + 1):03d}" if ultimo else "COT001"
+    nuevo_codigo = asignador.siguiente("COT")
  
-    costo_directo = 0.0
-    conjuntos_data = []
-    if data.conjuntos:
-        for c in data.conjuntos:
-            lista = db.query(ListaPrecioConfig).filter(
-                ListaPrecioConfig.codigo == c.lista_codigo
-            ).first()
-            if lista:
-                costo_directo += (lista.costo_directo or 0) * c.cantidad
-                conjuntos_data.append((c.lista_codigo, c.cantidad))
-
-    items_costo_data = []
-    if data.items_costo:
-        for it in data.items_costo:
-            costo_item = db.query(CostoItem).filter(
-                CostoItem.id == it.get("item_id")
-            ).first()
-            if costo_item:
-                costo_directo += (costo_item.costo_fabrica or 0) * it.get("cantidad", 1)
-                items_costo_data.append((it.get("item_id"), it.get("cantidad", 1)))
- 
-    eventuales = (data.eventuales or 0) / 100
-    garantia = (data.garantia or 0) / 100
-    burden = (data.burden or 0) / 100
-    costo_total = costo_directo * (1 + eventuales + garantia + burden)
-    precio_cliente, precio_integrador = calcular_precios(
-        costo_total=costo_total,
-        metodo=data.metodo_precio or "gp",
-        gp_cliente=data.gp_cliente,
-        gp_integrador=data.gp_integrador,
-        markup_cliente=data.markup_cliente,
-        markup_integrador=data.markup_integrador
+    costo_directo, conjuntos_data, items_costo_data, faltantes = resolver_referencias(
+        db,
+        [(c.lista_codigo, c.cantidad) for c in data.conjuntos or []],
+        [(it.get("item_id"), it.get("cantidad", 1)) for it in data.items_costo or []],
+    )
+ 
+    totales = calcular_totales(
+        costo_directo,
+        data.eventuales,
+        data.garantia,
+        data.burden,
+        data.metodo_precio,
+        data.gp_cliente,
+        data.gp_integrador,
+        data.markup_cliente,
+        data.markup_integrador,
     )
  
     nueva = Cotizacion(
@@ -1147,29 +1413,24 @@ def crear_cotizacion(
         eventuales=data.eventuales,
         garantia=data.garantia,
         burden=data.burden,
-        costo_directo=round(costo_directo, 4),
-        costo_total=round(costo_total, 4),
-        precio_cliente=precio_cliente,
-        precio_integrador=precio_integrador,
+        **totales,
         observaciones=data.observaciones,
         precio_final=data.precio_final,
     )
     db.add(nueva)
     db.flush()
  
-    for lista_codigo, cantidad in conjuntos_data:
-        db.add(CotizacionConjunto(
-            cotizacion_id=nueva.id,
-            lista_codigo=lista_codigo,
-            cantidad=cantidad,
-        ))
+    if conjuntos_data:
+        db.execute(insert(CotizacionConjunto), [
+            {"cotizacion_id": nueva.id, "lista_codigo": lista_codigo, "cantidad": cantidad}
+            for lista_codigo, cantidad in conjuntos_data
+        ])
 
-    for item_id, cantidad in items_costo_data:
-        db.add(CotizacionItem(
-            cotizacion_id=nueva.id,
-            item_id=item_id,
-            cantidad=cantidad,
-        ))
+    if items_costo_data:
+        db.execute(insert(CotizacionItem), [
+            {"cotizacion_id": nueva.id, "item_id": item_id, "cantidad": cantidad}
+            for item_id, cantidad in items_costo_data
+        ])
  
     registrar_cambio(db, usuario, "crear", "cotizacion", nueva.id, nueva.nombre)
     db.commit()
@@ -1178,6 +1439,7 @@ def crear_cotizacion(
     cot_dict = {col.name: getattr(nueva, col.name) for col in nueva.__table__.columns}
     cot_dict["conjuntos"] = construir_conjuntos_response(nueva.conjuntos)
     cot_dict["items_costo"] = construir_items_costo_response(nueva.items_costo)
+    cot_dict["referencias_faltantes"] = faltantes
     return cot_dict
  
 
@@ -1209,63 +1471,44 @@ def actualizar_cotizacion(
         if campo in data and data[campo] is not None:
             setattr(cot, campo, data[campo])
 
+    faltantes = {"listas": [], "items": []}
     if "conjuntos" in data or "items_costo" in data:
-        costo_directo = 0.0
+        _, conjuntos_data, items_costo_data, faltantes = resolver_referencias(
+            db,
+            [(c.get("lista_codigo"), c.get("cantidad", 1)) for c in data.get("conjuntos") or []],
+            [(it.get("item_id"), it.get("cantidad", 1)) for it in data.get("items_costo") or []],
+        )
 
         if "conjuntos" in data:
             db.query(CotizacionConjunto).filter(
                 CotizacionConjunto.cotizacion_id == cot.id
             ).delete()
-
-            for c in data["conjuntos"]:
-                lista = db.query(ListaPrecioConfig).filter(
-                    ListaPrecioConfig.codigo == c.get("lista_codigo")
-                ).first()
-                if lista:
-                    costo_directo += (lista.costo_directo or 0) * c.get("cantidad", 1)
-                db.add(CotizacionConjunto(
-                    cotizacion_id=cot.id,
-                    lista_codigo=c.get("lista_codigo"),
-                    cantidad=c.get("cantidad", 1),
-                ))
+            if conjuntos_data:
+                db.execute(insert(CotizacionConjunto), [
+                    {"cotizacion_id": cot.id, "lista_codigo": lista_codigo, "cantidad": cantidad}
+                    for lista_codigo, cantidad in conjuntos_data
+                ])
 
         if "items_costo" in data:
             db.query(CotizacionItem).filter(
                 CotizacionItem.cotizacion_id == cot.id
             ).delete()
-            for it in data["items_costo"]:
-                costo_item = db.query(CostoItem).filter(
-                    CostoItem.id == it.get("item_id")
-                ).first()
-                if costo_item:
-                    costo_directo += (costo_item.costo_fabrica or 0) * it.get("cantidad", 1)
-                    db.add(CotizacionItem(
-                        cotizacion_id=cot.id,
-                        item_id=it.get("item_id"),
-                        cantidad=it.get("cantidad", 1),
-                    ))
-
-        eventuales = (cot.eventuales or 0) / 100
-        garantia = (cot.garantia or 0) / 100
-        burden = (cot.burden or 0) / 100
-        costo_total = costo_directo * (1 + eventuales + garantia + burden)
-        precio_cliente, precio_integrador = calcular_precios(
-            costo_total=costo_total,
-            metodo=cot.metodo_precio or "gp",
-            gp_cliente=cot.gp_cliente,
-            gp_integrador=cot.gp_integrador,
-            markup_cliente=cot.markup_cliente,
-            markup_integrador=cot.markup_integrador
-        )
-        cot.costo_directo = round(costo_directo, 4)
-        cot.costo_total = round(costo_total, 4)
-        cot.precio_cliente = precio_cliente
-        cot.precio_integrador = precio_integrador
+            if items_costo_data:
+                db.execute(insert(CotizacionItem), [
+                    {"cotizacion_id": cot.id, "item_id": item_id, "cantidad": cantidad}
+                    for item_id, cantidad in items_costo_data
+                ])
+
+    # Totales desde la base: incluye también la parte (conjuntos o ítems) que no vino en el
+    # request, y se recalculan igual si solo cambió un parámetro de precio (gp, markup, etc.)
+    if "conjuntos" in data or "items_costo" in data or any(data.get(c) is not None for c in COLUMNAS_PRECIO):
+        db.flush()
+        recalcular_cotizaciones(db, [cot.id])
 
     registrar_cambio(db, usuario, "editar", "cotizacion", cot.id, cot.nombre)
     db.commit()
     db.refresh(cot)
-    return {"ok": True, "mensaje": "Cotización actualizada correctamente"}
+    return {"ok": True, "mensaje": "Cotización actualizada correctamente", "referencias_faltantes": faltantes}
  
  
 @app.delete("/api/cotizaciones/{cotizacion_id}")
@@ -1382,6 +1625,9 @@ def verificar_lock(
     }
  
  
+arranque["import_ms"] = round((time.perf_counter() - _INICIO_IMPORT) * 1000, 2)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="127.0.0.1", port=8001)
@@ -0,0 +1,97 @@
+import os
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, DateTime, select, inspect, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from backend_costeo.database import engine as engine_default
+from backend_costeo.models import Base
+from backend_costeo.bus import asegurar_eventos
+from backend_costeo.particiones import preparar_particiones
+from backend_costeo.versiones import asegurar_versiones
+from backend_costeo.secuencias import asegurar_secuencias
+
+# Subir este número cada vez que cambien tablas o índices; `python -m backend_costeo migrate` lo registra.
+ESQUEMA_VERSION = 8
+
+# Si está en 1, un worker que encuentra el esquema desactualizado migra solo (útil en desarrollo).
+COSTEO_AUTOMIGRAR = os.getenv("COSTEO_AUTOMIGRAR", "0") == "1"
+
+
+class EsquemaVersion(Base):
+    __tablename__ = "esquema_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False)
+    aplicada_en = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+def asegurar_indices(engine=engine_default):
+    """Crea los índices declarados en los modelos que todavía no existen en tablas ya creadas."""
+    for tabla in Base.metadata.sorted_tables:
+        for indice in tabla.indexes:
+            indice.create(bind=engine, checkfirst=True)
+
+
+def asegurar_columnas(engine=engine_default):
+    """Agrega a tablas ya creadas las columnas nuevas de los modelos (deben ser nullables)."""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for tabla in Base.metadata.sorted_tables:
+            if not inspector.has_table(tabla.name):
+                continue
+            existentes = {columna["name"] for columna in inspector.get_columns(tabla.name)}
+            for columna in tabla.columns:
+                if columna.name not in existentes:
+                    tipo = columna.type.compile(dialect=engine.dialect)
+                    print(f"🔄 Agregando columna {tabla.name}.{columna.name}")
+                    conn.execute(text(f"ALTER TABLE {tabla.name} ADD COLUMN {columna.name} {tipo}"))
+
+
+def version_actual(engine=engine_default):
+    """Versión registrada en la base, o None si nunca se migró."""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(select(EsquemaVersion.version).where(EsquemaVersion.id == 1)).scalar()
+    except SQLAlchemyError:
+        return None
+
+
+def migrar(engine=engine_default):
+    """Crea tablas e índices faltantes y deja registrada la versión de esquema."""
+    Base.metadata.create_all(bind=engine)
+    asegurar_columnas(engine)
+    asegurar_eventos(engine)
+    # Antes de los índices: al particionar se recrea la tabla y los índices van sobre la nueva
+    preparar_particiones(engine)
+    asegurar_indices(engine)
+
+    with engine.begin() as conn:
+        asegurar_versiones(conn)
+        asegurar_secuencias(conn)
+        actualizada = conn.execute(
+            EsquemaVersion.__table__.update()
+            .where(EsquemaVersion.id == 1)
+            .values(version=ESQUEMA_VERSION, aplicada_en=datetime.utcnow())
+        ).rowcount
+        if not actualizada:
+            conn.execute(
+                EsquemaVersion.__table__.insert().values(id=1, version=ESQUEMA_VERSION, aplicada_en=datetime.utcnow())
+            )
+    return ESQUEMA_VERSION
+
+
+def verificar_esquema(engine=engine_default):
+    """Chequeo de arranque de los workers: una sola lectura de la fila de versión."""
+    version = version_actual(engine)
+    if version is not None and version >= ESQUEMA_VERSION:
+        return version
+
+    if COSTEO_AUTOMIGRAR:
+        print(f"⚠️ Esquema en versión {version}, se requiere {ESQUEMA_VERSION}: migrando (COSTEO_AUTOMIGRAR=1)")
+        return migrar(engine)
+
+    raise RuntimeError(
+        f"❌ Esquema de base en versión {version}, se requiere {ESQUEMA_VERSION}. "
+        "Ejecutar `python -m backend_costeo migrate` antes de levantar la API."
+    )
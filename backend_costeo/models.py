@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from backend_costeo.historial import HistorialCambio
@@ -34,6 +34,11 @@ class CostoItem(Base):
         back_populates="costo_item",
         cascade="all, delete-orphan"
     )
+    __table_args__ = (
+        Index("ix_costos_items_tipo_subtipo", "tipo", "subtipo"),
+        # text_pattern_ops permite usar el índice en búsquedas por prefijo (LIKE 'abc%')
+        Index("ix_costos_items_nombre", "nombre", postgresql_ops={"nombre": "text_pattern_ops"}),
+    )
  
  
 class ListaPrecioConfig(Base):
@@ -56,6 +61,8 @@ class ListaPrecioConfig(Base):
     markup_cliente = Column(Float, nullable=True)
     markup_integrador = Column(Float, nullable=True)
     observaciones = Column(String, nullable=True)
+    # Momento del último cálculo de los totales en el servidor (recalcular_listas)
+    calculado_en = Column(DateTime, nullable=True)
     items = relationship(
         "ListaPrecioItem",
         back_populates="lista",
@@ -0,0 +1,326 @@
+import gzip
+import hashlib
+import os
+from datetime import datetime
+from pathlib import Path
+
+import orjson
+from sqlalchemy import Column, Integer, String, DateTime, select, delete, func, text
+from sqlalchemy.schema import AddConstraint
+
+from backend_costeo.database import Base, engine as engine_default
+from backend_costeo.models import CostoHistorial
+from backend_costeo.historial import HistorialCambio, utc_naive
+
+# =========================
+# Historial particionado por mes (Postgres) y archivado en JSONL comprimido.
+# En SQLite las tablas quedan planas y el archivado borra por rango de fechas.
+# =========================
+
+TABLAS_HISTORIAL = {
+    "historial_cambios": HistorialCambio,
+    "costos_historial": CostoHistorial,
+}
+
+PARTICIONES_MESES_ADELANTE = int(os.getenv("PARTICIONES_MESES_ADELANTE", "3"))
+HISTORIAL_ARCHIVO_MESES = int(os.getenv("HISTORIAL_ARCHIVO_MESES", "12"))
+# Sin valor por defecto: el archivo es la única copia de las filas que se borran, así que
+# tiene que ser un almacenamiento persistente (volumen montado), no el disco del contenedor
+HISTORIAL_ARCHIVO_DIR = os.getenv("HISTORIAL_ARCHIVO_DIR")
+ARCHIVO_LOTE = 5000
+
+
+class HistorialArchivo(Base):
+    """Registro de cada rango mensual movido a un archivo .jsonl.gz."""
+    __tablename__ = "historial_archivos"
+
+    id = Column(Integer, primary_key=True)
+    tabla = Column(String, nullable=False, index=True)
+    desde = Column(DateTime, nullable=False)
+    hasta = Column(DateTime, nullable=False)
+    ruta = Column(String, nullable=False)
+    filas = Column(Integer, nullable=False)
+    creado_en = Column(DateTime, default=datetime.utcnow)
+
+
+def _inicio_mes(fecha: datetime) -> datetime:
+    return datetime(fecha.year, fecha.month, 1)
+
+
+def _sumar_meses(fecha: datetime, meses: int) -> datetime:
+    total = fecha.year * 12 + fecha.month - 1 + meses
+    return datetime(total // 12, total % 12 + 1, 1)
+
+
+def _nombre_particion(tabla: str, mes: datetime) -> str:
+    return f"{tabla}_p{mes:%Y%m}"
+
+
+# =========================
+# POSTGRES: PARTICIONADO POR RANGO
+# =========================
+
+def es_particionada(conn, tabla: str) -> bool:
+    return conn.execute(
+        text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:tabla)"),
+        {"tabla": tabla},
+    ).first() is not None
+
+
+def _particion_default(tabla: str) -> str:
+    return f"{tabla}_default"
+
+
+def _crear_particion(conn, tabla: str, mes: datetime):
+    """Crea la partición del mes. Si la default ya tiene filas de ese rango (un mes que pasó
+    sin partición), Postgres rechaza el CREATE: se desengancha la default, se crea la
+    partición, se mueven las filas y se vuelve a enganchar, todo en la transacción de `conn`."""
+    particion = _nombre_particion(tabla, mes)
+    if conn.execute(text("SELECT to_regclass(:p)"), {"p": particion}).scalar():
+        return
+
+    siguiente = _sumar_meses(mes, 1)
+    rango = f"fecha >= '{mes:%Y-%m-%d}' AND fecha < '{siguiente:%Y-%m-%d}'"
+    crear = (
+        f"CREATE TABLE {particion} PARTITION OF {tabla} "
+        f"FOR VALUES FROM ('{mes:%Y-%m-%d}') TO ('{siguiente:%Y-%m-%d}')"
+    )
+    default = _particion_default(tabla)
+    con_filas = conn.execute(text(f"SELECT 1 FROM {default} WHERE {rango} LIMIT 1")).first() is not None
+    if not con_filas:
+        conn.execute(text(crear))
+        return
+
+    print(f"🔄 Moviendo filas de {default} a {particion}...")
+    conn.execute(text(f"ALTER TABLE {tabla} DETACH PARTITION {default}"))
+    conn.execute(text(crear))
+    conn.execute(text(f"INSERT INTO {tabla} SELECT * FROM {default} WHERE {rango}"))
+    conn.execute(text(f"DELETE FROM {default} WHERE {rango}"))
+    conn.execute(text(f"ALTER TABLE {tabla} ATTACH PARTITION {default} DEFAULT"))
+
+
+def asegurar_particiones(conn, tabla: str, desde: datetime = None, meses_adelante: int = PARTICIONES_MESES_ADELANTE):
+    """Crea las particiones mensuales que falten desde `desde` hasta N meses adelante.
+
+    Sin `desde` arranca en el mes actual, o antes si la partición default tiene filas más viejas.
+    """
+    if desde is None:
+        desde = datetime.utcnow()
+        en_default = conn.execute(text(f"SELECT min(fecha) FROM {_particion_default(tabla)}")).scalar()
+        if en_default is not None:
+            desde = min(desde, en_default)
+
+    mes = _inicio_mes(desde)
+    hasta = _sumar_meses(_inicio_mes(datetime.utcnow()), meses_adelante + 1)
+    while mes < hasta:
+        _crear_particion(conn, tabla, mes)
+        mes = _sumar_meses(mes, 1)
+
+
+def convertir_a_particionada(conn, tabla: str):
+    """Reemplaza la tabla plana por una particionada por mes de `fecha`, copiando los datos."""
+    modelo = TABLAS_HISTORIAL[tabla]
+    legado = f"{tabla}_legado"
+
+    conn.execute(text(f"ALTER TABLE {tabla} RENAME TO {legado}"))
+    conn.execute(text(f"UPDATE {legado} SET fecha = now() WHERE fecha IS NULL"))
+    conn.execute(text(
+        f"CREATE TABLE {tabla} (LIKE {legado} INCLUDING DEFAULTS) PARTITION BY RANGE (fecha)"
+    ))
+    conn.execute(text(f"ALTER TABLE {tabla} ALTER COLUMN fecha SET NOT NULL"))
+    conn.execute(text(f"CREATE TABLE {_particion_default(tabla)} PARTITION OF {tabla} DEFAULT"))
+
+    minima = conn.execute(text(f"SELECT min(fecha) FROM {legado}")).scalar()
+    asegurar_particiones(conn, tabla, desde=minima)
+
+    conn.execute(text(f"INSERT INTO {tabla} SELECT * FROM {legado}"))
+
+    # La secuencia del id pertenece a la tabla vieja: se traspasa antes de borrarla
+    secuencia = conn.execute(text(f"SELECT pg_get_serial_sequence('{legado}', 'id')")).scalar()
+    if secuencia:
+        conn.execute(text(f"ALTER SEQUENCE {secuencia} OWNED BY {tabla}.id"))
+    conn.execute(text(f"DROP TABLE {legado}"))
+
+    # En una tabla particionada la clave primaria debe incluir la columna de partición
+    conn.execute(text(f"ALTER TABLE {tabla} ADD PRIMARY KEY (id, fecha)"))
+    for restriccion in modelo.__table__.foreign_key_constraints:
+        conn.execute(AddConstraint(restriccion))
+
+
+def preparar_particiones(engine=engine_default):
+    """Paso de `migrate`: particiona el historial en Postgres (idempotente). En SQLite no hace nada."""
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        for tabla in TABLAS_HISTORIAL:
+            if not es_particionada(conn, tabla):
+                print(f"🔄 Particionando {tabla} por mes...")
+                convertir_a_particionada(conn, tabla)
+            asegurar_particiones(conn, tabla)
+
+
+# =========================
+# ARCHIVADO
+# =========================
+
+def _ruta_archivo(destino: Path, tabla: str, mes: datetime) -> Path:
+    carpeta = destino / tabla
+    carpeta.mkdir(parents=True, exist_ok=True)
+    ruta = carpeta / f"{tabla}_{mes:%Y%m}.jsonl.gz"
+    n = 2
+    # Filas tardías del mismo mes (p. ej. en la partición default) van a un archivo aparte
+    while ruta.exists():
+        ruta = carpeta / f"{tabla}_{mes:%Y%m}_{n}.jsonl.gz"
+        n += 1
+    return ruta
+
+
+def _fsync_carpeta(carpeta: Path):
+    # Persiste la entrada del directorio (el rename); en Windows no se puede abrir una carpeta
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(carpeta, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _resumen_archivo(ruta: Path):
+    """(filas, sha256 del contenido sin comprimir) leyendo el archivo ya escrito."""
+    suma = hashlib.sha256()
+    filas = 0
+    with gzip.open(ruta, "rb") as archivo:
+        for linea in archivo:
+            suma.update(linea)
+            filas += 1
+    return filas, suma.hexdigest()
+
+
+def _archivar_mes(conn, tabla: str, mes: datetime, destino: Path) -> dict:
+    modelo = TABLAS_HISTORIAL[tabla]
+    t = modelo.__table__
+    siguiente = _sumar_meses(mes, 1)
+    rango = (t.c.fecha >= mes, t.c.fecha < siguiente)
+
+    ruta = _ruta_archivo(destino, tabla, mes)
+    parcial = ruta.with_name(ruta.name + ".parcial")
+    suma = hashlib.sha256()
+    filas = 0
+    try:
+        with open(parcial, "wb") as crudo:
+            with gzip.GzipFile(fileobj=crudo, mode="wb") as archivo:
+                resultado = conn.execution_options(yield_per=ARCHIVO_LOTE).execute(
+                    select(*t.c).where(*rango).order_by(t.c.fecha, t.c.id)
+                )
+                for fila in resultado:
+                    linea = orjson.dumps(dict(fila._mapping)) + b"\n"
+                    archivo.write(linea)
+                    suma.update(linea)
+                    filas += 1
+            crudo.flush()
+            os.fsync(crudo.fileno())
+
+        if not filas:
+            parcial.unlink()
+            return None
+
+        # Antes de borrar nada, el archivo en disco tiene que releerse igual a lo exportado
+        if _resumen_archivo(parcial) != (filas, suma.hexdigest()):
+            raise RuntimeError(f"❌ El archivo de {tabla} {mes:%Y-%m} no coincide con lo exportado")
+        os.replace(parcial, ruta)
+        _fsync_carpeta(ruta.parent)
+    except BaseException:
+        parcial.unlink(missing_ok=True)
+        raise
+
+    particion = _nombre_particion(tabla, mes)
+    if conn.dialect.name == "postgresql" and conn.execute(
+        text("SELECT to_regclass(:p)"), {"p": particion}
+    ).scalar():
+        conn.execute(text(f"ALTER TABLE {tabla} DETACH PARTITION {particion}"))
+        conn.execute(text(f"DROP TABLE {particion}"))
+    # Lo que quede en el rango (partición default o tabla plana) se borra por fecha
+    conn.execute(delete(t).where(*rango))
+
+    conn.execute(HistorialArchivo.__table__.insert().values(
+        tabla=tabla, desde=mes, hasta=siguiente, ruta=str(ruta), filas=filas, creado_en=datetime.utcnow(),
+    ))
+    return {"tabla": tabla, "desde": mes, "hasta": siguiente, "ruta": str(ruta), "filas": filas}
+
+
+def archivar_historial(engine=engine_default, meses: int = HISTORIAL_ARCHIVO_MESES, destino: Path = None) -> list[dict]:
+    """Mueve a archivos .jsonl.gz los meses de historial más viejos que `meses` meses.
+
+    Cada mes se archiva en su propia transacción: si falla, el mes queda intacto en la base.
+    Las filas se borran recién después de escribir el archivo con fsync y verificarlo.
+    """
+    destino = destino or HISTORIAL_ARCHIVO_DIR
+    if not destino:
+        raise RuntimeError(
+            "❌ HISTORIAL_ARCHIVO_DIR no está configurada: el archivado borra las filas de la base "
+            "y necesita un almacenamiento persistente (p. ej. un volumen montado)."
+        )
+    destino = Path(destino).resolve()
+    if not destino.is_dir():
+        raise RuntimeError(f"❌ La carpeta de archivo {destino} no existe (¿volumen sin montar?)")
+    limite = _sumar_meses(_inicio_mes(datetime.utcnow()), -meses)
+    archivados = []
+
+    for tabla, modelo in TABLAS_HISTORIAL.items():
+        with engine.connect() as conn:
+            minima = conn.execute(select(func.min(modelo.fecha))).scalar()
+        if minima is None:
+            continue
+
+        mes = _inicio_mes(minima)
+        while mes < limite:
+            with engine.begin() as conn:
+                archivo = _archivar_mes(conn, tabla, mes, destino)
+            if archivo:
+                print(f"📦 {tabla} {mes:%Y-%m}: {archivo['filas']} filas → {archivo['ruta']}")
+                archivados.append(archivo)
+            mes = _sumar_meses(mes, 1)
+
+    # De paso, deja creadas las particiones de los próximos meses
+    preparar_particiones(engine)
+    return archivados
+
+
+class ArchivoNoDisponible(Exception):
+    """Un archivo registrado en historial_archivos ya no está en el almacenamiento."""
+
+
+def leer_archivados(db, tabla: str, desde: datetime = None, hasta: datetime = None, filtros: dict = None, limite: int = 1000):
+    """Lee bajo demanda filas archivadas de `tabla` en [desde, hasta), en orden cronológico.
+
+    `filtros` son igualdades por columna (p. ej. {"entidad": "costo_item"}).
+    Lanza ArchivoNoDisponible si falta alguno de los archivos del rango.
+    """
+    desde, hasta = utc_naive(desde), utc_naive(hasta)
+    a = HistorialArchivo
+    consulta = select(a.ruta, a.desde).where(a.tabla == tabla).order_by(a.desde, a.id)
+    if desde is not None:
+        consulta = consulta.where(a.hasta > desde)
+    if hasta is not None:
+        consulta = consulta.where(a.desde < hasta)
+
+    filtros = {k: str(v) for k, v in (filtros or {}).items() if v is not None}
+    resultado = []
+    for ruta, mes in db.execute(consulta).all():
+        if not Path(ruta).is_file():
+            raise ArchivoNoDisponible(f"{tabla} {mes:%Y-%m}")
+        with gzip.open(ruta, "rb") as archivo:
+            for linea in archivo:
+                fila = orjson.loads(linea)
+                fecha = utc_naive(datetime.fromisoformat(fila["fecha"]))
+                if desde is not None and fecha < desde:
+                    continue
+                if hasta is not None and fecha >= hasta:
+                    continue
+                if any(str(fila.get(campo)) != valor for campo, valor in filtros.items()):
+                    continue
+                resultado.append(fila)
+                if len(resultado) >= limite:
+                    return resultado
+    return resultado
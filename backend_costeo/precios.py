@@ -0,0 +1,119 @@
+import numpy as np
+
+
+def calcular_precios(costo_total, metodo, gp_cliente, gp_integrador, markup_cliente=None, markup_integrador=None):
+    if metodo == "markup":
+        precio_cliente = round(costo_total * (1 + (markup_cliente or 0) / 100), 4)
+        precio_integrador = round(costo_total * (1 + (markup_integrador or 0) / 100), 4)
+    else:
+        gp_c = (gp_cliente or 0) / 100
+        gp_i = (gp_integrador or 0) / 100
+        precio_cliente = round(costo_total / (1 - gp_c), 4) if gp_c < 1 else 0
+        precio_integrador = round(costo_total / (1 - gp_i), 4) if gp_i < 1 else 0
+    return precio_cliente, precio_integrador
+
+
+def calcular_costo_total(costo_directo, eventuales, garantia, burden):
+    return (costo_directo or 0) * (1 + (eventuales or 0) / 100 + (garantia or 0) / 100 + (burden or 0) / 100)
+
+
+def calcular_totales(costo_directo, eventuales, garantia, burden, metodo,
+                     gp_cliente, gp_integrador, markup_cliente=None, markup_integrador=None):
+    """Costo directo → costo total → precios, con el redondeo que se persiste."""
+    costo_total = calcular_costo_total(costo_directo, eventuales, garantia, burden)
+    precio_cliente, precio_integrador = calcular_precios(
+        costo_total=costo_total,
+        metodo=metodo or "gp",
+        gp_cliente=gp_cliente,
+        gp_integrador=gp_integrador,
+        markup_cliente=markup_cliente,
+        markup_integrador=markup_integrador
+    )
+    return {
+        "costo_directo": round(costo_directo or 0, 4),
+        "costo_total": round(costo_total, 4),
+        "precio_cliente": precio_cliente,
+        "precio_integrador": precio_integrador,
+    }
+
+
+COLUMNAS_PRECIO = (
+    "costo_directo", "eventuales", "garantia", "burden", "metodo_precio",
+    "gp_cliente", "gp_integrador", "markup_cliente", "markup_integrador",
+)
+
+
+def _columna(valores) -> np.ndarray:
+    columna = np.array(valores, dtype=np.float64)
+    if np.isnan(columna).any():
+        # numpy convierte None en NaN: van como 0, igual que los `or 0` del cálculo por fila
+        columna = np.array([0.0 if v is None else v for v in valores], dtype=np.float64)
+    return columna
+
+
+def _redondear(valores: np.ndarray) -> np.ndarray:
+    """`round(x, 4)` elemento a elemento, con el mismo resultado que el de Python.
+
+    np.round escala por 10^4 y ese producto ya viene redondeado: cerca de un .5 puede
+    caer del otro lado que el valor exacto. Esos casos (y los enormes) van por `round`.
+    """
+    escalados = valores * 1e4
+    redondeados = np.rint(escalados) / 1e4
+    with np.errstate(invalid="ignore"):
+        dudosos = ~(np.abs(escalados) < 2.0 ** 52) | (
+            np.abs(escalados - np.floor(escalados) - 0.5) <= np.abs(escalados) * 2.0 ** -50
+        )
+    for i in np.flatnonzero(dudosos):
+        redondeados[i] = round(float(valores[i]), 4)
+    return redondeados
+
+
+def calcular_totales_lote(costo_directo, eventuales, garantia, burden, metodo_precio,
+                          gp_cliente, gp_integrador, markup_cliente, markup_integrador):
+    """Versión por columnas de `calcular_totales` para recálculos masivos.
+
+    Recibe secuencias paralelas (una por columna) y devuelve un dict de listas
+    paralelas. Las operaciones son las mismas y en el mismo orden que por fila,
+    así que cada elemento da exactamente lo mismo que `calcular_totales`.
+    """
+    costo_directo = _columna(costo_directo)
+    costo_total = costo_directo * (
+        1 + _columna(eventuales) / 100 + _columna(garantia) / 100 + _columna(burden) / 100
+    )
+    markup = np.array([m == "markup" for m in metodo_precio], dtype=bool)
+
+    precios = {}
+    for destino, gp, mk in (
+        ("precio_cliente", gp_cliente, markup_cliente),
+        ("precio_integrador", gp_integrador, markup_integrador),
+    ):
+        gp = _columna(gp) / 100
+        con_gp = gp < 1
+        with np.errstate(divide="ignore", invalid="ignore"):
+            por_gp = np.where(con_gp, _redondear(costo_total / np.where(con_gp, 1 - gp, 1)), 0.0)
+        por_markup = _redondear(costo_total * (1 + _columna(mk) / 100))
+        precios[destino] = np.where(markup, por_markup, por_gp).tolist()
+
+    return {
+        "costo_directo": _redondear(costo_directo).tolist(),
+        "costo_total": _redondear(costo_total).tolist(),
+        **precios,
+    }
+
+
+def calcular_totales_filas(filas, costo_directo=None):
+    """Aplica `calcular_totales_lote` a filas con atributos de COLUMNAS_PRECIO.
+
+    `costo_directo` permite pasar la columna de costos por separado (p. ej. un agregado).
+    Devuelve una lista de dicts, uno por fila, en el mismo orden.
+    """
+    filas = list(filas)
+    columnas = {col: [getattr(f, col) for f in filas] for col in COLUMNAS_PRECIO if col != "costo_directo"}
+    columnas["costo_directo"] = (
+        list(costo_directo) if costo_directo is not None else [f.costo_directo for f in filas]
+    )
+    resultado = calcular_totales_lote(**columnas)
+    return [
+        {clave: valores[i] for clave, valores in resultado.items()}
+        for i in range(len(filas))
+    ]
@@ -0,0 +1,394 @@
+import time
+from datetime import datetime
+from sqlalchemy import select, insert, update, func, cast, case, and_, literal, Float, Numeric
+from sqlalchemy.orm import Session
+
+from backend_costeo.models import (
+    CostoItem,
+    CostoHistorial,
+    ListaPrecioConfig,
+    ListaPrecioItem,
+    CatalogoProducto,
+    CatalogoConjunto,
+    CatalogoItem,
+    Cotizacion,
+    CotizacionConjunto,
+    CotizacionItem,
+)
+from backend_costeo.precios import calcular_totales_filas
+from backend_costeo.cache_listas import invalidar_listas
+
+
+def _filtro_electronica():
+    # Mismo criterio que el cálculo original: ítems importados (coeficiente > 1) con costo FOB cargado
+    return (
+        CostoItem.tipo == "Electronica",
+        CostoItem.coeficiente > 1,
+        CostoItem.costo_fob.isnot(None),
+        CostoItem.costo_fob != 0,
+    )
+
+
+def _costo_con_blue(porcentaje_blue: float):
+    nuevo_costo = func.round(
+        cast(CostoItem.costo_fob * CostoItem.coeficiente * (1 + porcentaje_blue / 100), Numeric), 4
+    )
+    return cast(nuevo_costo, Float)
+
+
+def actualizar_costos_electronica(db: Session, porcentaje_blue: float) -> list[int]:
+    """Aplica el coeficiente blue a los ítems de Electrónica con dos sentencias set-based.
+
+    Devuelve los ids de los ítems modificados.
+    """
+    filtro = _filtro_electronica()
+
+    # Historial con los valores previos al cambio, en un único INSERT ... SELECT
+    db.execute(
+        insert(CostoHistorial).from_select(
+            ["costo_item_id", "costo_fabrica", "costo_fob", "coeficiente", "fecha"],
+            select(
+                CostoItem.id,
+                CostoItem.costo_fabrica,
+                CostoItem.costo_fob,
+                CostoItem.coeficiente,
+                literal(datetime.utcnow()),
+            ).where(*filtro)
+        )
+    )
+
+    return list(db.execute(
+        update(CostoItem)
+        .where(*filtro)
+        .values(costo_fabrica=_costo_con_blue(porcentaje_blue))
+        .returning(CostoItem.id)
+        .execution_options(synchronize_session=False)
+    ).scalars())
+
+
+def listas_con_items(db: Session, item_ids) -> set[str]:
+    """Índice inverso ítem → listas: códigos de las listas que contienen alguno de los ítems."""
+    if not item_ids:
+        return set()
+    return set(db.execute(
+        select(ListaPrecioItem.lista_codigo)
+        .where(ListaPrecioItem.item_id.in_(list(item_ids)))
+        .distinct()
+    ).scalars())
+
+
+TOTALES_LISTA = ("costo_directo", "costo_total", "precio_cliente", "precio_integrador")
+
+# Diferencia admitida entre lo guardado y lo recalculado (los totales se guardan con 4 decimales)
+TOLERANCIA_TOTALES = 1e-4
+
+
+def _consulta_totales_listas(codigos=None, *columnas):
+    """Parámetros de precio de cada lista con su costo directo agregado desde ListaPrecioItem × CostoItem."""
+    costos = (
+        select(
+            ListaPrecioItem.lista_codigo,
+            func.sum(
+                func.coalesce(CostoItem.costo_fabrica, 0) * func.coalesce(ListaPrecioItem.cantidad, 0)
+            ).label("costo_directo"),
+        )
+        .join(CostoItem, CostoItem.id == ListaPrecioItem.item_id)
+        .group_by(ListaPrecioItem.lista_codigo)
+    )
+    consulta = select(
+        ListaPrecioConfig.codigo,
+        ListaPrecioConfig.eventuales,
+        ListaPrecioConfig.garantia,
+        ListaPrecioConfig.burden,
+        ListaPrecioConfig.metodo_precio,
+        ListaPrecioConfig.gp_cliente,
+        ListaPrecioConfig.gp_integrador,
+        ListaPrecioConfig.markup_cliente,
+        ListaPrecioConfig.markup_integrador,
+        *columnas,
+    )
+    if codigos is not None:
+        costos = costos.where(ListaPrecioItem.lista_codigo.in_(codigos))
+        consulta = consulta.where(ListaPrecioConfig.codigo.in_(codigos))
+    costos = costos.subquery()
+    return (
+        consulta.add_columns(func.coalesce(costos.c.costo_directo, 0).label("costo_directo_calculado"))
+        .outerjoin(costos, costos.c.lista_codigo == ListaPrecioConfig.codigo)
+    )
+
+
+def recalcular_listas(db: Session, codigos) -> int:
+    """Recalcula costos y precios de las listas indicadas con un agregado SQL y un UPDATE por lotes."""
+    if not codigos:
+        return 0
+    codigos = list(codigos)
+    invalidar_listas(db, codigos)
+
+    filas = db.execute(_consulta_totales_listas(codigos)).all()
+    calculado_en = datetime.utcnow()
+    cambios = [
+        {"codigo": fila.codigo, **totales, "calculado_en": calculado_en}
+        for fila, totales in zip(
+            filas, calcular_totales_filas(filas, costo_directo=[f.costo_directo_calculado for f in filas])
+        )
+    ]
+
+    if cambios:
+        # UPDATE por clave primaria en un solo executemany
+        db.execute(update(ListaPrecioConfig), cambios)
+    return len(cambios)
+
+
+def listas_desfasadas(db: Session) -> list[dict]:
+    """Listas cuyos totales guardados no coinciden con los calculados, o que nunca calculó el servidor.
+
+    Una sola consulta agregada sobre todas las listas; los precios se calculan por columnas.
+    """
+    filas = db.execute(
+        _consulta_totales_listas(
+            None,
+            *(ListaPrecioConfig.__table__.c[campo].label(f"{campo}_guardado") for campo in TOTALES_LISTA),
+            ListaPrecioConfig.calculado_en,
+        ).order_by(ListaPrecioConfig.codigo)
+    ).all()
+    calculados = calcular_totales_filas(filas, costo_directo=[f.costo_directo_calculado for f in filas])
+
+    desfasadas = []
+    for fila, totales in zip(filas, calculados):
+        diferencias = {}
+        for campo in TOTALES_LISTA:
+            guardado = getattr(fila, f"{campo}_guardado")
+            if guardado is None or abs(guardado - totales[campo]) > TOLERANCIA_TOTALES:
+                diferencias[campo] = {"guardado": guardado, "calculado": totales[campo]}
+        if diferencias or fila.calculado_en is None:
+            desfasadas.append({
+                "codigo": fila.codigo,
+                "calculado_en": fila.calculado_en,
+                "diferencias": diferencias,
+            })
+    return desfasadas
+
+
+def reparar_listas(db: Session) -> dict:
+    """Recalcula las listas desfasadas y propaga a catálogos y cotizaciones. No hace commit."""
+    codigos = [lista["codigo"] for lista in listas_desfasadas(db)]
+    grafo = GrafoCostos().marcar("lista_precio", codigos)
+    reparadas = recalcular_listas(db, codigos)
+    recalculados = grafo.propagar(db)
+    return {
+        "reparadas": reparadas,
+        "catalogos_recalculados": recalculados.get("catalogo", 0),
+        "cotizaciones_recalculadas": recalculados.get("cotizacion", 0),
+    }
+
+
+def simular_coeficiente_blue(db: Session, porcentaje_blue: float) -> list[dict]:
+    """Precios que tendrían las listas afectadas con otro coeficiente blue, sin escribir nada."""
+    afectado = and_(*_filtro_electronica())
+    costos = (
+        select(
+            ListaPrecioItem.lista_codigo,
+            func.sum(
+                func.coalesce(
+                    case((afectado, _costo_con_blue(porcentaje_blue)), else_=CostoItem.costo_fabrica), 0
+                ) * func.coalesce(ListaPrecioItem.cantidad, 0)
+            ).label("costo_directo"),
+            func.max(case((afectado, 1), else_=0)).label("afectada"),
+        )
+        .join(CostoItem, CostoItem.id == ListaPrecioItem.item_id)
+        .group_by(ListaPrecioItem.lista_codigo)
+        .subquery()
+    )
+    filas = db.execute(
+        select(
+            ListaPrecioConfig.codigo,
+            ListaPrecioConfig.nombre,
+            ListaPrecioConfig.eventuales,
+            ListaPrecioConfig.garantia,
+            ListaPrecioConfig.burden,
+            ListaPrecioConfig.metodo_precio,
+            ListaPrecioConfig.gp_cliente,
+            ListaPrecioConfig.gp_integrador,
+            ListaPrecioConfig.markup_cliente,
+            ListaPrecioConfig.markup_integrador,
+            ListaPrecioConfig.precio_cliente.label("precio_cliente_actual"),
+            ListaPrecioConfig.precio_integrador.label("precio_integrador_actual"),
+            costos.c.costo_directo,
+        )
+        .join(costos, costos.c.lista_codigo == ListaPrecioConfig.codigo)
+        .where(costos.c.afectada == 1)
+        .order_by(ListaPrecioConfig.codigo)
+    ).all()
+
+    return [
+        {
+            "codigo": fila.codigo,
+            "nombre": fila.nombre,
+            "precio_cliente_actual": fila.precio_cliente_actual,
+            "precio_integrador_actual": fila.precio_integrador_actual,
+            **totales,
+        }
+        for fila, totales in zip(filas, calcular_totales_filas(filas))
+    ]
+
+
+def _recalcular_productos(db: Session, modelo, conjunto, item, fk, ids) -> int:
+    """Recalcula catálogos o cotizaciones: conjuntos (lista.costo_directo) + ítems sueltos (costo_fabrica)."""
+    if not ids:
+        return 0
+    ids = list(ids)
+
+    costo_conjuntos = (
+        select(
+            fk(conjunto).label("padre_id"),
+            func.sum(
+                func.coalesce(ListaPrecioConfig.costo_directo, 0) * func.coalesce(conjunto.cantidad, 0)
+            ).label("costo"),
+        )
+        .join(ListaPrecioConfig, ListaPrecioConfig.codigo == conjunto.lista_codigo)
+        .where(fk(conjunto).in_(ids))
+        .group_by(fk(conjunto))
+        .subquery()
+    )
+    costo_items = (
+        select(
+            fk(item).label("padre_id"),
+            func.sum(
+                func.coalesce(CostoItem.costo_fabrica, 0) * func.coalesce(item.cantidad, 0)
+            ).label("costo"),
+        )
+        .join(CostoItem, CostoItem.id == item.item_id)
+        .where(fk(item).in_(ids))
+        .group_by(fk(item))
+        .subquery()
+    )
+    filas = db.execute(
+        select(
+            modelo.id,
+            modelo.eventuales,
+            modelo.garantia,
+            modelo.burden,
+            modelo.metodo_precio,
+            modelo.gp_cliente,
+            modelo.gp_integrador,
+            modelo.markup_cliente,
+            modelo.markup_integrador,
+            func.coalesce(costo_conjuntos.c.costo, 0).label("costo_conjuntos"),
+            func.coalesce(costo_items.c.costo, 0).label("costo_items"),
+        )
+        .outerjoin(costo_conjuntos, costo_conjuntos.c.padre_id == modelo.id)
+        .outerjoin(costo_items, costo_items.c.padre_id == modelo.id)
+        .where(modelo.id.in_(ids))
+    ).all()
+
+    totales = calcular_totales_filas(
+        filas, costo_directo=[fila.costo_conjuntos + fila.costo_items for fila in filas]
+    )
+    cambios = [{"id": fila.id, **t} for fila, t in zip(filas, totales)]
+    if cambios:
+        db.execute(update(modelo), cambios)
+    return len(cambios)
+
+
+def recalcular_catalogos(db: Session, ids) -> int:
+    return _recalcular_productos(
+        db, CatalogoProducto, CatalogoConjunto, CatalogoItem, lambda m: m.catalogo_id, ids
+    )
+
+
+def recalcular_cotizaciones(db: Session, ids) -> int:
+    return _recalcular_productos(
+        db, Cotizacion, CotizacionConjunto, CotizacionItem, lambda m: m.cotizacion_id, ids
+    )
+
+
+# =========================
+# GRAFO DE DEPENDENCIAS
+# =========================
+#
+#   costo_item ──▶ lista_precio ──▶ catalogo
+#        │                     └──▶ cotizacion
+#        └──────────────────────▶ catalogo / cotizacion (ítems sueltos)
+#
+# Cada arista es una tabla de enlace: (origen, destino, columna origen, columna destino).
+
+ARISTAS = [
+    ("costo_item", "lista_precio", ListaPrecioItem.item_id, ListaPrecioItem.lista_codigo),
+    ("costo_item", "catalogo", CatalogoItem.item_id, CatalogoItem.catalogo_id),
+    ("costo_item", "cotizacion", CotizacionItem.item_id, CotizacionItem.cotizacion_id),
+    ("lista_precio", "catalogo", CatalogoConjunto.lista_codigo, CatalogoConjunto.catalogo_id),
+    ("lista_precio", "cotizacion", CotizacionConjunto.lista_codigo, CotizacionConjunto.cotizacion_id),
+]
+
+# Orden topológico: cada nodo se recalcula después de todo lo que depende de él
+ORDEN = ["costo_item", "lista_precio", "catalogo", "cotizacion"]
+
+RECALCULO = {
+    "lista_precio": recalcular_listas,
+    "catalogo": recalcular_catalogos,
+    "cotizacion": recalcular_cotizaciones,
+}
+
+
+class GrafoCostos:
+    """Propaga cambios de costo hacia listas, catálogo y cotizaciones.
+
+    `marcar` registra nodos cuyo valor ya cambió; `propagar` recalcula, nivel
+    por nivel, solo los nodos que dependen de ellos (un UPDATE por lotes por nivel).
+    """
+
+    def __init__(self):
+        self.cambiados = {entidad: set() for entidad in ORDEN}
+        self.tiempos_ms = {}
+
+    def marcar(self, entidad: str, ids):
+        self.cambiados[entidad].update(i for i in ids if i is not None)
+        return self
+
+    def propagar(self, db: Session) -> dict:
+        db.flush()
+        sucios = {entidad: set() for entidad in ORDEN}
+        recalculados = {}
+
+        for entidad in ORDEN:
+            if sucios[entidad]:
+                inicio = time.perf_counter()
+                recalculados[entidad] = RECALCULO[entidad](db, sucios[entidad])
+                self.tiempos_ms[entidad] = round((time.perf_counter() - inicio) * 1000, 2)
+                self.cambiados[entidad] |= sucios[entidad]
+
+            ids = self.cambiados[entidad]
+            if not ids:
+                continue
+            for origen, destino, col_origen, col_destino in ARISTAS:
+                if origen == entidad:
+                    sucios[destino] |= set(db.execute(
+                        select(col_destino).where(col_origen.in_(list(ids))).distinct()
+                    ).scalars())
+
+        return recalculados
+
+
+def propagar_cambios(db: Session, entidad: str, ids) -> dict:
+    return GrafoCostos().marcar(entidad, ids).propagar(db)
+
+
+def recalcular_coeficiente_blue(db: Session, porcentaje_blue: float) -> dict:
+    """Actualiza los costos de Electrónica y propaga el cambio solo a lo que los contiene."""
+    tiempos = {}
+
+    inicio = time.perf_counter()
+    item_ids = actualizar_costos_electronica(db, porcentaje_blue)
+    tiempos["items"] = round((time.perf_counter() - inicio) * 1000, 2)
+
+    grafo = GrafoCostos().marcar("costo_item", item_ids)
+    recalculados = grafo.propagar(db)
+    tiempos.update(grafo.tiempos_ms)
+
+    return {
+        "items_actualizados": len(item_ids),
+        "listas_recalculadas": recalculados.get("lista_precio", 0),
+        "catalogos_recalculados": recalculados.get("catalogo", 0),
+        "cotizaciones_recalculadas": recalculados.get("cotizacion", 0),
+        "tiempos_ms": tiempos,
+    }
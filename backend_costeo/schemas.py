@@ -29,10 +29,11 @@ class ListaPrecioCreate(BaseModel):
     burden: float
     gp_cliente: float
     gp_integrador: float
-    costo_directo: float
-    costo_total: float
-    precio_cliente: float
-    precio_integrador: float
+    # Los totales los calcula el servidor; se aceptan por compatibilidad y se ignoran
+    costo_directo: Optional[float] = None
+    costo_total: Optional[float] = None
+    precio_cliente: Optional[float] = None
+    precio_integrador: Optional[float] = None
     metodo_precio: Optional[str] = "gp"
     markup_cliente: Optional[float] = None
     markup_integrador: Optional[float] = None
@@ -58,6 +59,7 @@ class ListaPrecioResponse(BaseModel):
     markup_cliente: Optional[float] = None
     markup_integrador: Optional[float] = None
     creada_en: datetime
+    calculado_en: Optional[datetime] = None
     observaciones: Optional[str] = None
     items: list[ListaPrecioItemResponse] = []
     model_config = ConfigDict(from_attributes=True)
@@ -136,6 +138,7 @@ class CatalogoProductoResponse(BaseModel):
     items_costo: List[CatalogoItemResponse] = []
     conjuntos: List[CatalogoConjuntoResponse] = []
     precio_final: Optional[float] = None
+    referencias_faltantes: Optional[dict] = None
     model_config = ConfigDict(from_attributes=True)
 
 # =========================
@@ -216,4 +219,5 @@ class CotizacionResponse(BaseModel):
     creada_en: datetime
     conjuntos: List[CotizacionConjuntoResponse] = []
     precio_final: Optional[float] = None
+    referencias_faltantes: Optional[dict] = None
     model_config = ConfigDict(from_attributes=True)
@@ -0,0 +1,98 @@
+import os
+import re
+import threading
+
+from sqlalchemy import Column, Integer, String, select, update
+
+from backend_costeo.database import Base, engine as engine_default
+from backend_costeo.models import ListaPrecioConfig, CatalogoProducto, Cotizacion
+
+# =========================
+# Códigos DCM/CAT/COT desde una tabla de contadores. Cada worker reserva un bloque
+# de números con un UPDATE ... RETURNING atómico y lo reparte en memoria: dos
+# creaciones concurrentes nunca reciben el mismo código y solo una de cada
+# SECUENCIA_BLOQUE va a la base. Un bloque sin usar al apagar el worker deja huecos.
+# =========================
+
+SECUENCIA_BLOQUE = int(os.getenv("SECUENCIA_BLOQUE", "10"))
+
+# Prefijo → columna con los códigos ya emitidos (para inicializar el contador)
+SECUENCIAS = {
+    "DCM": ListaPrecioConfig.codigo,
+    "CAT": CatalogoProducto.codigo,
+    "COT": Cotizacion.codigo,
+}
+
+
+class Secuencia(Base):
+    __tablename__ = "secuencias"
+
+    prefijo = Column(String, primary_key=True)
+    ultimo = Column(Integer, nullable=False, default=0)
+
+
+def _maximo_emitido(conn, prefijo: str) -> int:
+    # Máximo numérico, no de texto: "DCM1000" > "DCM999"
+    patron = re.compile(rf"^{prefijo}(\d+)$")
+    maximo = 0
+    for codigo in conn.execute(select(SECUENCIAS[prefijo]).where(SECUENCIAS[prefijo].like(f"{prefijo}%"))).scalars():
+        coincidencia = patron.match(codigo)
+        if coincidencia:
+            maximo = max(maximo, int(coincidencia.group(1)))
+    return maximo
+
+
+def asegurar_secuencias(conn):
+    """Paso de `migrate`: crea los contadores y los adelanta hasta el mayor código existente."""
+    actuales = dict(conn.execute(select(Secuencia.prefijo, Secuencia.ultimo)).all())
+    for prefijo in SECUENCIAS:
+        maximo = _maximo_emitido(conn, prefijo)
+        if prefijo not in actuales:
+            conn.execute(Secuencia.__table__.insert().values(prefijo=prefijo, ultimo=maximo))
+        elif actuales[prefijo] < maximo:
+            conn.execute(update(Secuencia.__table__).where(Secuencia.prefijo == prefijo).values(ultimo=maximo))
+
+
+class AsignadorCodigos:
+    def __init__(self, engine=engine_default, bloque: int = SECUENCIA_BLOQUE):
+        self.engine = engine
+        self.bloque = bloque
+        self._lock = threading.Lock()
+        # prefijo → [siguiente, último reservado]
+        self._bloques = {}
+        self.reservas = 0
+
+    def _reservar(self, prefijo: str):
+        # Transacción propia: el bloque queda tomado aunque la creación haga rollback
+        with self.engine.begin() as conn:
+            ultimo = conn.execute(
+                update(Secuencia.__table__)
+                .where(Secuencia.prefijo == prefijo)
+                .values(ultimo=Secuencia.ultimo + self.bloque)
+                .returning(Secuencia.ultimo)
+            ).scalar()
+        if ultimo is None:
+            raise RuntimeError(f"❌ Secuencia {prefijo} inexistente: ejecutar `python -m backend_costeo migrate`")
+        self.reservas += 1
+        self._bloques[prefijo] = [ultimo - self.bloque + 1, ultimo]
+
+    def siguiente(self, prefijo: str) -> str:
+        with self._lock:
+            bloque = self._bloques.get(prefijo)
+            if bloque is None or bloque[0] > bloque[1]:
+                self._reservar(prefijo)
+                bloque = self._bloques[prefijo]
+            numero = bloque[0]
+            bloque[0] += 1
+        return f"{prefijo}{numero:03d}"
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "bloque": self.bloque,
+                "reservas": self.reservas,
+                "disponibles": {p: b[1] - b[0] + 1 for p, b in self._bloques.items()},
+            }
+
+
+asignador = AsignadorCodigos()
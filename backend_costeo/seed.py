@@ -1,63 +1,65 @@
-import json
 from pathlib import Path
 from sqlalchemy.orm import Session
 
 from backend_costeo.database import SessionLocal
-from backend_costeo.models import Producto, CostoItem, ListaPrecioConfig
+from backend_costeo.models import Producto
+from backend_costeo.carga_masiva import fila_costo, cargar_costos, cargar_productos
+from backend_costeo.lector_json import recorrer_costos, recorrer_productos
 
 BASE_DIR = Path(__file__).resolve().parent
 SEED_DIR = BASE_DIR / "data_seed"
 
-def load_json(filename):
+def ruta_seed(filename):
     path = SEED_DIR / filename
     if not path.exists():
         print(f"⚠️ Archivo {filename} no encontrado")
         return None
+    return path
+
+def filas_costos(path):
+    """Filas de costos_items leídas en streaming del árbol tipo → subtipo → (variante) → ítems."""
+    for tipo, subtipo, variante, item in recorrer_costos(path):
+        # Caso con tercer nivel (variante): se guarda dentro del subtipo
+        if variante is not None:
+            subtipo = f"{subtipo} - {variante}"
+        yield fila_costo(tipo, subtipo, item)
+
+
+def filas_productos(path):
+    for linea, serie, producto in recorrer_productos(path):
+        yield {
+            "codigo": producto["codigo"],
+            "nombre": producto["nombre"],
+            "linea": linea,
+            "serie": serie,
+        }
 
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
 
 def seed_costos_only(db: Session):
+    """Recarga idempotente: aplica solo las diferencias entre el JSON y costos_items."""
+    from backend_costeo.recalculo import GrafoCostos
+
     try:
-        costos_json = load_json("costos_generales_full.json")
-        count = 0
-
-        for tipo, subtipos in costos_json.items():
-            for subtipo, contenido in subtipos.items():
-
-                if isinstance(contenido, list):
-                    for item in contenido:
-                        nuevo = CostoItem(
-                            codigo=item.get("codigo") or None,
-                            nombre=item.get("denominacion"),
-                            tipo=tipo,
-                            subtipo=subtipo,
-                            unidad=item.get("unidad"),
-                            coeficiente=item.get("coeficiente"),
-                            costo_fob=item.get("costo_fob"),
-                            costo_fabrica=item.get("costo_fabrica"),
-                        )
-                        db.add(nuevo)
-                        count += 1
-
-                elif isinstance(contenido, dict):
-                    for variante, items in contenido.items():
-                        for item in items:
-                            nuevo = CostoItem(
-                                codigo=item.get("codigo") or None,
-                                nombre=item.get("denominacion"),
-                                tipo=tipo,
-                                subtipo=f"{subtipo} - {variante}",
-                                unidad=item.get("unidad"),
-                                coeficiente=item.get("coeficiente"),
-                                costo_fob=item.get("costo_fob"),
-                                costo_fabrica=item.get("costo_fabrica"),
-                            )
-                            db.add(nuevo)
-                            count += 1
+        costos_path = ruta_seed("costos_generales_full.json")
+        if costos_path is None:
+            # Sin archivo no se sincroniza: borraría todos los ítems
+            raise FileNotFoundError("costos_generales_full.json")
+        resultado = cargar_costos(db, filas_costos(costos_path), sincronizar=True)
+
+        # Las listas (y lo que las contiene) que usan ítems con costo nuevo se recalculan
+        grafo = GrafoCostos().marcar("costo_item", resultado.pop("ids_costo_modificado"))
+        recalculados = grafo.propagar(db)
+        resultado["listas_recalculadas"] = recalculados.get("lista_precio", 0)
+        resultado["catalogos_recalculados"] = recalculados.get("catalogo", 0)
+        resultado["cotizaciones_recalculadas"] = recalculados.get("cotizacion", 0)
 
         db.commit()
-        print(f"✅ {count} ítems de costo recargados correctamente")
+        print(
+            f"✅ Costos recargados: {resultado['insertados']} insertados, "
+            f"{resultado['actualizados']} actualizados, {resultado['eliminados']} eliminados, "
+            f"{resultado['sin_cambios']} sin cambios"
+        )
+        return resultado
 
     except Exception as e:
         db.rollback()
@@ -77,106 +79,20 @@ def seed_if_empty():
         # =========================
         # PRODUCTOS (JSON ANIDADO)
         # =========================
-        productos_json = load_json("productos_catalogo.json")
-
-        for linea, series in productos_json.items():
-            for serie, productos in series.items():
-                for producto in productos:
-                    db.add(Producto(
-                        codigo=producto["codigo"],
-                        nombre=producto["nombre"],
-                        linea=linea,
-                        serie=serie
-                    ))
+        productos_path = ruta_seed("productos_catalogo.json")
+        productos = cargar_productos(db, filas_productos(productos_path)) if productos_path else 0
 
         # =========================
-        # COSTOS (JSON ANIDADO)
+        # COSTOS (JSON ANIDADO) — upsert por código, o por (tipo, subtipo, nombre) si no tiene
         # =========================
-        costos_json = load_json("costos_generales_full.json")
-
-        for tipo, subtipos in costos_json.items():
-
-            for subtipo, contenido in subtipos.items():
-
-                # Caso normal: lista directa de items
-                if isinstance(contenido, list):
-
-                    for item in contenido:
-
-                        codigo_item = item.get("codigo") or None
-
-                        # ✅ Si tiene código, verificar duplicado antes de insertar
-                        if codigo_item:
-                            existente = db.query(CostoItem).filter_by(codigo=codigo_item).first()
-                        else:
-                            existente = None  # Sin código → siempre insertar
-
-                        if existente:
-                            # 🔄 ACTUALIZAR
-                            existente.nombre = item.get("denominacion")
-                            existente.tipo = tipo
-                            existente.subtipo = subtipo
-                            existente.unidad = item.get("unidad")
-                            existente.coeficiente = item.get("coeficiente")
-                            existente.costo_fob = item.get("costo_fob")
-                            existente.costo_fabrica = item.get("costo_fabrica")
-                        else:
-                            # ➕ CREAR (con o sin código)
-                            nuevo = CostoItem(
-                                codigo=codigo_item,
-                                nombre=item.get("denominacion"),
-                                tipo=tipo,
-                                subtipo=subtipo,
-                                unidad=item.get("unidad"),
-                                coeficiente=item.get("coeficiente"),
-                                costo_fob=item.get("costo_fob"),
-                                costo_fabrica=item.get("costo_fabrica"),
-                            )
-                            db.add(nuevo)
-                            db.flush()
-
-                # Caso con tercer nivel (variante)
-                elif isinstance(contenido, dict):
-
-                    for variante, items in contenido.items():
-
-                        for item in items:
-
-                            codigo_item = item.get("codigo") or None
-                            subtipo_completo = f"{subtipo} - {variante}"
-
-                            # ✅ Si tiene código, verificar duplicado antes de insertar
-                            if codigo_item:
-                                existente = db.query(CostoItem).filter_by(codigo=codigo_item).first()
-                            else:
-                                existente = None  # Sin código → siempre insertar
-
-                            if existente:
-                                # 🔄 ACTUALIZAR
-                                existente.nombre = item.get("denominacion")
-                                existente.tipo = tipo
-                                existente.subtipo = subtipo_completo
-                                existente.unidad = item.get("unidad")
-                                existente.coeficiente = item.get("coeficiente")
-                                existente.costo_fob = item.get("costo_fob")
-                                existente.costo_fabrica = item.get("costo_fabrica")
-                            else:
-                                # ➕ CREAR (con o sin código)
-                                nuevo = CostoItem(
-                                    codigo=codigo_item,
-                                    nombre=item.get("denominacion"),
-                                    tipo=tipo,
-                                    subtipo=subtipo_completo,
-                                    unidad=item.get("unidad"),
-                                    coeficiente=item.get("coeficiente"),
-                                    costo_fob=item.get("costo_fob"),
-                                    costo_fabrica=item.get("costo_fabrica"),
-                                )
-                                db.add(nuevo)
-                                db.flush()
+        costos_path = ruta_seed("costos_generales_full.json")
+        resultado = cargar_costos(db, filas_costos(costos_path) if costos_path else [])
 
         db.commit()
-        print("✅ Seed completado correctamente")
+        print(
+            f"✅ Seed completado correctamente ({productos} productos, "
+            f"{resultado['insertados']} costos insertados, {resultado['actualizados']} actualizados)"
+        )
 
     except Exception as e:
         db.rollback()
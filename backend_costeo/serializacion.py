@@ -0,0 +1,202 @@
+import base64
+from datetime import datetime
+from typing import Optional
+
+import orjson
+from fastapi import Response
+from sqlalchemy import select
+
+from backend_costeo.models import (
+    CostoItem,
+    ListaPrecioConfig,
+    ListaPrecioItem,
+    CatalogoProducto,
+    CatalogoConjunto,
+    CatalogoItem,
+    Cotizacion,
+    CotizacionConjunto,
+    CotizacionItem,
+)
+from backend_costeo.schemas import ListaPrecioResponse, CatalogoProductoResponse, CotizacionResponse
+
+# =========================
+# Camino rápido de lectura: filas Core → dicts → orjson, sin ORM ni revalidación Pydantic.
+# Las columnas salen de los modelos de respuesta, así la salida coincide con response_model.
+# =========================
+
+
+def _columnas(modelo, respuesta):
+    return [modelo.__table__.c[campo] for campo in respuesta.model_fields if campo in modelo.__table__.c]
+
+
+def respuesta_json(datos, status_code: int = 200, headers: dict = None) -> Response:
+    return Response(
+        content=orjson.dumps(datos),
+        status_code=status_code,
+        media_type="application/json",
+        headers=headers,
+    )
+
+
+def codificar_cursor(fecha: Optional[datetime], id_: int) -> str:
+    """Cursor opaco para paginar por (fecha, id); `fecha` es None en las filas sin fecha."""
+    return base64.urlsafe_b64encode(orjson.dumps([fecha and fecha.isoformat(), id_])).decode()
+
+
+def decodificar_cursor(cursor: str) -> tuple[Optional[datetime], int]:
+    """Lanza ValueError si el cursor no es válido."""
+    try:
+        fecha, id_ = orjson.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return (None if fecha is None else datetime.fromisoformat(fecha)), int(id_)
+    except (orjson.JSONDecodeError, TypeError, ValueError, base64.binascii.Error) as e:
+        raise ValueError("Cursor inválido") from e
+
+
+# =========================
+# LISTAS DE PRECIOS
+# =========================
+
+def consulta_listas(codigos=None):
+    consulta = select(*_columnas(ListaPrecioConfig, ListaPrecioResponse)).order_by(ListaPrecioConfig.codigo)
+    if codigos is not None:
+        consulta = consulta.where(ListaPrecioConfig.codigo.in_(list(codigos)))
+    return consulta
+
+
+def consulta_items_listas(codigos=None):
+    consulta = (
+        select(
+            ListaPrecioItem.lista_codigo,
+            ListaPrecioItem.item_id,
+            ListaPrecioItem.cantidad,
+            CostoItem.codigo,
+            CostoItem.nombre,
+            CostoItem.tipo,
+            CostoItem.subtipo,
+            CostoItem.unidad,
+            CostoItem.costo_fabrica,
+        )
+        .join(CostoItem, CostoItem.id == ListaPrecioItem.item_id)
+        .order_by(ListaPrecioItem.id)
+    )
+    if codigos is not None:
+        consulta = consulta.where(ListaPrecioItem.lista_codigo.in_(list(codigos)))
+    return consulta
+
+
+def armar_listas(filas_listas, filas_items) -> list[dict]:
+    items_por_lista = {}
+    for fila in filas_items:
+        costo_unit = fila.costo_fabrica or 0
+        total = costo_unit * (fila.cantidad or 0)
+        items_por_lista.setdefault(fila.lista_codigo, []).append({
+            "item_id": fila.item_id,
+            "codigo": fila.codigo,
+            "nombre": fila.nombre,
+            "tipo": fila.tipo,
+            "subtipo": fila.subtipo,
+            "unidad": fila.unidad,
+            "costo_unit": costo_unit,
+            "cantidad": fila.cantidad,
+            "total": total,
+        })
+
+    resultado = []
+    for fila in filas_listas:
+        lista = dict(fila._mapping)
+        lista["items"] = items_por_lista.get(lista["codigo"], [])
+        resultado.append(lista)
+    return resultado
+
+
+# =========================
+# CATÁLOGO Y COTIZACIONES
+# =========================
+
+def consulta_productos(modelo, respuesta):
+    return select(*_columnas(modelo, respuesta)).order_by(modelo.id)
+
+
+def consulta_conjuntos(conjunto, fk):
+    return (
+        select(
+            fk.label("padre_id"),
+            conjunto.id,
+            conjunto.lista_codigo,
+            conjunto.cantidad,
+            ListaPrecioConfig.nombre.label("nombre_conjunto"),
+            ListaPrecioConfig.precio_cliente.label("precio_cliente_conjunto"),
+            ListaPrecioConfig.precio_integrador.label("precio_integrador_conjunto"),
+            ListaPrecioConfig.costo_directo.label("costo_directo_conjunto"),
+        )
+        .outerjoin(ListaPrecioConfig, ListaPrecioConfig.codigo == conjunto.lista_codigo)
+        .order_by(conjunto.id)
+    )
+
+
+def consulta_items_productos(item, fk):
+    return (
+        select(
+            fk.label("padre_id"),
+            item.id,
+            item.item_id,
+            item.cantidad,
+            CostoItem.nombre,
+            CostoItem.codigo,
+            CostoItem.tipo,
+            CostoItem.subtipo,
+            CostoItem.unidad,
+            CostoItem.costo_fabrica,
+        )
+        .join(CostoItem, CostoItem.id == item.item_id)
+        .order_by(item.id)
+    )
+
+
+def armar_productos(filas, filas_conjuntos, filas_items) -> list[dict]:
+    conjuntos_por_padre = {}
+    for fila in filas_conjuntos:
+        conjunto = dict(fila._mapping)
+        padre_id = conjunto.pop("padre_id")
+        conjuntos_por_padre.setdefault(padre_id, []).append(conjunto)
+
+    items_por_padre = {}
+    for fila in filas_items:
+        costo_unit = fila.costo_fabrica or 0
+        items_por_padre.setdefault(fila.padre_id, []).append({
+            "id": fila.id,
+            "item_id": fila.item_id,
+            "cantidad": fila.cantidad,
+            "nombre": fila.nombre,
+            "codigo": fila.codigo,
+            "tipo": fila.tipo,
+            "subtipo": fila.subtipo,
+            "unidad": fila.unidad,
+            "costo_unit": costo_unit,
+            "total": round(costo_unit * (fila.cantidad or 0), 4),
+        })
+
+    resultado = []
+    for fila in filas:
+        producto = dict(fila._mapping)
+        producto["conjuntos"] = conjuntos_por_padre.get(producto["id"], [])
+        producto["items_costo"] = items_por_padre.get(producto["id"], [])
+        resultado.append(producto)
+    return resultado
+
+
+def consultas_catalogo():
+    return (
+        consulta_productos(CatalogoProducto, CatalogoProductoResponse),
+        consulta_conjuntos(CatalogoConjunto, CatalogoConjunto.catalogo_id),
+        consulta_items_productos(CatalogoItem, CatalogoItem.catalogo_id),
+    )
+
+
+def consultas_cotizaciones():
+    return (
+        consulta_productos(Cotizacion, CotizacionResponse),
+        consulta_conjuntos(CotizacionConjunto, CotizacionConjunto.cotizacion_id),
+        consulta_items_productos(CotizacionItem, CotizacionItem.cotizacion_id),
+    )
+
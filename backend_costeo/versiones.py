@@ -0,0 +1,116 @@
+import hashlib
+import os
+
+from fastapi import Request, Response
+from sqlalchemy import Column, Integer, String, event, select, update
+from sqlalchemy.orm import Session
+
+from backend_costeo.database import Base, SessionLocal
+
+# =========================
+# Versión por tabla para GET condicionales: cada commit que escribe una tabla
+# versionada incrementa su contador; las lecturas arman el ETag con esos contadores
+# y responden 304 sin tocar las filas.
+# =========================
+
+TABLAS_VERSIONADAS = (
+    "productos",
+    "costos_items",
+    "listas_precios",
+    "listas_precios_items",
+    "catalogo_productos",
+    "catalogo_conjuntos",
+    "catalogo_items",
+    "cotizaciones",
+    "cotizacion_conjuntos",
+    "cotizacion_items",
+)
+
+CACHE_MAX_AGE = int(os.getenv("CACHE_MAX_AGE", "0"))
+
+_TOCADAS = "tablas_tocadas"
+
+
+class VersionTabla(Base):
+    __tablename__ = "versiones_tablas"
+
+    tabla = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+def asegurar_versiones(conn):
+    """Crea las filas de contador que falten (paso de `migrate`)."""
+    existentes = set(conn.execute(select(VersionTabla.tabla)).scalars())
+    faltantes = [{"tabla": t, "version": 0} for t in TABLAS_VERSIONADAS if t not in existentes]
+    if faltantes:
+        conn.execute(VersionTabla.__table__.insert(), faltantes)
+
+
+def tocar(db: Session, *tablas: str):
+    """Marca tablas escritas por fuera del ORM (p. ej. con db.connection())."""
+    db.info.setdefault(_TOCADAS, set()).update(t for t in tablas if t in TABLAS_VERSIONADAS)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _tablas_del_flush(session, contexto):
+    # En after_flush las colecciones todavía incluyen los objetos recién escritos (y los cascades)
+    tocar(session, *{obj.__table__.name for obj in (*session.new, *session.dirty, *session.deleted)})
+
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _tablas_del_execute(estado):
+    if estado.is_insert or estado.is_update or estado.is_delete:
+        tabla = getattr(estado.statement, "table", None)
+        if tabla is not None:
+            tocar(estado.session, tabla.name)
+
+
+@event.listens_for(SessionLocal, "before_commit")
+def _incrementar_versiones(session):
+    session.flush()
+    tablas = session.info.pop(_TOCADAS, None)
+    if tablas:
+        session.execute(
+            update(VersionTabla.__table__)
+            .where(VersionTabla.tabla.in_(sorted(tablas)))
+            .values(version=VersionTabla.version + 1)
+        )
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _descartar_tablas(session):
+    session.info.pop(_TOCADAS, None)
+
+
+# =========================
+# ETag / 304
+# =========================
+
+async def etag_tablas(lector, request: Request, tablas) -> str:
+    """ETag fuerte a partir de la ruta, los parámetros y la versión de cada tabla leída."""
+    versiones = await lector.todas(
+        select(VersionTabla.tabla, VersionTabla.version)
+        .where(VersionTabla.tabla.in_(list(tablas)))
+        .order_by(VersionTabla.tabla)
+    )
+    base = "|".join([
+        request.url.path,
+        str(sorted(request.query_params.multi_items())),
+        *(f"{fila.tabla}={fila.version}" for fila in versiones),
+    ])
+    return '"' + hashlib.sha1(base.encode()).hexdigest() + '"'
+
+
+def cabeceras_cache(etag: str) -> dict:
+    return {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={CACHE_MAX_AGE}, must-revalidate",
+    }
+
+
+def no_modificado(request: Request, etag: str):
+    """Respuesta 304 si el cliente ya tiene esta versión, si no None."""
+    enviado = request.headers.get("if-none-match")
+    if enviado and (enviado.strip() == "*" or etag in [e.strip() for e in enviado.split(",")]):
+        return Response(status_code=304, headers=cabeceras_cache(etag))
+    return None
@@ -0,0 +1,249 @@
+"""Benchmark de GET /api/lista-precios, /api/catalogo y /api/cotizaciones.
+
+Compara el camino anterior (grafo ORM con joinedload → dicts → validación con el
+response_model) contra el actual (filas Core → orjson), los dos por TestClient.
+Además de los tiempos verifica que las dos respuestas tengan el mismo contenido.
+
+    python benchmarks/bench_listados.py                  # 1000 y 10000 de cada uno
+    python benchmarks/bench_listados.py --n 500 --repeticiones 1
+
+Usa una base SQLite temporal salvo que se pase --database-url.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+ITEMS_POR_LISTA = 8
+CONJUNTOS_POR_PRODUCTO = 2
+ITEMS_POR_PRODUCTO = 3
+
+
+def _argumentos():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, nargs="+", default=[1000, 10000], help="Cantidades a medir (crecientes)")
+    parser.add_argument("--repeticiones", type=int, default=3, help="Se informa el mejor tiempo")
+    parser.add_argument("--database-url", help="Base a usar (por defecto SQLite temporal)")
+    return parser.parse_args()
+
+
+args = _argumentos()
+os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{Path(tempfile.mkdtemp()) / 'bench.db'}"
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+
+import orjson  # noqa: E402
+from fastapi import Depends, FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import func, insert, select  # noqa: E402
+from sqlalchemy.orm import Session, joinedload  # noqa: E402
+
+from backend_costeo import auth, main  # noqa: E402
+from backend_costeo.cache_listas import cache_listas  # noqa: E402
+from backend_costeo.database import engine  # noqa: E402
+from backend_costeo.migraciones import migrar  # noqa: E402
+from backend_costeo.seed import seed_if_empty  # noqa: E402
+from backend_costeo.models import (  # noqa: E402
+    CostoItem,
+    ListaPrecioConfig,
+    ListaPrecioItem,
+    CatalogoProducto,
+    CatalogoConjunto,
+    CatalogoItem,
+    Cotizacion,
+    CotizacionConjunto,
+    CotizacionItem,
+)
+from backend_costeo.schemas import ListaPrecioResponse, CatalogoProductoResponse, CotizacionResponse  # noqa: E402
+
+
+# =========================
+# CAMINO ANTERIOR (copia de los endpoints previos al cambio)
+# =========================
+
+anterior = FastAPI()
+
+
+@anterior.get("/api/lista-precios", response_model=list[ListaPrecioResponse])
+def listar_listas_anterior(db: Session = Depends(main.get_db)):
+    listas = db.query(ListaPrecioConfig).options(
+        joinedload(ListaPrecioConfig.items).joinedload(ListaPrecioItem.item)
+    ).all()
+
+    resultado = []
+    for lista in listas:
+        items_response = []
+        for lp_item in lista.items:
+            costo_item = lp_item.item
+            if costo_item:
+                costo_unit = costo_item.costo_fabrica or 0
+                items_response.append({
+                    "item_id": lp_item.item_id,
+                    "codigo": costo_item.codigo,
+                    "nombre": costo_item.nombre,
+                    "tipo": costo_item.tipo,
+                    "subtipo": costo_item.subtipo,
+                    "unidad": costo_item.unidad,
+                    "costo_unit": costo_unit,
+                    "cantidad": lp_item.cantidad,
+                    "total": costo_unit * (lp_item.cantidad or 0),
+                })
+        lista_dict = {col.name: getattr(lista, col.name) for col in lista.__table__.columns}
+        lista_dict["items"] = items_response
+        resultado.append(lista_dict)
+    return resultado
+
+
+@anterior.get("/api/catalogo", response_model=list[CatalogoProductoResponse])
+def listar_catalogo_anterior(db: Session = Depends(main.get_db)):
+    productos = db.query(CatalogoProducto).options(
+        joinedload(CatalogoProducto.conjuntos).joinedload(CatalogoConjunto.lista),
+        joinedload(CatalogoProducto.items_costo).joinedload(CatalogoItem.item),
+    ).all()
+
+    resultado = []
+    for prod in productos:
+        prod_dict = {col.name: getattr(prod, col.name) for col in prod.__table__.columns}
+        prod_dict["conjuntos"] = main.construir_conjuntos_response(prod.conjuntos)
+        prod_dict["items_costo"] = main.construir_items_catalogo_response(prod.items_costo)
+        resultado.append(prod_dict)
+    return resultado
+
+
+@anterior.get("/api/cotizaciones", response_model=list[CotizacionResponse])
+def listar_cotizaciones_anterior(db: Session = Depends(main.get_db)):
+    cotizaciones = db.query(Cotizacion).options(
+        joinedload(Cotizacion.conjuntos).joinedload(CotizacionConjunto.lista),
+        joinedload(Cotizacion.items_costo).joinedload(CotizacionItem.item),
+    ).all()
+
+    resultado = []
+    for cot in cotizaciones:
+        cot_dict = {col.name: getattr(cot, col.name) for col in cot.__table__.columns}
+        cot_dict["conjuntos"] = main.construir_conjuntos_response(cot.conjuntos)
+        cot_dict["items_costo"] = main.construir_items_costo_response(cot.items_costo)
+        resultado.append(cot_dict)
+    return resultado
+
+
+# =========================
+# DATOS
+# =========================
+
+def _completar(n: int):
+    """Lleva listas, catálogos y cotizaciones hasta `n` de cada uno con inserts masivos."""
+    with engine.begin() as conn:
+        item_ids = conn.execute(select(CostoItem.id).order_by(CostoItem.id)).scalars().all()
+        hay = conn.execute(select(func.count()).select_from(ListaPrecioConfig)).scalar()
+        nuevos = range(hay, n)
+        if not nuevos:
+            return
+        precios = {
+            "eventuales": 5, "garantia": 2, "burden": 3, "gp_cliente": 30, "gp_integrador": 20,
+            "costo_directo": 1000.0, "costo_total": 1100.0, "precio_cliente": 1571.4286, "precio_integrador": 1375.0,
+        }
+
+        conn.execute(insert(ListaPrecioConfig), [
+            {"codigo": f"BENCH{i:06d}", "nombre": f"Lista {i}", "producto_codigo": f"P{i}",
+             "producto_nombre": f"Producto {i}", **precios}
+            for i in nuevos
+        ])
+        conn.execute(insert(ListaPrecioItem), [
+            {"lista_codigo": f"BENCH{i:06d}", "item_id": item_ids[(i * ITEMS_POR_LISTA + j) % len(item_ids)],
+             "cantidad": j + 1}
+            for i in nuevos for j in range(ITEMS_POR_LISTA)
+        ])
+
+        for modelo, conjunto, item, fk, extra in (
+            (CatalogoProducto, CatalogoConjunto, CatalogoItem, "catalogo_id", {}),
+            (Cotizacion, CotizacionConjunto, CotizacionItem, "cotizacion_id", {"cliente": "Cliente"}),
+        ):
+            ids = conn.execute(
+                insert(modelo).returning(modelo.id),
+                [{"codigo": f"B{modelo.__tablename__[:3].upper()}{i:06d}", "nombre": f"Producto {i}",
+                  **precios, **extra} for i in nuevos],
+            ).scalars().all()
+            conn.execute(insert(conjunto), [
+                {fk: padre, "lista_codigo": f"BENCH{(i + j) % n:06d}", "cantidad": j + 1}
+                for i, padre in zip(nuevos, ids) for j in range(CONJUNTOS_POR_PRODUCTO)
+            ])
+            conn.execute(insert(item), [
+                {fk: padre, "item_id": item_ids[(i + j) % len(item_ids)], "cantidad": j + 1}
+                for i, padre in zip(nuevos, ids) for j in range(ITEMS_POR_PRODUCTO)
+            ])
+
+
+# =========================
+# MEDICIÓN
+# =========================
+
+CLAVES = {
+    "/api/lista-precios": ("codigo", {"items": "item_id"}),
+    "/api/catalogo": ("id", {"conjuntos": "id", "items_costo": "id"}),
+    "/api/cotizaciones": ("id", {"conjuntos": "id", "items_costo": "id"}),
+}
+
+
+def _normalizar(ruta: str, cuerpo: bytes):
+    """Mismo orden en las dos respuestas: el camino anterior no ordenaba.
+
+    `referencias_faltantes` solo se llena al crear; el response_model la agregaba como
+    null en cada fila del listado y el camino actual no la emite.
+    """
+    clave, hijos = CLAVES[ruta]
+    filas = sorted(orjson.loads(cuerpo), key=lambda f: f[clave])
+    for fila in filas:
+        if fila.get("referencias_faltantes", "falta") is None:
+            del fila["referencias_faltantes"]
+        for campo, clave_hijo in hijos.items():
+            fila[campo] = sorted(fila[campo], key=lambda h: (h[clave_hijo], h.get("cantidad") or 0))
+    return filas
+
+
+def _medir(cliente: TestClient, ruta: str, antes=None):
+    mejor = None
+    for _ in range(args.repeticiones):
+        if antes:
+            antes()
+        inicio = time.perf_counter()
+        respuesta = cliente.get(ruta)
+        transcurrido = time.perf_counter() - inicio
+        assert respuesta.status_code == 200, respuesta.text
+        mejor = transcurrido if mejor is None else min(mejor, transcurrido)
+    return mejor, respuesta.content
+
+
+def main_bench() -> int:
+    migrar(engine)
+    seed_if_empty()
+
+    admin = {"rol": "admin", "email": "bench@local", "nombre": "Bench", "apellido": "", "activo": True}
+    for dependencia in (auth.get_rol_usuario, auth.solo_admin, auth.admin_o_vendedor):
+        main.app.dependency_overrides[dependencia] = lambda: admin
+    cliente_anterior = TestClient(anterior)
+    cliente_actual = TestClient(main.app)
+
+    distintos = 0
+    print(f"{'endpoint':<22}{'n':>7}{'anterior':>11}{'actual':>11}{'mejora':>9}  contenido")
+    for n in args.n:
+        _completar(n)
+        for ruta in CLAVES:
+            t_anterior, cuerpo_anterior = _medir(cliente_anterior, ruta)
+            # Las listas se sirven desde una cache: se mide en frío, vaciándola antes de cada pedido
+            t_actual, cuerpo_actual = _medir(cliente_actual, ruta, antes=cache_listas.limpiar)
+            iguales = _normalizar(ruta, cuerpo_anterior) == _normalizar(ruta, cuerpo_actual)
+            distintos += not iguales
+            print(f"{ruta:<22}{n:>7}{t_anterior * 1000:>9.0f}ms{t_actual * 1000:>9.0f}ms"
+                  f"{t_anterior / t_actual:>8.1f}x  {'iguales' if iguales else 'DISTINTOS'}")
+        t_caliente, _ = _medir(cliente_actual, "/api/lista-precios")
+        print(f"{'  (listas en cache)':<22}{n:>7}{'':>11}{t_caliente * 1000:>9.0f}ms")
+
+    return 1 if distintos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_bench())
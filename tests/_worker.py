@@ -0,0 +1,15 @@
+"""Worker de la API para los tests con varios procesos: igual que `serve`, con un admin fijo en vez de Supabase."""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import uvicorn
+
+from backend_costeo import auth, main
+
+ADMIN = {"rol": "admin", "email": "admin@test", "nombre": "Admin", "apellido": "Test", "activo": True}
+for dependencia in (auth.get_rol_usuario, auth.solo_admin, auth.admin_o_vendedor):
+    main.app.dependency_overrides[dependencia] = lambda: ADMIN
+
+uvicorn.run(main.app, host="127.0.0.1", port=int(sys.argv[1]), log_level="warning")
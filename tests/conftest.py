@@ -0,0 +1,40 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# La configuración se lee al importar backend_costeo.database: tiene que estar antes
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(tempfile.mkdtemp()) / 'costeo_test.db'}"
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+
+# Postgres real para los tests de DDL (particiones, NOTIFY); sin esta variable se saltean
+POSTGRES_URL = os.getenv("COSTEO_TEST_POSTGRES_URL")
+if POSTGRES_URL and POSTGRES_URL.startswith(("postgres://", "postgresql://")):
+    # Mismo driver que database.py para los engines que arman los tests
+    POSTGRES_URL = "postgresql+psycopg2://" + POSTGRES_URL.split("://", 1)[1]
+
+
+@pytest.fixture(scope="session")
+def base():
+    from backend_costeo import migraciones, seed
+    from backend_costeo.database import engine
+
+    migraciones.migrar(engine)
+    seed.seed_if_empty()
+    return engine
+
+
+@pytest.fixture
+def cliente(base):
+    from fastapi.testclient import TestClient
+    from backend_costeo import auth, main
+
+    admin = {"rol": "admin", "email": "admin@test", "nombre": "Admin", "apellido": "Test", "activo": True}
+    for dependencia in (auth.get_rol_usuario, auth.solo_admin, auth.admin_o_vendedor):
+        main.app.dependency_overrides[dependencia] = lambda: admin
+    yield TestClient(main.app)
+    main.app.dependency_overrides.clear()
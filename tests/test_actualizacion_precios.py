@@ -0,0 +1,43 @@
+import pytest
+
+BASE = {
+    "nombre": "Recalculo por parámetros", "cliente": "C", "producto_codigo": "P", "producto_nombre": "P",
+    "eventuales": 0, "garantia": 0, "burden": 0, "gp_cliente": 30, "gp_integrador": 20,
+    "items_costo": [{"item_id": 3, "cantidad": 2}],
+}
+
+
+@pytest.mark.parametrize("ruta", ["/api/catalogo", "/api/cotizaciones"])
+def test_cambio_de_gp_recalcula_precios(cliente, ruta):
+    creado = cliente.post(ruta, json=BASE).json()
+    assert creado["costo_total"] > 0
+
+    respuesta = cliente.put(f"{ruta}/{creado['id']}", json={"gp_cliente": 50})
+    assert respuesta.status_code == 200, respuesta.text
+
+    actual = cliente.get(f"{ruta}/{creado['id']}").json()
+    assert actual["gp_cliente"] == 50
+    assert actual["precio_cliente"] == round(creado["costo_total"] / 0.5, 4)
+    assert actual["precio_integrador"] == creado["precio_integrador"]
+
+
+@pytest.mark.parametrize("ruta", ["/api/catalogo", "/api/cotizaciones"])
+def test_cambio_de_recargos_y_metodo_recalcula_totales(cliente, ruta):
+    creado = cliente.post(ruta, json=BASE).json()
+
+    cliente.put(f"{ruta}/{creado['id']}", json={"eventuales": 10, "metodo_precio": "markup", "markup_cliente": 25})
+
+    actual = cliente.get(f"{ruta}/{creado['id']}").json()
+    costo_total = creado["costo_directo"] * 1.1
+    assert actual["costo_total"] == round(costo_total, 4)
+    assert actual["precio_cliente"] == round(costo_total * 1.25, 4)
+
+
+def test_cambio_sin_parametros_de_precio_no_toca_totales(cliente):
+    creado = cliente.post("/api/catalogo", json=BASE).json()
+
+    cliente.put(f"/api/catalogo/{creado['id']}", json={"observaciones": "solo texto"})
+
+    actual = cliente.get(f"/api/catalogo/{creado['id']}").json()
+    assert actual["observaciones"] == "solo texto"
+    assert actual["precio_cliente"] == creado["precio_cliente"]
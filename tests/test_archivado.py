@@ -0,0 +1,100 @@
+import gzip
+from datetime import datetime
+
+import orjson
+import pytest
+from sqlalchemy import delete, func, select
+
+from backend_costeo import particiones
+from backend_costeo.historial import HistorialCambio
+from backend_costeo.particiones import HistorialArchivo, archivar_historial
+
+# Meses muy viejos: ningún otro test escribe historial en ese rango
+MES = datetime(2019, 3, 1)
+
+
+@pytest.fixture
+def historial_viejo(base):
+    with base.begin() as conn:
+        conn.execute(HistorialCambio.__table__.insert(), [
+            {"usuario_email": "a@b.c", "accion": "editar", "entidad": "costo_item",
+             "entidad_id": str(i), "fecha": MES.replace(day=i + 1)}
+            for i in range(5)
+        ])
+    yield base
+    with base.begin() as conn:
+        conn.execute(delete(HistorialCambio).where(HistorialCambio.fecha < datetime(2020, 1, 1)))
+        conn.execute(delete(HistorialArchivo))
+
+
+def _viejas(engine):
+    with engine.connect() as conn:
+        return conn.execute(
+            select(func.count()).select_from(HistorialCambio).where(HistorialCambio.fecha < datetime(2020, 1, 1))
+        ).scalar()
+
+
+def test_sin_destino_configurado_no_archiva(historial_viejo, monkeypatch):
+    monkeypatch.setattr(particiones, "HISTORIAL_ARCHIVO_DIR", None)
+
+    with pytest.raises(RuntimeError, match="HISTORIAL_ARCHIVO_DIR"):
+        archivar_historial(historial_viejo)
+    assert _viejas(historial_viejo) == 5
+
+
+def test_destino_inexistente_no_archiva(historial_viejo, tmp_path):
+    with pytest.raises(RuntimeError, match="no existe"):
+        archivar_historial(historial_viejo, destino=tmp_path / "sin_montar")
+    assert _viejas(historial_viejo) == 5
+
+
+def test_archiva_verifica_y_borra(historial_viejo, tmp_path):
+    archivados = archivar_historial(historial_viejo, destino=tmp_path)
+
+    del_mes = [a for a in archivados if a["tabla"] == "historial_cambios" and a["desde"] == MES]
+    assert len(del_mes) == 1 and del_mes[0]["filas"] == 5
+    assert _viejas(historial_viejo) == 0
+    assert not list(tmp_path.rglob("*.parcial"))
+    with gzip.open(del_mes[0]["ruta"], "rb") as archivo:
+        assert [orjson.loads(linea)["entidad_id"] for linea in archivo] == ["0", "1", "2", "3", "4"]
+
+
+def test_archivo_que_no_verifica_deja_las_filas(historial_viejo, tmp_path, monkeypatch):
+    monkeypatch.setattr(particiones, "_resumen_archivo", lambda ruta: (0, ""))
+
+    with pytest.raises(RuntimeError, match="no coincide"):
+        archivar_historial(historial_viejo, destino=tmp_path)
+    assert _viejas(historial_viejo) == 5
+    assert not list(tmp_path.rglob("*.gz")) and not list(tmp_path.rglob("*.parcial"))
+
+
+def test_endpoint_acepta_fechas_con_zona(historial_viejo, tmp_path, cliente):
+    archivar_historial(historial_viejo, destino=tmp_path)
+
+    r = cliente.get("/api/historial-archivado", params={
+        "desde": "2019-03-02T00:00:00Z", "hasta": "2019-03-04T00:00:00+00:00",
+    })
+    assert r.status_code == 200
+    assert [f["entidad_id"] for f in r.json()] == ["1", "2"]
+
+    # -03:00: el 2019-03-01T21:00 local es el 2019-03-02T00:00 UTC
+    r = cliente.get("/api/historial-archivado", params={"desde": "2019-03-01T21:00:00-03:00"})
+    assert [f["entidad_id"] for f in r.json()][:1] == ["1"]
+
+
+def test_endpoint_archivo_faltante_responde_410(historial_viejo, tmp_path, cliente):
+    archivados = archivar_historial(historial_viejo, destino=tmp_path)
+    for archivo in archivados:
+        particiones.Path(archivo["ruta"]).unlink()
+
+    r = cliente.get("/api/historial-archivado", params={"desde": "2019-01-01T00:00:00"})
+    assert r.status_code == 410
+    assert str(tmp_path) not in r.text
+
+
+def test_listado_de_archivos_no_expone_rutas(historial_viejo, tmp_path, cliente):
+    archivar_historial(historial_viejo, destino=tmp_path)
+
+    archivos = cliente.get("/api/historial-archivado/archivos").json()
+    assert archivos and all("ruta" not in a for a in archivos)
+    assert str(tmp_path) not in orjson.dumps(archivos).decode()
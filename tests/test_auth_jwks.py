@@ -0,0 +1,93 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+
+from backend_costeo import auth
+
+
+@pytest.fixture
+def clave_privada():
+    clave = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return clave.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode()
+
+
+@pytest.fixture
+def jwks_falso(clave_privada, monkeypatch):
+    """Endpoint de JWKS local, lento a propósito para que las descargas se superpongan."""
+    publica = jwk.construct(clave_privada, "RS256").public_key().to_dict()
+    publica["kid"] = "k1"
+    estado = {"pedidos": 0, "cuerpo": json.dumps({"keys": [publica]}).encode()}
+    lock = threading.Lock()
+
+    class Manejador(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with lock:
+                estado["pedidos"] += 1
+            time.sleep(0.2)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(estado["cuerpo"])
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), Manejador)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    monkeypatch.setattr(auth, "SUPABASE_URL", f"http://127.0.0.1:{servidor.server_address[1]}")
+    yield estado
+    servidor.shutdown()
+
+
+def _concurrente(funcion, n=16):
+    with ThreadPoolExecutor(n) as ejecutor:
+        return list(ejecutor.map(lambda _: funcion(), range(n)))
+
+
+def test_arranque_en_frio_descarga_una_sola_vez(jwks_falso):
+    cache = auth.CacheJWKS(ttl=600, refetch_minimo=0)
+    claves = _concurrente(lambda: cache.obtener_clave("k1"))
+
+    assert all(c is not None and "BEGIN PUBLIC KEY" in c for c in claves)
+    assert jwks_falso["pedidos"] == 1
+    assert cache.estadisticas()["descargas"] == 1
+
+
+def test_kid_desconocido_no_multiplica_descargas(jwks_falso):
+    cache = auth.CacheJWKS(ttl=600, refetch_minimo=0)
+    cache.obtener_clave("k1")
+
+    claves = _concurrente(lambda: cache.obtener_clave("otro"))
+
+    assert claves == [None] * 16
+    assert jwks_falso["pedidos"] == 2
+
+
+def test_kid_desconocido_respeta_refetch_minimo(jwks_falso):
+    cache = auth.CacheJWKS(ttl=600, refetch_minimo=3600)
+    cache.obtener_clave("k1")
+    for _ in range(5):
+        assert cache.obtener_clave("otro") is None
+    assert jwks_falso["pedidos"] == 1
+
+
+def test_verifica_token_firmado_con_la_jwks(jwks_falso, clave_privada, monkeypatch):
+    monkeypatch.setattr(auth, "jwks_cache", auth.CacheJWKS(ttl=600, refetch_minimo=0))
+    token = jwt.encode(
+        {"sub": "u1", "exp": int(time.time()) + 60}, clave_privada, algorithm="RS256", headers={"kid": "k1"}
+    )
+
+    assert auth._decodificar_token(token)["sub"] == "u1"
+    assert auth._decodificar_token(token)["sub"] == "u1"
+    assert jwks_falso["pedidos"] == 1
@@ -0,0 +1,16 @@
+import subprocess
+import sys
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+
+def test_benchmark_de_listados_corre_y_las_respuestas_coinciden(tmp_path):
+    # Corrida chica del benchmark: el script sale con error si los dos caminos difieren
+    resultado = subprocess.run(
+        [sys.executable, str(RAIZ / "benchmarks" / "bench_listados.py"), "--n", "40", "--repeticiones", "1",
+         "--database-url", f"sqlite:///{tmp_path / 'bench.db'}"],
+        capture_output=True, text=True, cwd=RAIZ, timeout=120,
+    )
+    assert resultado.returncode == 0, resultado.stdout + resultado.stderr
+    assert resultado.stdout.count("iguales") == 3
@@ -0,0 +1,178 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import httpx
+import orjson
+import pytest
+
+from conftest import POSTGRES_URL
+from backend_costeo.bus import BusInvalidacion
+
+WORKER = Path(__file__).resolve().parent / "_worker.py"
+RAIZ = WORKER.parent.parent
+
+LISTA = {
+    "nombre": "Lista bus", "producto_codigo": "P", "producto_nombre": "P",
+    "eventuales": 0, "garantia": 0, "burden": 0, "gp_cliente": 30, "gp_integrador": 20,
+    "items": [{"item_id": 1, "cantidad": 2}],
+}
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _esperar(condicion, timeout=10.0):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        if condicion():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def _responde(url):
+    try:
+        return httpx.get(url + "/", timeout=0.5).status_code < 500
+    except httpx.HTTPError:
+        return False
+
+
+@pytest.fixture(params=[
+    "sqlite",
+    pytest.param("postgres", marks=pytest.mark.skipif(not POSTGRES_URL, reason="COSTEO_TEST_POSTGRES_URL no configurada")),
+])
+def dos_workers(request, base):
+    url_base = os.environ["DATABASE_URL"] if request.param == "sqlite" else POSTGRES_URL
+    entorno = {**os.environ, "DATABASE_URL": url_base, "BUS_INTERVALO_SEG": "0.1", "PYTHONPATH": str(RAIZ)}
+    if request.param == "postgres":
+        for modo in ("migrate", "seed"):
+            subprocess.run([sys.executable, "-m", "backend_costeo", modo], env=entorno, cwd=RAIZ, check=True)
+
+    procesos, urls = [], []
+    try:
+        for _ in range(2):
+            puerto = _puerto_libre()
+            procesos.append(subprocess.Popen([sys.executable, str(WORKER), str(puerto)], env=entorno, cwd=RAIZ))
+            urls.append(f"http://127.0.0.1:{puerto}")
+        for url in urls:
+            assert _esperar(lambda: _responde(url)), f"el worker {url} no arrancó"
+        yield [httpx.Client(base_url=url, timeout=10) for url in urls]
+    finally:
+        for proceso in procesos:
+            proceso.terminate()
+            proceso.wait(10)
+
+
+def test_dos_workers_convergen_tras_una_escritura(dos_workers):
+    a, b = dos_workers
+    codigo = a.post("/api/lista-precios", json=LISTA).json()["codigo"]
+
+    # Las dos caches quedan calientes con la versión original
+    assert a.get(f"/api/lista-precios/{codigo}").json()["nombre"] == "Lista bus"
+    assert b.get(f"/api/lista-precios/{codigo}").json()["nombre"] == "Lista bus"
+
+    assert a.put(f"/api/lista-precios/{codigo}", json={"nombre": "Renombrada en A"}).status_code == 200
+    assert _esperar(lambda: b.get(f"/api/lista-precios/{codigo}").json()["nombre"] == "Renombrada en A")
+
+    # Y en el otro sentido: un cambio de costo en B recalcula la lista que A tiene en cache
+    # La lista lleva 2 unidades del ítem 1: subir su costo en 1 sube el total en 2
+    total_antes = a.get(f"/api/lista-precios/{codigo}").json()["costo_directo"]
+    assert b.put("/api/costos/1", json={"costo_fabrica": total_antes / 2 + 1}).status_code == 200
+    assert _esperar(lambda: a.get(f"/api/lista-precios/{codigo}").json()["costo_directo"] == total_antes + 2)
+
+    assert b.get("/api/admin/metricas").json()["bus"]["recibidos"] >= 1
+    assert a.get("/api/admin/metricas").json()["bus"]["recibidos"] >= 1
+
+
+def test_suscriptor_en_loop_corre_en_el_event_loop(base):
+    bus = BusInvalidacion()
+    hilos = []
+
+    async def escenario():
+        recibido = asyncio.Event()
+
+        def suscriptor(ids):
+            hilos.append((threading.current_thread(), ids))
+            recibido.set()
+
+        bus.suscribir("usuario", suscriptor, en_loop=True)
+        bus.iniciar(base, loop=asyncio.get_running_loop())
+        try:
+            aviso = orjson.dumps({"o": "otro-worker", "e": "usuario", "i": ["u1"]}).decode()
+            hilo = threading.Thread(target=bus._recibir, args=(aviso,))
+            hilo.start()
+            hilo.join()
+            await asyncio.wait_for(recibido.wait(), 2)
+        finally:
+            bus.detener()
+
+    asyncio.run(escenario())
+    assert hilos == [(threading.main_thread(), ["u1"])]
+
+
+def test_suscriptor_sin_loop_corre_en_el_hilo_del_bus():
+    bus = BusInvalidacion()
+    recibidos = []
+    bus.suscribir("lista_precio", recibidos.append)
+
+    bus._recibir(orjson.dumps({"o": "otro-worker", "e": "lista_precio", "i": None}).decode())
+    bus._recibir(orjson.dumps({"o": bus.origen, "e": "lista_precio", "i": ["DCM001"]}).decode())
+
+    assert recibidos == [None]
+
+
+def test_lector_recibe_avisos_despues_de_la_limpieza(tmp_path, monkeypatch):
+    from sqlalchemy import create_engine, func, select
+    from backend_costeo import bus as modulo_bus
+    from backend_costeo.bus import EventoCache, publicar_ahora
+
+    motor = create_engine(f"sqlite:///{tmp_path / 'bus.db'}")
+    EventoCache.__table__.create(motor)
+    monkeypatch.setattr(modulo_bus, "BUS_INTERVALO_SEG", 0.05)
+
+    # Avisos ya vencidos: el lector arranca después de ellos y la primera pasada los borra
+    vencidos = datetime.utcnow() - timedelta(minutes=modulo_bus.BUS_RETENCION_MIN + 1)
+    with motor.begin() as conn:
+        conn.execute(EventoCache.__table__.insert(), [
+            {"origen": "viejo", "entidad": "lista_precio", "ids": "{}", "fecha": vencidos} for _ in range(5)
+        ])
+
+    lector = BusInvalidacion()
+    recibidos = []
+    lector.suscribir("lista_precio", recibidos.append)
+    lector.iniciar(motor)
+    try:
+        with motor.connect() as conn:
+            assert _esperar(lambda: conn.execute(select(func.count()).select_from(EventoCache)).scalar() == 0)
+        publicar_ahora("lista_precio", ["DCM001"], engine=motor)
+        assert _esperar(lambda: recibidos, timeout=3)
+    finally:
+        lector.detener()
+    assert recibidos == [["DCM001"]]
+
+
+def test_migrar_recrea_eventos_sin_autoincrement(tmp_path):
+    from sqlalchemy import create_engine, text
+    from backend_costeo.bus import asegurar_eventos
+
+    motor = create_engine(f"sqlite:///{tmp_path / 'viejo.db'}")
+    with motor.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE eventos_cache (id INTEGER PRIMARY KEY, origen VARCHAR NOT NULL, "
+            "entidad VARCHAR NOT NULL, ids TEXT, fecha DATETIME)"
+        ))
+    asegurar_eventos(motor)
+    asegurar_eventos(motor)
+    with motor.connect() as conn:
+        ddl = conn.execute(text("SELECT sql FROM sqlite_master WHERE name = 'eventos_cache'")).scalar()
+    assert "AUTOINCREMENT" in ddl
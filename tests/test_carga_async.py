@@ -0,0 +1,119 @@
+"""Carga sobre los endpoints de lectura con el lector síncrono (threadpool) y con asyncpg.
+
+Levanta un worker por modo contra la misma base Postgres y les tira la misma mezcla de
+lecturas con CONCURRENCIA pedidos en vuelo. Imprime req/s y latencias de cada modo.
+El cliente corre en la misma máquina: con Postgres local y pocos núcleos compite por CPU
+con el worker y la base, así que los números sirven para comparar modos, no como techo.
+"""
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+
+from conftest import POSTGRES_URL
+from test_bus import LISTA, _esperar, _puerto_libre, _responde
+
+pytestmark = pytest.mark.skipif(not POSTGRES_URL, reason="COSTEO_TEST_POSTGRES_URL no configurada")
+
+WORKER = Path(__file__).resolve().parent / "_worker.py"
+RAIZ = WORKER.parent.parent
+
+CONCURRENCIA = int(os.getenv("CARGA_CONCURRENCIA", "32"))
+PEDIDOS = int(os.getenv("CARGA_PEDIDOS", "600"))
+RUTAS = ["/api/costos", "/api/catalogo", "/api/lista-precios", "/api/historial?limite=200"]
+
+
+def _entorno(**extra):
+    return {**os.environ, "DATABASE_URL": POSTGRES_URL, "PYTHONPATH": str(RAIZ), **extra}
+
+
+@pytest.fixture(scope="module")
+def base_pg():
+    for modo in ("migrate", "seed"):
+        subprocess.run([sys.executable, "-m", "backend_costeo", modo], env=_entorno(), cwd=RAIZ, check=True)
+
+
+def _worker(asincrono: bool):
+    puerto = _puerto_libre()
+    proceso = subprocess.Popen(
+        [sys.executable, str(WORKER), str(puerto)],
+        env=_entorno(DATABASE_ASYNC="1" if asincrono else "0"),
+        cwd=RAIZ,
+    )
+    url = f"http://127.0.0.1:{puerto}"
+    assert _esperar(lambda: _responde(url), timeout=20), f"el worker {url} no arrancó"
+    return proceso, url
+
+
+async def _cargar(url: str):
+    latencias = []
+    errores = []
+    cola = iter(range(PEDIDOS))
+
+    async def cliente(http):
+        for i in cola:
+            inicio = time.perf_counter()
+            respuesta = await http.get(RUTAS[i % len(RUTAS)])
+            latencias.append(time.perf_counter() - inicio)
+            if respuesta.status_code != 200:
+                errores.append(respuesta.status_code)
+
+    limites = httpx.Limits(max_connections=CONCURRENCIA, max_keepalive_connections=CONCURRENCIA)
+    async with httpx.AsyncClient(base_url=url, timeout=30, limits=limites) as http:
+        # Calentamiento: conexiones del pool y caches de la app
+        for ruta in RUTAS:
+            assert (await http.get(ruta)).status_code == 200
+        inicio = time.perf_counter()
+        await asyncio.gather(*(cliente(http) for _ in range(CONCURRENCIA)))
+        total = time.perf_counter() - inicio
+
+    latencias.sort()
+    return {
+        "req_s": PEDIDOS / total,
+        "p50_ms": latencias[len(latencias) // 2] * 1000,
+        "p95_ms": latencias[int(len(latencias) * 0.95)] * 1000,
+        "errores": errores,
+    }
+
+
+def test_lecturas_sync_vs_async(base_pg):
+    proceso, url = _worker(asincrono=False)
+    try:
+        # Algunas listas y catálogos para que los listados tengan contenido
+        with httpx.Client(base_url=url, timeout=10) as http:
+            for n in range(20):
+                codigo = http.post("/api/lista-precios", json={**LISTA, "nombre": f"Carga {n}"}).json()["codigo"]
+                http.post("/api/catalogo", json={
+                    **{k: LISTA[k] for k in ("producto_codigo", "producto_nombre", "gp_cliente", "gp_integrador")},
+                    "nombre": f"Carga {n}", "conjuntos": [{"lista_codigo": codigo, "cantidad": 2}],
+                })
+            esperado = {ruta: http.get(ruta).json() for ruta in RUTAS}
+        sincrono = asyncio.run(_cargar(url))
+    finally:
+        proceso.terminate()
+        proceso.wait(10)
+
+    proceso, url = _worker(asincrono=True)
+    try:
+        with httpx.Client(base_url=url, timeout=10) as http:
+            # Mismo contenido en los dos modos
+            for ruta in RUTAS:
+                assert http.get(ruta).json() == esperado[ruta], ruta
+        asincrono = asyncio.run(_cargar(url))
+    finally:
+        proceso.terminate()
+        proceso.wait(10)
+
+    for modo, r in (("sync ", sincrono), ("async", asincrono)):
+        print(f"\n⏱️ {modo}: {r['req_s']:.0f} req/s, p50 {r['p50_ms']:.1f} ms, p95 {r['p95_ms']:.1f} ms "
+              f"({PEDIDOS} pedidos, {CONCURRENCIA} en vuelo)", end="")
+    print()
+
+    assert sincrono["errores"] == [] and asincrono["errores"] == []
+    # Sin umbral de mejora: depende de la máquina y la red. Solo se descarta una regresión grosera.
+    assert asincrono["req_s"] > sincrono["req_s"] * 0.5
@@ -0,0 +1,67 @@
+import uuid
+
+import pytest
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.orm import Session
+
+from conftest import POSTGRES_URL
+from backend_costeo.carga_masiva import cargar_costos
+from backend_costeo.models import Base, CostoItem
+
+FILAS = [
+    {"codigo": None, "nombre": 'Cable "UTP", cat 6', "tipo": "Materiales", "subtipo": "Cables",
+     "unidad": None, "coeficiente": None, "costo_fob": "", "costo_fabrica": "12.5"},
+    {"codigo": "A-1", "nombre": "Línea 1\nLínea 2", "tipo": "Electronica", "subtipo": "",
+     "unidad": "u", "coeficiente": 1.35, "costo_fob": 10, "costo_fabrica": 13.5},
+]
+
+
+@pytest.fixture(params=[
+    "sqlite",
+    pytest.param("postgres", marks=pytest.mark.skipif(not POSTGRES_URL, reason="COSTEO_TEST_POSTGRES_URL no configurada")),
+])
+def motor(request, tmp_path):
+    if request.param == "sqlite":
+        engine = create_engine(f"sqlite:///{tmp_path / 'carga.db'}")
+        Base.metadata.create_all(engine)
+        yield engine
+        engine.dispose()
+        return
+
+    esquema = f"test_carga_{uuid.uuid4().hex[:8]}"
+    admin = create_engine(POSTGRES_URL)
+    with admin.begin() as conn:
+        conn.execute(text(f"CREATE SCHEMA {esquema}"))
+    engine = create_engine(POSTGRES_URL, connect_args={"options": f"-csearch_path={esquema}"})
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+    with admin.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA {esquema} CASCADE"))
+    admin.dispose()
+
+
+def _items(engine):
+    columnas = ["codigo", "nombre", "tipo", "subtipo", "unidad", "coeficiente", "costo_fob", "costo_fabrica"]
+    with engine.connect() as conn:
+        filas = conn.execute(select(*[CostoItem.__table__.c[c] for c in columnas])).all()
+    return sorted((dict(zip(columnas, fila)) for fila in filas), key=lambda f: f["nombre"])
+
+
+def test_nulos_y_textos_con_comillas_llegan_intactos(motor):
+    with Session(motor) as db:
+        assert cargar_costos(db, [dict(f) for f in FILAS])["insertados"] == 2
+        db.commit()
+
+    assert _items(motor) == [
+        {"codigo": None, "nombre": 'Cable "UTP", cat 6', "tipo": "Materiales", "subtipo": "Cables",
+         "unidad": None, "coeficiente": None, "costo_fob": None, "costo_fabrica": 12.5},
+        {"codigo": "A-1", "nombre": "Línea 1\nLínea 2", "tipo": "Electronica", "subtipo": "",
+         "unidad": "u", "coeficiente": 1.35, "costo_fob": 10.0, "costo_fabrica": 13.5},
+    ]
+
+    # Recargar lo mismo no cambia nada: los NULL coinciden con NULL, no con ''
+    with Session(motor) as db:
+        resultado = cargar_costos(db, [dict(f) for f in FILAS], sincronizar=True)
+        db.commit()
+    assert (resultado["insertados"], resultado["actualizados"], resultado["eliminados"]) == (0, 0, 0)
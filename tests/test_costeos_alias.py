@@ -0,0 +1,22 @@
+LISTA = {
+    "nombre": "Alias costeos", "producto_codigo": "P", "producto_nombre": "P",
+    "eventuales": 10, "garantia": 0, "burden": 0, "gp_cliente": 30, "gp_integrador": 20,
+    "items": [{"item_id": 1, "cantidad": 2}, {"item_id": 3, "cantidad": 1}],
+}
+TOTALES = ("costo_directo", "costo_total", "precio_cliente", "precio_integrador")
+
+
+def test_alias_calcula_los_totales_en_el_servidor(cliente):
+    respuesta = cliente.post("/api/costeos", json={
+        **LISTA, "costo_directo": 1, "costo_total": 2, "precio_cliente": 999999, "precio_integrador": 888888,
+    })
+    assert respuesta.status_code == 200, respuesta.text
+    codigo = respuesta.json()["codigo"]
+    assert codigo.startswith("DCM")
+
+    por_alias = cliente.get(f"/api/lista-precios/{codigo}").json()
+    por_endpoint = cliente.post("/api/lista-precios", json=LISTA).json()
+
+    assert {c: por_alias[c] for c in TOTALES} == {c: por_endpoint[c] for c in TOTALES}
+    assert por_alias["precio_cliente"] != 999999
+    assert [(i["item_id"], i["cantidad"]) for i in por_alias["items"]] == [(1, 2), (3, 1)]
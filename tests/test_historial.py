@@ -0,0 +1,62 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import delete
+
+from backend_costeo.historial import HistorialCambio
+from backend_costeo.serializacion import codificar_cursor, decodificar_cursor
+
+ENTIDAD = "prueba_cursor"
+FECHAS = [datetime(2021, 5, 1, 12), datetime(2021, 5, 1, 12), datetime(2021, 5, 2, 9), None, None, datetime(2021, 4, 30)]
+
+
+@pytest.fixture
+def historial_con_nulos(base):
+    # Filas sin fecha: cargadas por SQL directo o importadas antes del default
+    with base.begin() as conn:
+        conn.execute(HistorialCambio.__table__.insert(), [
+            {"usuario_email": "cursor@test", "accion": "editar", "entidad": ENTIDAD,
+             "entidad_id": "1", "campo": str(i), "fecha": fecha}
+            for i, fecha in enumerate(FECHAS)
+        ])
+    yield
+    with base.begin() as conn:
+        conn.execute(delete(HistorialCambio).where(HistorialCambio.entidad == ENTIDAD))
+
+
+def _paginar(cliente, ruta, **params):
+    filas, cursor = [], None
+    while True:
+        r = cliente.get(ruta, params={**params, "limite": 2, **({"cursor": cursor} if cursor else {})})
+        assert r.status_code == 200, r.text
+        filas += r.json()
+        cursor = r.headers.get("X-Siguiente-Cursor")
+        if not cursor:
+            return filas
+
+
+@pytest.mark.parametrize("ruta, params", [
+    (f"/api/historial/{ENTIDAD}/1", {}),
+    ("/api/historial", {"usuario": "cursor@test"}),
+])
+def test_cursor_recorre_filas_sin_fecha_al_final(historial_con_nulos, cliente, ruta, params):
+    filas = _paginar(cliente, ruta, **params)
+
+    # Fecha descendente, las sin fecha al final; a igual fecha, id descendente
+    assert [f["campo"] for f in filas] == ["2", "1", "0", "5", "4", "3"]
+    assert len({f["id"] for f in filas}) == len(FECHAS)
+
+
+def test_cursor_de_fila_sin_fecha():
+    assert decodificar_cursor(codificar_cursor(None, 7)) == (None, 7)
+
+
+def test_desde_hasta_con_zona(historial_con_nulos, cliente):
+    ruta = f"/api/historial/{ENTIDAD}/1"
+    # 11:00-03:00 es 14:00 UTC y deja afuera las de las 12:00; 08:00-03:00 es 11:00 UTC e incluye
+    # la de las 9:00. Comparadas sin convertir, la respuesta sería la opuesta
+    r = cliente.get(ruta, params={"desde": "2021-05-01T11:00:00-03:00", "hasta": "2021-05-02T08:00:00-03:00"})
+    assert [f["campo"] for f in r.json()] == ["2"]
+
+    r = cliente.get(ruta, params={"hasta": "2021-05-01T00:00:00+00:00"})
+    assert [f["campo"] for f in r.json()] == ["5"]
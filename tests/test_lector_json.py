@@ -0,0 +1,49 @@
+import functools
+import io
+import json
+
+import pytest
+
+from backend_costeo import lector_json
+from backend_costeo.lector_json import LectorJSON, recorrer_costos
+
+NUMEROS = [1.5, -2e10, 3E+2, 12345, 0.125, -0.0625, 7, 1.25e-3, 0]
+COSTOS = {
+    "Materiales": {
+        "Chapa": [{"codigo": "CH1", "costo": 1234.5678, "cantidad": 12}, {"codigo": "CH2", "costo": 2e3}],
+        "Perfiles": {"Aluminio": [{"codigo": "PA1", "costo": -0.5, "extra": [1, 2.75, True, None]}]},
+    },
+    "Mano de obra": {"Horas": [{"codigo": "MO1", "costo": 950}]},
+}
+
+
+@pytest.mark.parametrize("bloque", range(1, 9))
+def test_numeros_cortados_por_el_bloque(bloque):
+    # Con bloques chicos el corte cae dentro de cada número: tras el signo, el punto o la 'e'
+    lector = LectorJSON(io.StringIO(json.dumps(NUMEROS)), bloque=bloque)
+    assert [lector.valor() for _ in lector.elementos()] == NUMEROS
+
+
+@pytest.mark.parametrize("texto", ["42", " 3.25 ", "-1e2"])
+def test_numero_suelto_al_final_del_archivo(texto):
+    assert LectorJSON(io.StringIO(texto), bloque=1).valor() == json.loads(texto)
+
+
+@pytest.mark.parametrize("bloque", [1, 2, 3, 5, 64 * 1024])
+def test_recorrer_costos_con_bloques_chicos(bloque, tmp_path, monkeypatch):
+    ruta = tmp_path / "costos.json"
+    ruta.write_text(json.dumps(COSTOS), encoding="utf-8")
+    monkeypatch.setattr(lector_json, "LectorJSON", functools.partial(LectorJSON, bloque=bloque))
+
+    assert list(recorrer_costos(ruta)) == [
+        ("Materiales", "Chapa", None, COSTOS["Materiales"]["Chapa"][0]),
+        ("Materiales", "Chapa", None, COSTOS["Materiales"]["Chapa"][1]),
+        ("Materiales", "Perfiles", "Aluminio", COSTOS["Materiales"]["Perfiles"]["Aluminio"][0]),
+        ("Mano de obra", "Horas", None, COSTOS["Mano de obra"]["Horas"][0]),
+    ]
+
+
+def test_json_truncado():
+    with pytest.raises(ValueError, match="JSON inválido"):
+        lector = LectorJSON(io.StringIO('[1, {"a": 2'), bloque=2)
+        [lector.valor() for _ in lector.elementos()]
@@ -0,0 +1,97 @@
+import uuid
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, func, select, text
+
+from conftest import POSTGRES_URL
+
+pytestmark = pytest.mark.skipif(not POSTGRES_URL, reason="COSTEO_TEST_POSTGRES_URL no configurada")
+
+from backend_costeo import particiones  # noqa: E402
+from backend_costeo.historial import HistorialCambio  # noqa: E402
+from backend_costeo.models import Base  # noqa: E402
+from backend_costeo.particiones import _inicio_mes, _nombre_particion, _sumar_meses  # noqa: E402
+
+TABLA = "historial_cambios"
+
+
+@pytest.fixture
+def engine_pg():
+    """Esquema propio por test, para no tocar las tablas de otra base."""
+    esquema = f"test_part_{uuid.uuid4().hex[:8]}"
+    admin = create_engine(POSTGRES_URL)
+    with admin.begin() as conn:
+        conn.execute(text(f"CREATE SCHEMA {esquema}"))
+    engine = create_engine(POSTGRES_URL, connect_args={"options": f"-csearch_path={esquema}"})
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+    with admin.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA {esquema} CASCADE"))
+    admin.dispose()
+
+
+def _insertar(conn, fecha):
+    conn.execute(HistorialCambio.__table__.insert().values(
+        usuario_email="a@b.c", accion="editar", entidad="costo_item", entidad_id="1", fecha=fecha,
+    ))
+
+
+def _cuantas(conn, tabla):
+    return conn.execute(text(f"SELECT count(*) FROM {tabla}")).scalar()
+
+
+def test_mes_fuera_de_la_ventana_pasa_de_default_a_su_particion(engine_pg):
+    particiones.preparar_particiones(engine_pg)
+
+    # Un mes más allá de la ventana pre-creada: la fila cae en la partición default
+    mes = _sumar_meses(_inicio_mes(datetime.utcnow()), particiones.PARTICIONES_MESES_ADELANTE + 2)
+    with engine_pg.begin() as conn:
+        _insertar(conn, mes.replace(day=15))
+        assert _cuantas(conn, f"{TABLA}_default") == 1
+
+    # Cuando llega ese mes, crear su partición no debe fallar y la fila tiene que mudarse
+    with engine_pg.begin() as conn:
+        particiones.asegurar_particiones(conn, TABLA, meses_adelante=particiones.PARTICIONES_MESES_ADELANTE + 2)
+
+    with engine_pg.connect() as conn:
+        assert _cuantas(conn, f"{TABLA}_default") == 0
+        assert _cuantas(conn, _nombre_particion(TABLA, mes)) == 1
+        assert conn.execute(select(func.count()).select_from(HistorialCambio.__table__)).scalar() == 1
+        assert conn.execute(text(
+            "SELECT count(*) FROM pg_inherits WHERE inhparent = to_regclass(:t)"
+        ), {"t": TABLA}).scalar() >= particiones.PARTICIONES_MESES_ADELANTE + 4
+
+
+def test_migrate_repetido_con_filas_en_default_no_falla(engine_pg):
+    particiones.preparar_particiones(engine_pg)
+
+    # Mes pasado sin partición (p. ej. archivado y luego con filas tardías)
+    pasado = _sumar_meses(_inicio_mes(datetime.utcnow()), -6)
+    with engine_pg.begin() as conn:
+        _insertar(conn, pasado.replace(day=3))
+        assert _cuantas(conn, f"{TABLA}_default") == 1
+
+    particiones.preparar_particiones(engine_pg)
+    particiones.preparar_particiones(engine_pg)
+
+    with engine_pg.connect() as conn:
+        assert _cuantas(conn, f"{TABLA}_default") == 0
+        assert _cuantas(conn, _nombre_particion(TABLA, pasado)) == 1
+
+
+def test_convertir_tabla_plana_conserva_filas_y_secuencia(engine_pg):
+    hace_diez_meses = _sumar_meses(_inicio_mes(datetime.utcnow()), -10)
+    with engine_pg.begin() as conn:
+        for dia in (1, 10, 20):
+            _insertar(conn, hace_diez_meses.replace(day=dia))
+
+    particiones.preparar_particiones(engine_pg)
+
+    with engine_pg.begin() as conn:
+        assert particiones.es_particionada(conn, TABLA)
+        assert _cuantas(conn, _nombre_particion(TABLA, hace_diez_meses)) == 3
+        _insertar(conn, datetime.utcnow())
+        ids = conn.execute(select(HistorialCambio.id).order_by(HistorialCambio.id)).scalars().all()
+    assert ids == sorted(set(ids)) and len(ids) == 4
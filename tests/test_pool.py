@@ -0,0 +1,40 @@
+import sqlite3
+
+from backend_costeo.database import PoolMedido, estadisticas_pool
+
+
+def _pool(max_overflow):
+    return PoolMedido(lambda: sqlite3.connect(":memory:", check_same_thread=False), pool_size=2, max_overflow=max_overflow)
+
+
+def _tomar(pool, n):
+    return [pool.connect() for _ in range(n)]
+
+
+def test_utilizacion_con_overflow_acotado():
+    pool = _pool(1)
+    conexiones = _tomar(pool, 3)
+
+    stats = estadisticas_pool(pool)
+
+    assert stats["max_overflow"] == 1
+    assert stats["overflow_ilimitado"] is False
+    assert stats["en_uso"] == 3
+    assert stats["utilizacion"] == 1.0
+    for conexion in conexiones:
+        conexion.close()
+
+
+def test_overflow_ilimitado_no_calcula_utilizacion():
+    pool = _pool(-1)
+    conexiones = _tomar(pool, 5)
+
+    stats = estadisticas_pool(pool)
+
+    assert stats["overflow_ilimitado"] is True
+    assert stats["max_overflow"] is None
+    assert stats["en_uso"] == 5
+    assert stats["utilizacion"] is None
+    assert stats["checkouts"] == 5
+    for conexion in conexiones:
+        conexion.close()
@@ -0,0 +1,153 @@
+import itertools
+import random
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from backend_costeo.precios import (
+    COLUMNAS_PRECIO,
+    calcular_totales,
+    calcular_totales_filas,
+    calcular_totales_lote,
+)
+
+
+def _lote(*filas):
+    """Corre el lote sobre filas dadas como dicts y devuelve un dict por fila."""
+    resultado = calcular_totales_lote(**{col: [f.get(col) for f in filas] for col in COLUMNAS_PRECIO})
+    return [{clave: valores[i] for clave, valores in resultado.items()} for i in range(len(filas))]
+
+
+# =========================
+# VALORES CALCULADOS A MANO
+# =========================
+
+def test_gp_con_recargos():
+    # 1000 × (1 + 0,10 + 0,05 + 0,05) = 1200; 1200 / 0,7 = 1714,285714…; 1200 / 0,8 = 1500
+    [totales] = _lote({
+        "costo_directo": 1000, "eventuales": 10, "garantia": 5, "burden": 5,
+        "metodo_precio": "gp", "gp_cliente": 30, "gp_integrador": 20,
+    })
+    assert totales == {
+        "costo_directo": 1000.0, "costo_total": 1200.0,
+        "precio_cliente": 1714.2857, "precio_integrador": 1500.0,
+    }
+
+
+def test_markup_y_nulos():
+    # markup 25 % sobre 100; el markup del integrador sin cargar vale 0
+    [totales] = _lote({"costo_directo": 100, "metodo_precio": "markup", "markup_cliente": 25})
+    assert totales == {
+        "costo_directo": 100.0, "costo_total": 100.0,
+        "precio_cliente": 125.0, "precio_integrador": 100.0,
+    }
+
+
+def test_gp_de_100_o_mas_da_cero_y_metodo_nulo_es_gp():
+    [totales] = _lote({"costo_directo": 50, "gp_cliente": 100, "gp_integrador": 120})
+    assert totales == {"costo_directo": 50.0, "costo_total": 50.0, "precio_cliente": 0, "precio_integrador": 0}
+
+
+def test_fila_vacia():
+    [totales] = _lote({})
+    assert totales == {"costo_directo": 0, "costo_total": 0, "precio_cliente": 0, "precio_integrador": 0}
+
+
+@pytest.mark.parametrize("costo, esperado", [
+    # Redondeo del valor binario exacto, como round(): el producto x·10⁴ caería del otro lado del .5
+    (0.00005, 0.0001),       # 5.00000000000000002e-05
+    (2.67565, 2.6757),       # 2.67565000000000008…
+    (10.00015, 10.0001),     # 10.0001499999999996…
+    (1234.56785, 1234.5678),  # 1234.56784999999990…
+    # Empates exactos en binario: al par
+    (0.03125, 0.0312),
+    (0.09375, 0.0938),
+])
+def test_redondeo_a_cuatro_decimales(costo, esperado):
+    [totales] = _lote({"costo_directo": costo, "metodo_precio": "markup"})
+    assert totales["costo_directo"] == esperado
+    assert totales["costo_total"] == esperado
+    assert totales["precio_cliente"] == esperado
+
+
+def test_lote_vacio():
+    assert calcular_totales_lote(*([[]] * len(COLUMNAS_PRECIO))) == {
+        "costo_directo": [], "costo_total": [], "precio_cliente": [], "precio_integrador": [],
+    }
+
+
+# =========================
+# PARIDAD CON EL CÁLCULO POR FILA
+# =========================
+
+def _filas_azar(cantidad, semilla):
+    azar = random.Random(semilla)
+    return [{
+        # Costos con 5 decimales: los terminados en 5 quedan cerca de un .5 al redondear
+        "costo_directo": azar.randint(0, 10 ** 10) / 1e5 if azar.random() < 0.5 else azar.uniform(0, 1e6),
+        "eventuales": azar.uniform(0, 30),
+        "garantia": azar.uniform(0, 10),
+        "burden": azar.uniform(0, 25),
+        "metodo_precio": azar.choice(["gp", "markup"]),
+        "gp_cliente": azar.uniform(0, 99),
+        "gp_integrador": azar.uniform(0, 99),
+        "markup_cliente": azar.uniform(0, 200),
+        "markup_integrador": azar.uniform(0, 200),
+    } for _ in range(cantidad)]
+
+
+def _filas():
+    """Combinaciones de bordes (None, 0, gp >= 100, markup) más filas al azar."""
+    bordes = itertools.product(
+        [None, 0, 1234.5678, 0.00005],   # costo_directo
+        [None, 0, 12.5],                 # eventuales
+        [None, 3],                       # garantia
+        [None, 7.25],                    # burden
+        [None, "gp", "markup"],          # metodo_precio
+        [None, 0, 35, 100, 120],         # gp_cliente
+        [None, 20, 99.999],              # gp_integrador
+        [None, 40],                      # markup_cliente
+        [None, 0, 15.5],                 # markup_integrador
+    )
+    return [dict(zip(COLUMNAS_PRECIO, valores)) for valores in bordes] + _filas_azar(2000, 20240101)
+
+
+def _por_fila(fila):
+    return calcular_totales(*(fila[col] for col in COLUMNAS_PRECIO))
+
+
+def test_lote_coincide_con_calculo_por_fila():
+    filas = _filas()
+    assert _lote(*filas) == [_por_fila(f) for f in filas]
+
+
+def test_filas_con_costo_directo_aparte():
+    filas = [f for f in _filas() if f["costo_directo"] is not None][:500]
+    sin_costo = [SimpleNamespace(**{k: v for k, v in f.items() if k != "costo_directo"}) for f in filas]
+
+    resultado = calcular_totales_filas(sin_costo, costo_directo=[f["costo_directo"] for f in filas])
+
+    assert resultado == [_por_fila(f) for f in filas]
+
+
+def test_lote_es_mas_rapido_que_por_fila():
+    filas = _filas_azar(50_000, 7)
+    columnas = {col: [f[col] for f in filas] for col in COLUMNAS_PRECIO}
+    tuplas = list(zip(*columnas.values()))
+
+    def mejor_de_tres(funcion):
+        tiempos = []
+        for _ in range(3):
+            inicio = time.perf_counter()
+            funcion()
+            tiempos.append(time.perf_counter() - inicio)
+        return min(tiempos)
+
+    por_fila = mejor_de_tres(lambda: [calcular_totales(*t) for t in tuplas])
+    lote = mejor_de_tres(lambda: calcular_totales_lote(**columnas))
+
+    print(f"\n⏱️ {len(filas)} filas: por fila {por_fila * 1000:.0f} ms, lote {lote * 1000:.0f} ms "
+          f"({por_fila / lote:.1f}x)")
+    # Margen amplio para máquinas cargadas; en una máquina quieta la diferencia ronda 3-4x
+    assert lote * 2 < por_fila
@@ -0,0 +1,58 @@
+from sqlalchemy import select
+
+CATALOGO = {
+    "nombre": "Catálogo referencias", "producto_codigo": "P", "producto_nombre": "P",
+    "eventuales": 0, "garantia": 0, "burden": 0, "gp_cliente": 0, "gp_integrador": 0,
+}
+
+
+def _costo_item(base, item_id):
+    from backend_costeo.models import CostoItem
+
+    with base.connect() as conn:
+        return conn.execute(select(CostoItem.costo_fabrica).where(CostoItem.id == item_id)).scalar()
+
+
+def test_item_id_como_texto_se_resuelve(cliente, base):
+    respuesta = cliente.post("/api/catalogo", json={
+        **CATALOGO, "items_costo": [{"item_id": "3", "cantidad": 2}, {"item_id": 1, "cantidad": "1.5"}],
+    })
+
+    assert respuesta.status_code == 200, respuesta.text
+    cuerpo = respuesta.json()
+    assert cuerpo["referencias_faltantes"] == {"listas": [], "items": []}
+    assert sorted((it["item_id"], it["cantidad"]) for it in cuerpo["items_costo"]) == [(1, 1.5), (3, 2)]
+    esperado = round((_costo_item(base, 3) or 0) * 2 + (_costo_item(base, 1) or 0) * 1.5, 4)
+    assert cuerpo["costo_directo"] == esperado
+
+
+def test_item_id_como_texto_en_actualizacion(cliente):
+    codigo = cliente.post("/api/catalogo", json=CATALOGO).json()["codigo"]
+
+    respuesta = cliente.put(f"/api/catalogo/{codigo}", json={"items_costo": [{"item_id": "3", "cantidad": 1}]})
+
+    assert respuesta.status_code == 200, respuesta.text
+    assert respuesta.json()["referencias_faltantes"] == {"listas": [], "items": []}
+
+
+def test_item_inexistente_queda_como_faltante(cliente):
+    respuesta = cliente.post("/api/catalogo", json={**CATALOGO, "items_costo": [{"item_id": "999999"}]})
+
+    assert respuesta.status_code == 200
+    assert respuesta.json()["referencias_faltantes"]["items"] == [999999]
+
+
+def test_item_id_invalido_o_cantidad_nula_dan_400(cliente):
+    for items in (
+        [{"item_id": "abc", "cantidad": 1}],
+        [{"item_id": None, "cantidad": 1}],
+        [{"item_id": 3, "cantidad": None}],
+        [{"item_id": 3, "cantidad": "dos"}],
+    ):
+        respuesta = cliente.post("/api/catalogo", json={**CATALOGO, "items_costo": items})
+        assert respuesta.status_code == 400, items
+
+    respuesta = cliente.post("/api/cotizaciones", json={
+        **CATALOGO, "cliente": "C", "items_costo": [{"item_id": 3, "cantidad": None}],
+    })
+    assert respuesta.status_code == 400